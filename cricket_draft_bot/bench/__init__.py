@@ -0,0 +1,18 @@
+# bench/__init__.py
+"""
+Hot-path benchmark and regression suite.
+
+Runs against synthetic player pools and an in-memory Mongo stand-in, so it
+needs no database and no Telegram token:
+
+    python -m bench                          # run everything, print a table
+    python -m bench --save bench/baseline.json
+    python -m bench --compare bench/baseline.json --threshold 0.2
+    python -m bench -k simulation --latency-ms 2
+
+--compare exits non-zero when a case's throughput drops (or p99 grows) by
+more than the threshold, or when it starts issuing more DB round-trips.
+
+bench.query_audit is the index counterpart: it explains every query shape
+against a real MongoDB and flags collection scans (python -m bench.query_audit).
+"""
@@ -0,0 +1,119 @@
+# bench/__main__.py
+"""Benchmark runner: python -m bench [--save FILE] [--compare FILE] [--threshold 0.2]"""
+
+import argparse
+import asyncio
+import json
+import logging
+import platform
+import sys
+import time
+from typing import Dict, List
+
+from bench.cases import Case, World, build_cases, stub_persistence
+from bench.memdb import MemoryDB, install
+
+
+def _percentile(sorted_ns: List[int], q: float) -> float:
+    idx = min(len(sorted_ns) - 1, max(0, round(q * (len(sorted_ns) - 1))))
+    return sorted_ns[idx] / 1000.0  # µs
+
+
+async def run_case(case: Case, db: MemoryDB, iterations: int, warmup: int) -> Dict:
+    samples = []
+    trips = 0
+    for i in range(warmup + iterations):
+        if case.before:
+            case.before()
+        ops_before = db.ops
+        t0 = time.perf_counter_ns()
+        if case.is_async:
+            await case.run()
+        else:
+            case.run()
+        elapsed = time.perf_counter_ns() - t0
+        if i >= warmup:
+            samples.append(elapsed)
+            trips += db.ops - ops_before
+    samples.sort()
+    total = sum(samples) or 1
+    return {
+        "ops_per_sec": round(len(samples) * 1e9 / total, 1),
+        "p50_us": round(_percentile(samples, 0.50), 2),
+        "p99_us": round(_percentile(samples, 0.99), 2),
+        "db_trips_per_op": round(trips / len(samples), 3),
+        "iterations": len(samples),
+    }
+
+
+async def run_all(args) -> Dict[str, Dict]:
+    db = MemoryDB(latency_ms=args.latency_ms)
+    install(db)
+    world = World(db, seed=args.seed)
+    await world.setup()
+    undo = stub_persistence()
+    results = {}
+    try:
+        for case in build_cases(world):
+            if args.k and args.k not in case.name:
+                continue
+            iterations = args.iterations if not case.is_async else max(1, args.iterations // 10)
+            results[case.name] = await run_case(case, db, iterations, warmup=min(50, iterations))
+            r = results[case.name]
+            print(f"{case.name:<42} {r['ops_per_sec']:>12,.0f}/s  p50 {r['p50_us']:>9.1f}µs  "
+                  f"p99 {r['p99_us']:>9.1f}µs  db {r['db_trips_per_op']:.2f}")
+    finally:
+        undo()
+    return results
+
+
+def compare(baseline: Dict[str, Dict], current: Dict[str, Dict], threshold: float) -> List[str]:
+    """Names of regressed cases, with the reason."""
+    failures = []
+    for name, cur in current.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        if cur["ops_per_sec"] < base["ops_per_sec"] * (1 - threshold):
+            failures.append(f"{name}: throughput {base['ops_per_sec']:,.0f}/s → {cur['ops_per_sec']:,.0f}/s")
+        elif cur["p99_us"] > base["p99_us"] * (1 + threshold):
+            failures.append(f"{name}: p99 {base['p99_us']:.1f}µs → {cur['p99_us']:.1f}µs")
+        if cur["db_trips_per_op"] > base["db_trips_per_op"] + 1e-9:
+            failures.append(f"{name}: DB round-trips {base['db_trips_per_op']} → {cur['db_trips_per_op']}")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="python -m bench", description="Hot-path benchmarks")
+    parser.add_argument("-k", help="only run cases whose name contains this")
+    parser.add_argument("--iterations", type=int, default=5000, help="timed ops per sync case (async: /10)")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="simulated Mongo round-trip latency")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--save", metavar="FILE", help="write results as a JSON baseline")
+    parser.add_argument("--compare", metavar="FILE", help="fail if results regress against this baseline")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed slowdown fraction (default 0.2)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    results = asyncio.run(run_all(args))
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump({"python": platform.python_version(), "machine": platform.machine(),
+                       "latency_ms": args.latency_ms, "results": results}, f, indent=2, sort_keys=True)
+        print(f"\nBaseline written to {args.save}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        failures = compare(baseline.get("results", {}), results, args.threshold)
+        if failures:
+            print(f"\n❌ {len(failures)} regression(s) beyond {args.threshold:.0%}:")
+            for line in failures:
+                print(f"  • {line}")
+            sys.exit(1)
+        print(f"\n✅ No regressions beyond {args.threshold:.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+# bench/cases.py
+"""
+Benchmark cases. Each case is one hot path; `run()` performs a single
+operation and is timed individually, so the runner can report percentiles.
+"""
+
+import random
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from bench import fixtures
+from bench.memdb import MemoryDB
+
+MODES = ["IPL", "FIFA", "WWE"]
+MATCHES_PER_MODE = 40
+
+
+class Case:
+    def __init__(self, name: str, run: Callable, is_async: bool = False,
+                 before: Optional[Callable[[], None]] = None):
+        self.name = name
+        self.run = run
+        self.is_async = is_async
+        self.before = before  # Untimed per-op reset (e.g. cache clears for cold-path cases)
+
+
+class World:
+    """Seeded players, mode pools and stored matches, shared by every case."""
+
+    def __init__(self, db: MemoryDB, seed: int = 7):
+        self.db = db
+        self.rng = random.Random(seed)
+        self.docs = fixtures.build_players(seed)
+        self.players = {}
+        self.pools: Dict[str, List[str]] = {}
+        self.match_ids: Dict[str, List[str]] = {}
+        self.drafting: Dict[str, List] = {}  # Hydrated mid-draft matches, for draw benchmarks
+
+    async def setup(self):
+        from database import get_eligible_players_for_mode
+        from game.state import _match_from_data
+        from game.features import build_feature_table
+        from game.models import Player
+
+        await self.db.players.insert_many(self.docs)
+        self.players = {d["player_id"]: Player.from_doc(d) for d in self.docs}
+        for mode in MODES:
+            self.pools[mode] = await get_eligible_players_for_mode(mode)
+            await build_feature_table(mode)
+            states = []
+            for i in range(MATCHES_PER_MODE):
+                mid = f"bench_{mode}_{i}"
+                # Half mid-draft, half complete — both are loaded on every click
+                filled = None if i % 2 else self.rng.randint(1, len(fixtures.positions_for(mode)) - 1)
+                state = fixtures.match_state(mid, mode, self.pools[mode], self.rng, filled)
+                states.append({"match_id": mid, "chat_id": state["chat_id"], "state_data": state, "version": 1})
+            await self.db.matches.insert_many(states)
+            self.match_ids[mode] = [s["match_id"] for s in states]
+            self.drafting[mode] = [await _match_from_data(s["state_data"]) for s in states
+                                   if s["state_data"]["state"] == "DRAFTING"]
+        await self.prime_players()
+
+    async def prime_players(self):
+        """Loads every pool player into the player cache, so warm cases start warm."""
+        from database import get_players
+        for mode in MODES:
+            await get_players(self.pools[mode])
+
+    def team_pairs(self, mode: str):
+        positions = fixtures.positions_for(mode)
+        pairs = []
+        for _ in range(64):
+            picks = self.rng.sample(self.pools[mode], 2 * len(positions))
+            pairs.append([(pos, self.players[picks[i]], self.players[picks[len(positions) + i]])
+                          for i, pos in enumerate(positions)])
+        return pairs
+
+
+def _cycle(items):
+    state = {"i": 0}
+
+    def nxt():
+        item = items[state["i"] % len(items)]
+        state["i"] += 1
+        return item
+    return nxt
+
+
+def _match_from_pair(mode: str, pair) -> "object":
+    from game.models import Match, Team
+    a = Team(owner_id=1001, owner_name="Alice", slots={pos: pa for pos, pa, _ in pair})
+    b = Team(owner_id=1002, owner_name="Bob", slots={pos: pb for pos, _, pb in pair})
+    return Match(match_id=f"sim_{mode}", chat_id=-100, mode=mode, team_a=a, team_b=b,
+                 current_turn=1001, draft_pool=[])
+
+
+def build_cases(world: World) -> List[Case]:
+    from game.simulation import calculate_slot_score, run_simulation
+    from game.features import slot_score
+    from game.state import load_match_state, clear_match_cache, draw_player_for_turn
+    from handlers.draft import format_draft_board
+    from utils.randomizer import get_random_player
+    from database import clear_player_cache
+
+    cases, cold_cases = [], []
+    for mode in MODES:
+        pairs = world.team_pairs(mode)
+        slot_args = _cycle([(p, pos) for pair in pairs for pos, p, _ in pair])
+        matches = _cycle([_match_from_pair(mode, pair) for pair in pairs])
+        pool = world.pools[mode]
+        excludes = _cycle([world.rng.sample(pool, 18) for _ in range(64)])
+        ids = _cycle(world.match_ids[mode])
+        decks = _cycle(world.drafting[mode])
+
+        def calc(mode=mode, nxt=slot_args):
+            p, pos = nxt()
+            calculate_slot_score(p, pos, mode)
+
+        def table(mode=mode, nxt=slot_args):
+            p, pos = nxt()
+            slot_score(p, pos, mode)
+
+        async def simulate(nxt=matches):
+            await run_simulation(nxt())
+
+        def board(nxt=matches):
+            format_draft_board(nxt())
+
+        def draw(pool=pool, nxt=excludes):
+            get_random_player(pool, exclude_ids=nxt())
+
+        async def load(nxt=ids):
+            await load_match_state(nxt())
+
+        async def deal(nxt=decks):
+            m = nxt()
+            if m.deck_cursor > 200:
+                m.deck_cursor = 0  # Rewind (rebuilds the deck) instead of dealing the pool dry
+            await draw_player_for_turn(m)
+
+        def cold_players():
+            clear_match_cache()
+            clear_player_cache()
+
+        cases += [
+            Case(f"calculate_slot_score[{mode}]", calc),
+            Case(f"slot_score.table[{mode}]", table),
+            Case(f"run_simulation[{mode}]", simulate, is_async=True),
+            Case(f"format_draft_board[{mode}]", board),
+            Case(f"get_random_player[{mode}]", draw),
+            Case(f"draw_player_for_turn[{mode}]", deal, is_async=True),
+            Case(f"load_match_state.warm_players[{mode}]", load, is_async=True, before=clear_match_cache),
+        ]
+        cold_cases.append(Case(f"load_match_state.cold[{mode}]", load, is_async=True, before=cold_players))
+    # Cold cases empty the player cache, so they run after every warm case
+    return cases + cold_cases
+
+
+def stub_persistence() -> Callable[[], None]:
+    """Result logging (projector.record) and the direct user stats / coin writes
+    (run_simulation's fallback, AFK forfeits) — replace them with no-ops. Returns an undo."""
+    import database
+    from game.results import projector
+
+    async def _noop(*args, **kwargs):
+        return None
+
+    async def _logged(event):
+        return True  # As if the event were durable, so no fallback write runs
+
+    saved = {name: getattr(database, name) for name in ("update_user_stats", "bulk_update_user_stats", "add_card_coins")}
+    for name in saved:
+        setattr(database, name, _noop)
+    projector.record = _logged
+
+    def undo():
+        for name, fn in saved.items():
+            setattr(database, name, fn)
+        del projector.record  # Back to the class method
+    return undo
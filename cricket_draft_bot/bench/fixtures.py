@@ -0,0 +1,115 @@
+# bench/fixtures.py
+"""
+Synthetic player pools and matches shaped like production data.
+
+Pool sizes follow what get_eligible_players_for_mode returns in production
+(400-600 cricket IDs per mode, a few hundred FIFA / WWE). Generation is
+seeded, so every run benchmarks identical data.
+"""
+
+import random
+from typing import Dict, List
+
+from config import ROLE_STATS_MAP, POSITIONS_FIFA, WWE_POSITION_STATS
+
+_CRICKET_ROLES = ["Batter", "Bowler", "All Rounder", "Wicket Keeper", "Top", "Middle", "Finisher", "Pacer", "Spinner"]
+_FIFA_LEAGUES = ["Premier League", "LALIGA EA SPORTS", "Bundesliga", "Serie A Enilive", "Ligue 1 McDonald's", "MLS"]
+_FIFA_STATS = sorted(set(POSITIONS_FIFA) - {"ST/CF"} | {"ST", "CF"})
+
+POOL_SIZES = {"cricket": 550, "football": 400, "wwe": 220}
+
+
+def _cricket_stats(rng: random.Random) -> Dict[str, int]:
+    return {key: rng.randint(5, 99) for key in set(ROLE_STATS_MAP.values()) | {"clutch"}}
+
+
+def cricket_player(rng: random.Random, i: int) -> Dict:
+    roles = rng.sample(_CRICKET_ROLES, rng.randint(1, 3))
+    doc = {
+        "player_id": f"CRK_{i:04d}",
+        "name": f"Cricketer {i}",
+        "full_name": f"Synthetic Cricketer {i}",
+        "role": roles[0],
+        "roles": roles,
+        "ipl_roles": rng.sample(_CRICKET_ROLES, rng.randint(1, 2)) if rng.random() < 0.6 else [],
+        "test_roles": rng.sample(_CRICKET_ROLES, rng.randint(1, 2)) if rng.random() < 0.4 else [],
+        "sport": "cricket",
+        "image_file_id": f"img_{i}",
+        "stats": {},
+    }
+    # Overlapping mode pools like production: most players have ODI, fewer IPL / Test
+    for key, p in (("odi", 0.9), ("ipl", 0.75), ("test", 0.6)):
+        if rng.random() < p:
+            doc["stats"][key] = _cricket_stats(rng)
+    return doc
+
+
+def fifa_player(rng: random.Random, i: int) -> Dict:
+    positions = rng.sample(POSITIONS_FIFA[1:] + ["ST", "CF"], rng.randint(1, 3))
+    return {
+        "player_id": f"FIFA_{i:04d}",
+        "name": f"Footballer {i}",
+        "role": positions[0],
+        "sport": "football",
+        "mode": "FIFA",
+        "position": positions[0],
+        "positions": positions,
+        "overall": rng.randint(81, 93),
+        "league": rng.choice(_FIFA_LEAGUES),
+        "team": f"Club {i % 40}",
+        "fifa_image_url": f"https://example.invalid/fifa/{i}.png",
+        "stats": {"fifa": {k: rng.randint(30, 95) for k in _FIFA_STATS}},
+    }
+
+
+def wwe_player(rng: random.Random, i: int) -> Dict:
+    return {
+        "player_id": f"WWE_{i:04d}",
+        "name": f"Superstar {i}",
+        "role": "Superstar",
+        "sport": "wwe",
+        "gender": "female" if i % 4 == 0 else "male",
+        "wwe_image_url": f"https://example.invalid/wwe/{i}.png",
+        "stats": {"wwe": {k: rng.randint(40, 99) for k in WWE_POSITION_STATS.values()}},
+    }
+
+
+def build_players(seed: int = 7) -> List[Dict]:
+    rng = random.Random(seed)
+    players = [cricket_player(rng, i) for i in range(POOL_SIZES["cricket"])]
+    players += [fifa_player(rng, i) for i in range(POOL_SIZES["football"])]
+    players += [wwe_player(rng, i) for i in range(POOL_SIZES["wwe"])]
+    return players
+
+
+def positions_for(mode: str) -> List[str]:
+    from game.features import positions_for_mode
+    return positions_for_mode(mode)
+
+
+def match_state(match_id: str, mode: str, pool: List[str], rng: random.Random, filled: int = None) -> Dict:
+    """A stored state_data document mid-draft (or complete when filled=None)."""
+    positions = positions_for(mode)
+    filled = len(positions) if filled is None else filled
+    picks = rng.sample(pool, 2 * len(positions))
+
+    def team(owner_id: int, name: str, ids: List[str]) -> Dict:
+        return {
+            "owner_id": owner_id, "owner_name": name,
+            "slots": {pos: (ids[i] if i < filled else None) for i, pos in enumerate(positions)},
+            "redraws_remaining": 2, "replacements_remaining": 1, "is_ready": False,
+            "score": 0, "trades_used": 0, "swaps_used": 0,
+        }
+
+    removed = picks[:filled] + picks[len(positions):len(positions) + filled]
+    return {
+        "match_id": match_id, "chat_id": -1001000000000 - rng.randint(0, 999), "mode": mode,
+        "team_a": team(1001, "Alice", picks[:len(positions)]),
+        "team_b": team(1002, "Bob", picks[len(positions):]),
+        "current_turn": 1001, "draft_pool_removed": removed,
+        "state": "DRAFTING" if filled < len(positions) else "READY_CHECK",
+        "pending_player_id": None, "draft_message_id": 10, "card_message_id": None,
+        "pinned_message_id": None, "finished_at": 0.0, "draft_completed_at": 0.0,
+        "trade_offer": None, "turn_deadline": 0.0,
+        "deck_seed": rng.getrandbits(63), "deck_cursor": 2 * filled,
+    }
@@ -0,0 +1,342 @@
+# bench/memdb.py
+"""
+In-memory stand-in for the Motor database handle.
+
+Covers the query shapes the benchmarked code paths use (equality, dotted
+paths, $in/$ne/$gt/$or, projections, bulk_write of UpdateOne, $set/$unset
+update pipelines with the handful of expressions database.py uses). Every call
+counts as one round-trip and can sleep for a configurable latency, so
+benchmarks also report how many DB trips a hot path costs.
+"""
+
+import asyncio
+import copy
+import re
+from typing import Any, Dict, List, Optional
+
+_MISSING = object()
+
+
+def _get_path(doc: Dict, path: str):
+    cur = doc
+    parts = path.split(".")
+    for i, part in enumerate(parts):
+        if isinstance(cur, list):  # Dotted path through an array of subdocuments
+            rest = ".".join(parts[i:])
+            values = [_get_path(item, rest) for item in cur if isinstance(item, dict)]
+            return [v for v in values if v is not _MISSING] or _MISSING
+        if not isinstance(cur, dict) or part not in cur:
+            return _MISSING
+        cur = cur[part]
+    return cur
+
+
+def _cmp(value, op: str, arg) -> bool:
+    if op == "$in":
+        return any(_eq(value, a) for a in arg)
+    if op == "$nin":
+        return not any(_eq(value, a) for a in arg)
+    if op == "$ne":
+        return not _eq(value, arg)
+    if op == "$exists":
+        return (value is not _MISSING) == bool(arg)
+    if op == "$regex":
+        return value is not _MISSING and isinstance(value, str) and re.search(arg, value) is not None
+    if op == "$options":
+        return True
+    if value is _MISSING or value is None:
+        return False
+    try:
+        return {"$gt": value > arg, "$gte": value >= arg, "$lt": value < arg, "$lte": value <= arg}[op]
+    except (TypeError, KeyError):
+        return False
+
+
+def _eq(value, arg) -> bool:
+    if value is _MISSING:
+        return arg is None
+    if isinstance(value, list) and not isinstance(arg, list):
+        return arg in value
+    return value == arg
+
+
+def matches(doc: Dict, query: Dict) -> bool:
+    for key, cond in query.items():
+        if key == "$or":
+            if not any(matches(doc, q) for q in cond):
+                return False
+        elif key == "$and":
+            if not all(matches(doc, q) for q in cond):
+                return False
+        else:
+            value = _get_path(doc, key)
+            if isinstance(cond, dict) and cond and all(k.startswith("$") for k in cond):
+                if "$regex" in cond and "i" in cond.get("$options", ""):
+                    cond = {**cond, "$regex": f"(?i){cond['$regex']}"}
+                if not all(_cmp(value, op, arg) for op, arg in cond.items()):
+                    return False
+            elif not _eq(value, cond):
+                return False
+    return True
+
+
+def _project(doc: Dict, projection: Optional[Dict]) -> Dict:
+    if not projection:
+        return copy.deepcopy(doc)
+    include = {k for k, v in projection.items() if v and k != "_id"}
+    if include:
+        out = {k: copy.deepcopy(doc[k]) for k in include if k in doc}
+        if projection.get("_id", 1) and "_id" in doc:
+            out["_id"] = doc["_id"]
+        return out
+    out = copy.deepcopy(doc)
+    for k, v in projection.items():
+        if not v:
+            out.pop(k, None)
+    return out
+
+
+def _eval(doc: Dict, expr):
+    """Aggregation expression against one document (the subset update pipelines use)."""
+    if isinstance(expr, str) and expr.startswith("$"):
+        value = _get_path(doc, expr[1:])
+        return None if value is _MISSING else value
+    if isinstance(expr, list):
+        return [_eval(doc, e) for e in expr]
+    if not isinstance(expr, dict):
+        return expr
+    if len(expr) == 1 and next(iter(expr)).startswith("$"):
+        op, arg = next(iter(expr.items()))
+        if op == "$literal":
+            return arg
+        args = _eval(doc, arg if isinstance(arg, list) else [arg])
+        if op == "$add":
+            return None if any(a is None for a in args) else sum(args)
+        if op == "$ifNull":
+            return next((a for a in args[:-1] if a is not None), args[-1])
+        if op == "$cond":
+            return args[1] if args[0] else args[2]
+        if op == "$eq":
+            return args[0] == args[1]
+        if op == "$gt":
+            return args[0] is not None and (args[1] is None or args[0] > args[1])
+        if op == "$max":
+            return max((a for a in args if a is not None), default=None)
+        if op == "$concatArrays":
+            return [x for a in args for x in a]
+        if op == "$slice":
+            return args[0][args[1]:] if args[1] < 0 else args[0][:args[1]]
+        raise NotImplementedError(f"memdb: expression {op}")
+    return {k: _eval(doc, v) for k, v in expr.items()}
+
+
+def _apply_pipeline(doc: Dict, stages: List[Dict]):
+    for stage in stages:
+        (name, spec), = stage.items()
+        if name in ("$set", "$addFields"):
+            values = {path: _eval(doc, expr) for path, expr in spec.items()}  # All read the input doc
+            _apply_update(doc, {"$set": values})
+        elif name == "$unset":
+            _apply_update(doc, {"$unset": {path: "" for path in ([spec] if isinstance(spec, str) else spec)}})
+        else:
+            raise NotImplementedError(f"memdb: pipeline stage {name}")
+
+
+def _apply_update(doc: Dict, update):
+    if isinstance(update, list):
+        return _apply_pipeline(doc, update)
+    for op, fields in update.items():
+        for path, value in fields.items():
+            parts = path.split(".")
+            cur = doc
+            for part in parts[:-1]:
+                cur = cur.setdefault(part, {})
+            leaf = parts[-1]
+            if op == "$set":
+                cur[leaf] = copy.deepcopy(value)
+            elif op == "$unset":
+                cur.pop(leaf, None)
+            elif op == "$inc":
+                cur[leaf] = cur.get(leaf, 0) + value
+            elif op == "$push":
+                items = value["$each"] if isinstance(value, dict) and "$each" in value else [value]
+                cur.setdefault(leaf, []).extend(copy.deepcopy(items))
+            elif op == "$setOnInsert":
+                pass
+            else:
+                raise NotImplementedError(f"memdb: update operator {op}")
+
+
+class _Cursor:
+    def __init__(self, docs: List[Dict]):
+        self._docs = docs
+
+    def sort(self, key, direction=1):
+        keys = key if isinstance(key, list) else [(key, direction)]
+        # Stable passes, last key first; missing / null sort lowest like Mongo
+        for path, direction in reversed(keys):
+            def sort_key(d, path=path):
+                value = _get_path(d, path)
+                return (0, 0) if value is _MISSING or value is None else (1, value)
+            self._docs.sort(key=sort_key, reverse=direction < 0)
+        return self
+
+    def limit(self, n: int):
+        if n:
+            self._docs = self._docs[:n]
+        return self
+
+    async def to_list(self, length=None):
+        return self._docs[:length] if length else list(self._docs)
+
+    def __aiter__(self):
+        self._iter = iter(self._docs)
+        return self
+
+    async def __anext__(self):
+        try:
+            return next(self._iter)
+        except StopIteration:
+            raise StopAsyncIteration
+
+
+class _Result:
+    def __init__(self, **kw):
+        self.__dict__.update(kw)
+
+
+class MemoryCollection:
+    def __init__(self, db: "MemoryDB", name: str):
+        self.db = db
+        self.name = name
+        self.docs: List[Dict] = []
+        self.unique: List[List[str]] = []  # Key paths of unique indexes (enforced on upsert)
+
+    async def _trip(self):
+        self.db.ops += 1
+        if self.db.latency:
+            await asyncio.sleep(self.db.latency)
+
+    async def create_index(self, keys, unique=False, **kwargs):
+        if unique:
+            self.unique.append([k for k, _ in keys] if isinstance(keys, list) else [keys])
+        return None
+
+    async def insert_many(self, docs):
+        await self._trip()
+        self.docs.extend(copy.deepcopy(d) for d in docs)
+
+    async def find_one(self, query=None, projection=None, **kwargs):
+        await self._trip()
+        for doc in self.docs:
+            if matches(doc, query or {}):
+                return _project(doc, projection or kwargs.get("projection"))
+        return None
+
+    def find(self, query=None, projection=None, **kwargs):
+        self.db.ops += 1  # Cursor creation is the round-trip; no await point in Motor either
+        return _Cursor([_project(d, projection or kwargs.get("projection")) for d in self.docs if matches(d, query or {})])
+
+    async def count_documents(self, query):
+        await self._trip()
+        return sum(1 for d in self.docs if matches(d, query))
+
+    async def update_one(self, query, update, upsert=False):
+        await self._trip()
+        return self._update_one(query, update, upsert)
+
+    def _update_one(self, query, update, upsert):
+        for doc in self.docs:
+            if matches(doc, query):
+                _apply_update(doc, update)
+                return _Result(matched_count=1, modified_count=1, upserted_id=None)
+        if upsert:
+            doc = {k: v for k, v in query.items() if not k.startswith("$") and not isinstance(v, dict)}
+            if isinstance(update, dict) and "$setOnInsert" in update:
+                _apply_update(doc, {"$set": update["$setOnInsert"]})
+            _apply_update(doc, update)
+            for paths in self.unique:
+                key = [_get_path(doc, p) for p in paths]
+                if any(key == [_get_path(d, p) for p in paths] for d in self.docs):
+                    from pymongo.errors import DuplicateKeyError
+                    raise DuplicateKeyError(f"E11000 duplicate key {dict(zip(paths, key))}", 11000)
+            self.docs.append(doc)
+            return _Result(matched_count=0, modified_count=0, upserted_id=doc.get("_id"))
+        return _Result(matched_count=0, modified_count=0, upserted_id=None)
+
+    async def update_many(self, query, update):
+        await self._trip()
+        hits = [doc for doc in self.docs if matches(doc, query)]
+        for doc in hits:
+            _apply_update(doc, update)
+        return _Result(matched_count=len(hits), modified_count=len(hits))
+
+    async def distinct(self, path, query=None):
+        await self._trip()
+        out = []
+        for doc in self.docs:
+            if matches(doc, query or {}):
+                value = _get_path(doc, path)
+                out += [v for v in (value if isinstance(value, list) else [value])
+                        if v is not _MISSING and v not in out]
+        return out
+
+    async def find_one_and_update(self, query, update, projection=None, upsert=False, return_document=False):
+        await self._trip()
+        before = next((copy.deepcopy(d) for d in self.docs if matches(d, query)), None)
+        self._update_one(query, update, upsert)
+        if not return_document:
+            return _project(before, projection) if before else None
+        after = next((d for d in self.docs if matches(d, query)), None)
+        return _project(after, projection) if after else None
+
+    async def bulk_write(self, requests, ordered=True):
+        await self._trip()
+        from pymongo.errors import BulkWriteError, DuplicateKeyError
+        matched = upserted = 0
+        errors = []
+        for i, req in enumerate(requests):
+            doc = req._doc  # pymongo UpdateOne keeps its spec privately
+            try:
+                res = self._update_one(req._filter, doc, req._upsert)
+            except DuplicateKeyError as e:
+                errors.append({"index": i, "code": 11000, "errmsg": str(e)})
+                if ordered:
+                    break
+                continue
+            matched += res.matched_count
+            upserted += not res.matched_count and req._upsert
+        if errors:
+            raise BulkWriteError({"writeErrors": errors, "nMatched": matched, "nUpserted": upserted})
+        return _Result(matched_count=matched, modified_count=matched, upserted_count=upserted)
+
+    async def delete_one(self, query):
+        await self._trip()
+        for i, doc in enumerate(self.docs):
+            if matches(doc, query):
+                del self.docs[i]
+                return _Result(deleted_count=1)
+        return _Result(deleted_count=0)
+
+
+class MemoryDB:
+    def __init__(self, latency_ms: float = 0.0):
+        self.latency = latency_ms / 1000.0
+        self.ops = 0
+        self._collections: Dict[str, MemoryCollection] = {}
+
+    def __getattr__(self, name: str) -> MemoryCollection:
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return self[name]
+
+    def __getitem__(self, name: str) -> MemoryCollection:
+        if name not in self._collections:
+            self._collections[name] = MemoryCollection(self, name)
+        return self._collections[name]
+
+
+def install(db: MemoryDB):
+    """Points database.get_db() at the stand-in."""
+    import database
+    database._db = db
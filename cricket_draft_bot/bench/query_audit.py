@@ -0,0 +1,173 @@
+# bench/query_audit.py
+"""
+Query-plan audit: runs explain() for every query shape the bot issues from
+database.py and handlers/standings.py and reports the ones Mongo answers
+with a collection scan.
+
+Needs a real MongoDB (MONGO_URI) — the in-memory stand-in has no planner:
+
+    python -m bench.query_audit                  # explain every shape
+    python -m bench.query_audit --ensure-indexes # run init_db() first
+    python -m bench.query_audit -k users
+
+Exits non-zero when a shape not marked as an accepted scan does a COLLSCAN,
+so it can gate index changes. Accepted scans are the deliberate full reads
+(admin exports, mod/chat lists), unanchored case-insensitive name search and
+the cricket pool builds ($ne / $nin filters), which are cached and patched
+per player so they run about once per process.
+"""
+
+import argparse
+import asyncio
+import sys
+import time
+from typing import Dict, List, NamedTuple, Optional
+
+_ACTIVE = ["DRAFTING", "READY_CHECK"]
+_TRADE_OPEN = ["awaiting_target_pick", "awaiting_confirmation", "completing"]
+_USER = 1000000001
+_CHAT = -1001000000001
+
+
+class Shape(NamedTuple):
+    name: str
+    collection: str
+    filter: Dict
+    sort: Optional[Dict] = None
+    accepted_scan: bool = False  # Full scan is the intent — reported, not failed
+
+
+def query_shapes() -> List[Shape]:
+    """One entry per distinct query shape (values are placeholders; the plan depends on fields)."""
+    from database import _mode_pool_query, _card_pool_query
+    from utils.leaderboard import period_epoch
+    now = time.time()
+    shapes = [
+        # players
+        Shape("get_players", "players", {"player_id": {"$in": ["p1", "p2"]}}),
+        Shape("get_player_by_name", "players",
+              {"$or": [{"name": {"$regex": "kohli", "$options": "i"}},
+                       {"full_name": {"$regex": "kohli", "$options": "i"}},
+                       {"aliases": {"$regex": "kohli", "$options": "i"}}]}, accepted_scan=True),
+        Shape("get_all_players", "players", {}, accepted_scan=True),
+        Shape("cache_sync.poll.players", "players", {"last_modified": {"$gt": now}}),
+        # matches
+        Shape("get_match", "matches", {"match_id": "1_1"}),
+        Shape("count_user_active_matches", "matches", {"participants": _USER, "state": {"$in": _ACTIVE}}),
+        Shape("startup_recovery", "matches", {"state_data.state": {"$in": _ACTIVE}}),
+        Shape("get_deck_pool", "deck_pools", {"fingerprint": "0123456789abcdef"}),
+        Shape("claim_match_slots", "match_slots", {"user_id": _USER}),
+        # users / standings
+        Shape("get_user_stats", "users", {"user_id": _USER}),
+        Shape("cache_sync.poll.users", "users", {"last_modified": {"$ne": None}}, {"last_modified": -1}),
+        Shape("try_acquire_action_cooldown", "users",
+              {"user_id": _USER, "$or": [{"cooldowns.draw": {"$exists": False}}, {"cooldowns.draw": {"$lt": now}}]}),
+        # match_results (game/results.py)
+        Shape("append_match_result", "match_results", {"event_id": "1_1"}),
+        Shape("get_pending_match_results", "match_results", {"projected_at": None}, {"finished_at": 1}),
+        Shape("rebuild_user_stats_from_log", "match_results", {"teams.owner_id": {"$in": [_USER]}},
+              {"finished_at": 1}),
+        # user_cards / trades / misc
+        Shape("get_user_cards", "user_cards", {"user_id": _USER}),
+        Shape("get_user_card", "user_cards", {"user_id": _USER, "player_id": "p1", "format": "ipl"}),
+        Shape("get_trade", "active_trades", {"trade_id": "t1"}),
+        Shape("get_user_active_trade", "active_trades",
+              {"$or": [{"initiator_id": _USER}, {"target_id": _USER}],
+               "status": {"$in": _TRADE_OPEN}, "created_at": {"$gte": now - 300}}),
+        Shape("expire_old_trades", "active_trades",
+              {"created_at": {"$lt": now - 300}, "status": {"$in": _TRADE_OPEN[:2]}}),
+        Shape("get_banner", "config", {"key": "banner_IPL"}),
+        Shape("cache_sync.poll.config", "config", {"last_modified": {"$gt": now}}),
+        Shape("find_and_delete_pending_challenge", "pending_challenges", {"owner_id": _USER, "mode": "IPL"}),
+        Shape("get_stale_challenges", "pending_challenges", {"created_at": {"$lt": now - 120}}),
+        Shape("get_all_timers", "timers", {}, {"due": 1}),
+        Shape("get_all_mods", "mods", {}, accepted_scan=True),
+        Shape("get_all_chats", "chats", {}, accepted_scan=True),
+    ]
+    for mode in ("IPL", "ODI", "Test", "FIFA", "WWE", "WWE Women"):
+        cricket = mode in ("IPL", "ODI", "Test")
+        shapes.append(Shape(f"mode_pool[{mode}]", "players", _mode_pool_query(mode), accepted_scan=cricket))
+    for sport in ("cricket", "football", "wwe"):
+        query, _ = _card_pool_query(sport)
+        shapes.append(Shape(f"card_pool[{sport}]", "players", query, accepted_scan=sport == "cricket"))
+
+    # handlers/standings.py — top-10 reads and rank counts per view
+    views = {
+        "overall": ("wins", {}),
+        "daily": ("daily.wins", {"daily.epoch": period_epoch("daily", now)}),
+        "weekly": ("weekly.wins", {"weekly.epoch": period_epoch("weekly", now)}),
+        "cricket": ("cricket_wins", {}),
+        "fifa": ("fifa_wins", {}),
+        "wwe": ("wwe_wins", {}),
+        # Wildcard index: the filter is indexed, the sort is in memory (expected)
+        "chat": (f"chat_wins.{_CHAT}", {f"chat_wins.{_CHAT}": {"$gt": 0}}),
+    }
+    for view, (field, query) in views.items():
+        shapes.append(Shape(f"leaderboard[{view}]", "users", query, {field: -1, "first_win_at": 1}))
+        shapes.append(Shape(f"rank_count[{view}]", "users", {**query, field: {"$gt": 3}}))
+    return shapes
+
+
+def _stages(plan: Dict) -> List[str]:
+    """All stage names in a winningPlan tree."""
+    out = [plan.get("stage", "?")]
+    for key in ("inputStage", "queryPlan"):
+        if isinstance(plan.get(key), dict):
+            out += _stages(plan[key])
+    for child in plan.get("inputStages", []):
+        out += _stages(child)
+    return out
+
+
+async def explain(db, shape: Shape) -> Dict:
+    cmd = {"find": shape.collection, "filter": shape.filter}
+    if shape.sort:
+        cmd["sort"] = shape.sort
+    res = await db.command({"explain": cmd, "verbosity": "queryPlanner"})
+    plan = res["queryPlanner"]["winningPlan"]
+    stages = _stages(plan)
+    return {
+        "stages": stages,
+        "collscan": "COLLSCAN" in stages,
+        "in_memory_sort": "SORT" in stages,
+    }
+
+
+async def main_async(args) -> int:
+    from database import get_db, init_db
+    if args.ensure_indexes:
+        await init_db()
+    db = get_db()
+    failures = 0
+    for shape in query_shapes():
+        if args.k and args.k not in shape.name:
+            continue
+        try:
+            res = await explain(db, shape)
+        except Exception as e:
+            print(f"{shape.name:<40} ERROR {e}")
+            failures += 1
+            continue
+        if res["collscan"] and not shape.accepted_scan:
+            verdict = "COLLSCAN"
+            failures += 1
+        elif res["collscan"]:
+            verdict = "scan (accepted)"
+        elif res["in_memory_sort"]:
+            verdict = "ok, in-memory sort"
+        else:
+            verdict = "ok"
+        print(f"{shape.name:<40} {verdict:<20} {' <- '.join(res['stages'])}")
+    print(f"\n{failures} shape(s) need an index" if failures else "\nNo unexpected collection scans")
+    return 1 if failures else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Explain every bot query shape and flag COLLSCANs")
+    parser.add_argument("-k", help="only shapes whose name contains this")
+    parser.add_argument("--ensure-indexes", action="store_true", help="run init_db() before auditing")
+    sys.exit(asyncio.run(main_async(parser.parse_args())))
+
+
+if __name__ == "__main__":
+    main()
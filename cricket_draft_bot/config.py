@@ -19,10 +19,25 @@ API_HASH = os.getenv("API_HASH")
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 
 # Webhook / Hosting Config
-WEBHOOK_URL = os.getenv("WEBHOOK_URL")
+WEBHOOK_URL = os.getenv("WEBHOOK_URL")  # Set → webhook mode on PORT instead of polling
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/telegram")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET")  # Optional; derived from the bot token if unset
+WEBHOOK_CONCURRENCY = int(os.getenv("WEBHOOK_CONCURRENCY", 32))  # Updates processed in parallel
 PORT = int(os.getenv("PORT", 8000))
 MONGO_URI = os.getenv("MONGO_URI")
 
+# Multi-worker mode: with WORKER_COUNT > 1, main.py receives updates in one
+# dispatcher process and shards them by chat_id across WORKER_COUNT workers.
+WORKER_COUNT = max(1, int(os.getenv("WORKER_COUNT", 1)))
+
+# Cache coherence across processes (utils/cache_sync.py):
+# "auto" = Mongo change streams, polling fallback; "poll" = polling only; "off"
+CACHE_SYNC = os.getenv("CACHE_SYNC", "auto").lower()
+CACHE_SYNC_POLL_SECS = int(os.getenv("CACHE_SYNC_POLL_SECS", 15))
+
+# In-memory match cache budget (game/state.py), in bytes of estimated match state
+MATCH_CACHE_MAX_BYTES = int(os.getenv("MATCH_CACHE_MAX_BYTES", 4 * 1024 * 1024))
+
 # Admin Logging Channel/Group ID
 _log_group_env = os.getenv("ADMIN_LOG_GROUP_ID")
 ADMIN_LOG_GROUP_ID = int(_log_group_env) if _log_group_env else None
@@ -1,10 +1,12 @@
 # database.py
 import os
 import json
+import asyncio
 import logging
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, Set, Tuple
 from motor.motor_asyncio import AsyncIOMotorClient
-from pymongo import ASCENDING
+from pymongo import ASCENDING, DESCENDING, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError, OperationFailure
 from config import MONGO_URI
 from urllib.parse import urlparse
 import datetime
@@ -20,8 +22,10 @@ _db = None
 _player_cache: Dict[str, Dict[str, Any]] = {}
 CACHE_MAX_SIZE = 3500
 
-# In-memory mode pool cache (TTL 5 min) — avoids re-fetching 500 IDs on every match load
-_mode_pool_cache: Dict[str, List] = {}
+# In-memory mode pool cache — avoids re-fetching 500 IDs on every match load.
+# Holds one read-only ModePool snapshot per mode, kept current by
+# _patch_mode_pools; the TTL only backstops edits nobody told us about.
+_mode_pool_cache: Dict[str, "ModePool"] = {}
 _mode_pool_cache_time: Dict[str, float] = {}
 MODE_POOL_CACHE_TTL = 1800  # 30 minutes (was 5min — player pool rarely changes)
 
@@ -55,6 +59,8 @@ async def init_db():
         db = get_db()
         await db.players.create_index([("player_id", ASCENDING)], unique=True)
         await db.players.create_index([("name", ASCENDING)])
+        # FIFA / WWE mode pools and card pools filter by sport (+ overall for FIFA)
+        await db.players.create_index([("sport", ASCENDING), ("overall", ASCENDING)])
         
         await db.matches.create_index([("match_id", ASCENDING)], unique=True)
         await db.mods.create_index([("user_id", ASCENDING)], unique=True)
@@ -66,14 +72,21 @@ async def init_db():
         # Speeds up count_user_active_matches, get_user_active_matches_info,
         # and _startup_recovery which all filter by state_data.state
         await db.matches.create_index([("state_data.state", ASCENDING)])
-        # Speeds up per-user match lookups (join/challenge limit checks)
-        await db.matches.create_index([("state_data.team_a.owner_id", ASCENDING)])
-        await db.matches.create_index([("state_data.team_b.owner_id", ASCENDING)])
+        # Multikey [owner_a, owner_b] + top-level state — active-match checks are one equality lookup
+        await db.matches.create_index([("participants", ASCENDING), ("state", ASCENDING)])
+        # The per-owner indexes it replaced serve no query and only slow every match flush
+        for old_index in ("state_data.team_a.owner_id_1", "state_data.team_b.owner_id_1"):
+            try:
+                await db.matches.drop_index(old_index)
+            except OperationFailure:
+                pass  # Already dropped
         # Speeds up find_and_delete_pending_challenge, get_stale_challenges
         await db.pending_challenges.create_index(
             [("owner_id", ASCENDING), ("mode", ASCENDING)], unique=True
         )
         await db.pending_challenges.create_index([("created_at", ASCENDING)])
+        # Durable timer scheduler loads timers in due order on startup
+        await db.timers.create_index([("due", ASCENDING)])
         # Speeds up broadcast get_all_chats
         await db.chats.create_index([("chat_id", ASCENDING)], unique=True)
         
@@ -86,51 +99,363 @@ async def init_db():
         await db.active_trades.create_index([("initiator_id", ASCENDING), ("status", ASCENDING)])
         await db.active_trades.create_index([("target_id", ASCENDING), ("status", ASCENDING)])
         await db.active_trades.create_index([("expires_at", ASCENDING)])
+        await db.active_trades.create_index([("trade_id", ASCENDING)])
+        await db.active_trades.create_index([("status", ASCENDING), ("created_at", ASCENDING)])
         await db.players.create_index([("cards.ipl.rarity", ASCENDING)])
         await db.players.create_index([("cards.odi.rarity", ASCENDING)])
         await db.players.create_index([("cards.test.rarity", ASCENDING)])
         await db.players.create_index([("cards.wwe.rarity", ASCENDING)])
         await db.players.create_index([("cards.fifa.rarity", ASCENDING)])
+        # Cache-sync polling fallback (utils/cache_sync.py) scans by modification watermark
+        await db.players.create_index([("last_modified", ASCENDING)])
+        await db.users.create_index([("last_modified", ASCENDING)])
+
+        # ── Standings indexes (handlers/standings.py) ─────────────────────────
+        # Top-10 reads sort by <view wins> desc, first_win_at asc; rank counts
+        # use the same prefix. Daily/weekly views match the current epoch first.
+        for wins_field in ("wins", "cricket_wins", "fifa_wins", "wwe_wins"):
+            await db.users.create_index([(wins_field, DESCENDING), ("first_win_at", ASCENDING)])
+        for period in ("daily", "weekly"):
+            await db.users.create_index(
+                [(f"{period}.epoch", ASCENDING), (f"{period}.wins", DESCENDING), ("first_win_at", ASCENDING)])
+        # chat_wins.<chat_id> keys are dynamic — a wildcard index serves the
+        # chat_wins.<id> > 0 filter for all of them, but can't be compound, so the
+        # per-chat view still sorts (wins desc, first_win_at asc) in memory
+        await db.users.create_index([("chat_wins.$**", ASCENDING)])
+        # get_banner / set_banner
+        await db.config.create_index([("key", ASCENDING)])
+        # Match result log (game/results.py): one event per match, pending ones read in finish order
+        await db.match_results.create_index([("event_id", ASCENDING)], unique=True)
+        await db.match_results.create_index([("projected_at", ASCENDING), ("finished_at", ASCENDING)])
+        await db.match_results.create_index([("teams.owner_id", ASCENDING), ("finished_at", ASCENDING)])
+        # Cross-worker leases (acquire_lease)
+        await db.leases.create_index([("key", ASCENDING)], unique=True)
+        # One active-match slot per user (claim_match_slots)
+        await db.match_slots.create_index([("user_id", ASCENDING)], unique=True)
+        # Deck pool snapshots, one per distinct mode pool (get_deck_pool / save_deck_pool)
+        await db.deck_pools.create_index([("fingerprint", ASCENDING)], unique=True)
 
         logger.info("Async MongoDB Indexes Verified.")
     except Exception as e:
         logger.error(f"DB Init Failed: {e}")
 
+    try:
+        await backfill_match_lookup_fields()
+    except Exception as e:
+        logger.warning(f"Match participants backfill failed: {e}")
+
+async def backfill_match_lookup_fields() -> int:
+    """One-off migration: copies owner IDs / state of match documents saved before
+    they carried top-level `participants` and `state`. Idempotent; returns docs updated."""
+    db = get_db()
+    result = await db.matches.update_many(
+        {"state_data": {"$exists": True},
+         "$or": [{"participants": {"$exists": False}}, {"state": {"$exists": False}}]},
+        [{"$set": {
+            "participants": ["$state_data.team_a.owner_id", "$state_data.team_b.owner_id"],
+            "state": "$state_data.state",
+        }}],
+    )
+    if result.modified_count:
+        logger.info(f"Backfilled participants/state on {result.modified_count} match(es)")
+    return result.modified_count
+
 async def save_player(player_data: Dict[str, Any]):
     db = get_db()
     await db.players.update_one(
         {"player_id": player_data['player_id']},
-        {"$set": player_data},
+        {"$set": {**player_data, "last_modified": _own_player_write(player_data['player_id'])}},
         upsert=True
     )
-    clear_player_cache()
+    await _player_changed(player_data['player_id'])
+
+# ── Own-write echoes ─────────────────────────────────────────────────────────
+# utils/cache_sync.py hears this process's player writes come back too, and
+# each echo would patch the pools again (a find_one per cached mode / card
+# sport) for a change _player_changed already applied. Writes record the
+# last_modified they stamp (or the _id they delete) and the listener skips
+# the event carrying it.
+_own_player_writes: Dict[Any, datetime.datetime] = {}  # {player_id | ("_id", oid): stamp}
+_OWN_WRITES_MAX = 10000
+
+def _remember_own_write(key, stamp: datetime.datetime):
+    _own_player_writes.pop(key, None)
+    if len(_own_player_writes) >= _OWN_WRITES_MAX:
+        _own_player_writes.pop(next(iter(_own_player_writes)))
+    _own_player_writes[key] = stamp
+
+def _own_player_write(player_id: str) -> datetime.datetime:
+    """last_modified for a player write, remembered as ours (Mongo keeps milliseconds)."""
+    now = datetime.datetime.utcnow()
+    stamp = now.replace(microsecond=now.microsecond // 1000 * 1000)
+    _remember_own_write(player_id, stamp)
+    return stamp
+
+def is_own_player_write(player_id: Optional[str], last_modified) -> bool:
+    """True (once) if this player version was written by this process."""
+    if player_id is None or _own_player_writes.get(player_id) != last_modified:
+        return False
+    del _own_player_writes[player_id]
+    return True
+
+def is_own_player_delete(oid) -> bool:
+    return _own_player_writes.pop(("_id", oid), None) is not None
+
+# ── Player loader (batching + request coalescing) ───────────────────────────
+# Cache misses are not fetched one find_one at a time: every miss requested
+# in the same event-loop tick joins one {"player_id": {"$in": [...]}} query,
+# and a miss already in flight is awaited instead of fetched again — so
+# hydrating a match (up to 18 players) or a burst of clicks on the same
+# draw costs a single round-trip.
+_player_inflight: Dict[str, asyncio.Future] = {}  # {player_id: future of the doc (None if missing)}
+_player_batch: List[str] = []  # Misses waiting for the next $in query
+_player_batch_scheduled = False
+_player_fetch_tasks: Set[asyncio.Task] = set()  # Running batch fetches (the loop only keeps weak refs)
+_PLAYER_LOADER_STATS = {"hits": 0, "misses": 0, "coalesced": 0, "queries": 0, "evictions": 0, "invalidations": 0}
+_PLAYER_BATCH_MAX = 500
+
+def _cache_player(player_id: str, data: Dict[str, Any]):
+    if len(_player_cache) >= CACHE_MAX_SIZE:
+        # Pop oldest (first item in dict)
+        _player_cache.pop(next(iter(_player_cache)))
+        _PLAYER_LOADER_STATS["evictions"] += 1
+    _player_cache[player_id] = data
+
+def _cached_player(player_id: str) -> Optional[Dict[str, Any]]:
+    data = _player_cache.pop(player_id, None)
+    if data is not None:
+        _player_cache[player_id] = data  # Move to end to mark as recently used
+        _PLAYER_LOADER_STATS["hits"] += 1
+    return data
+
+def _request_players(player_ids: List[str]) -> Dict[str, asyncio.Future]:
+    """Futures for cache misses; joins in-flight fetches and queues the rest for one batch."""
+    global _player_batch_scheduled
+    loop = asyncio.get_running_loop()
+    futures = {}
+    for pid in player_ids:
+        fut = _player_inflight.get(pid)
+        if fut is not None:
+            _PLAYER_LOADER_STATS["coalesced"] += 1
+        else:
+            _PLAYER_LOADER_STATS["misses"] += 1
+            fut = loop.create_future()
+            _player_inflight[pid] = fut
+            _player_batch.append(pid)
+        futures[pid] = fut
+    if _player_batch and not _player_batch_scheduled:
+        # call_soon runs after the callers already scheduled this tick (e.g. siblings in a gather)
+        _player_batch_scheduled = True
+        loop.call_soon(_start_player_batch)
+    return futures
+
+def _start_player_batch():
+    global _player_batch, _player_batch_scheduled
+    batch, _player_batch = _player_batch, []
+    _player_batch_scheduled = False
+    # Invalidation detaches a key's future; such a fetch still answers its waiters but isn't cached
+    futures = {pid: _player_inflight[pid] for pid in batch if pid in _player_inflight}
+    task = asyncio.ensure_future(_fetch_player_batch(batch, futures))
+    _player_fetch_tasks.add(task)
+    task.add_done_callback(lambda t: _player_batch_done(t, futures))
+
+def _player_batch_done(task: asyncio.Task, futures: Dict[str, asyncio.Future]):
+    """Fails whatever a cancelled or crashed fetch left unanswered, so waiters don't hang."""
+    _player_fetch_tasks.discard(task)
+    error = None if task.cancelled() else task.exception()
+    for pid, fut in futures.items():
+        if fut.done():
+            continue
+        if _player_inflight.get(pid) is fut:
+            _player_inflight.pop(pid, None)
+        if error is None:
+            fut.cancel()
+        else:
+            fut.set_exception(error)
+
+async def _fetch_player_batch(batch: List[str], futures: Dict[str, asyncio.Future]):
+    for i in range(0, len(batch), _PLAYER_BATCH_MAX):
+        chunk = batch[i:i + _PLAYER_BATCH_MAX]
+        found = {}
+        try:
+            _PLAYER_LOADER_STATS["queries"] += 1
+            db = get_db()
+            async for doc in db.players.find({"player_id": {"$in": chunk}}):
+                doc.pop('_id', None)
+                found[doc["player_id"]] = doc
+        except Exception as e:
+            for pid in chunk:
+                fut = futures.get(pid)
+                if _player_inflight.get(pid) is fut:
+                    _player_inflight.pop(pid, None)
+                if fut is not None and not fut.done():
+                    fut.set_exception(e)
+            continue
+        for pid in chunk:
+            data = found.get(pid)
+            fut = futures.get(pid)
+            if _player_inflight.get(pid) is fut:
+                _player_inflight.pop(pid, None)
+                if data is not None:
+                    _cache_player(pid, data)
+            if fut is not None and not fut.done():
+                fut.set_result(data)
 
 async def get_player(player_id: str) -> Optional[Dict[str, Any]]:
-    # Simple LRU-like cache retrieval
-    if player_id in _player_cache:
-        # Move to end to mark as recently used
-        data = _player_cache.pop(player_id)
-        _player_cache[player_id] = data
+    data = _cached_player(player_id)
+    if data is not None:
         return data
-
+    fut = _request_players([player_id])[player_id]
+    return await asyncio.shield(fut)  # A cancelled caller must not cancel the shared fetch
+
+async def get_players(player_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+    """Fetches many players at once: cache hits locally, all misses in one $in query.
+    Returns {player_id: doc}; unknown IDs are left out."""
+    found = {}
+    missing = []
+    for pid in dict.fromkeys(player_ids):  # De-duplicate, keep order
+        data = _cached_player(pid)
+        if data is not None:
+            found[pid] = data
+        else:
+            missing.append(pid)
+    if missing:
+        futures = _request_players(missing)
+        results = await asyncio.gather(*[asyncio.shield(f) for f in futures.values()])
+        for pid, data in zip(futures.keys(), results):
+            if data is not None:
+                found[pid] = data
+    return found
+
+async def get_players_uncached(player_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+    """Like get_players, but misses are read straight from Mongo and not cached.
+    For whole-pool scans (feature tables) that would otherwise flush the live LRU."""
+    found = {}
+    missing = []
+    for pid in dict.fromkeys(player_ids):
+        data = _player_cache.get(pid)  # Peek only — a scan shouldn't reorder the LRU
+        if data is not None:
+            found[pid] = data
+        else:
+            missing.append(pid)
     db = get_db()
-    data = await db.players.find_one({"player_id": player_id})
-    if data:
-        data.pop('_id', None)
-        # Cache management
-        if len(_player_cache) >= CACHE_MAX_SIZE:
-            # Pop oldest (first item in dict)
-            _player_cache.pop(next(iter(_player_cache)))
-        _player_cache[player_id] = data
-        return data
-    return None
+    for i in range(0, len(missing), _PLAYER_BATCH_MAX):
+        chunk = missing[i:i + _PLAYER_BATCH_MAX]
+        _PLAYER_LOADER_STATS["queries"] += 1
+        async for doc in db.players.find({"player_id": {"$in": chunk}}):
+            doc.pop('_id', None)
+            found[doc["player_id"]] = doc
+    return found
+
+def get_player_loader_stats() -> Dict[str, int]:
+    return {**_PLAYER_LOADER_STATS, "cached": len(_player_cache), "inflight": len(_player_inflight)}
+
+def invalidate_player_cache(player_id: str):
+    """Drops one player from the cache (and detaches any in-flight fetch of it)."""
+    from game.models import forget_player
+    forget_player(player_id)
+    _player_inflight.pop(player_id, None)
+    if _player_cache.pop(player_id, None) is not None:
+        _PLAYER_LOADER_STATS["invalidations"] += 1
 
 def clear_player_cache():
     """Manually clear the player cache."""
     global _player_cache
+    from game.models import clear_player_registry
     _player_cache.clear()
+    _player_inflight.clear()
+    clear_player_registry()
     logger.info("Player cache cleared manually.")
 
+# ── Targeted invalidation ───────────────────────────────────────────────────
+# A single player edit used to wipe the whole 3,500-entry player cache (and
+# the card pools), cold-starting every live match. Now only that player's
+# entry is dropped, and the cached mode / card pools are patched in place:
+# the player is re-checked against each cached pool's own query, so the
+# eligibility rules live in exactly one place.
+_POOL_CACHE_STATS = {
+    "mode_hits": 0, "mode_misses": 0, "mode_patches": 0,
+    "card_hits": 0, "card_misses": 0, "card_patches": 0,
+}
+
+# Bumped on every player change; a pool rebuild that raced one isn't cached
+# (its query may predate the edit the patch already skipped for it)
+_pool_edit_seq = 0
+
+async def _player_changed(player_id: str, deleted: bool = False, cards_only: bool = False):
+    """Call after any write to a player document."""
+    global _pool_edit_seq
+    _pool_edit_seq += 1
+    invalidate_player_cache(player_id)
+    if not cards_only:
+        _invalidate_player_features(player_id)
+        await _patch_mode_pools(player_id, deleted)
+    await _patch_card_pools(player_id, deleted)
+
+def _invalidate_player_features(player_id: str):
+    from game.features import invalidate_player
+    invalidate_player(player_id)
+
+async def _patch_mode_pools(player_id: str, deleted: bool):
+    # Snapshots are copy-on-write: holders of the old one keep a consistent view
+    db = get_db()
+    for mode in list(_mode_pool_cache):
+        eligible = False
+        if not deleted:
+            try:
+                eligible = await db.players.find_one(
+                    {"$and": [{"player_id": player_id}, _mode_pool_query(mode)]}, {"_id": 1}
+                ) is not None
+            except Exception as e:
+                logger.warning(f"Mode pool patch failed for {mode}, dropping cache: {e}")
+                _mode_pool_cache.pop(mode, None)
+                continue
+        # Re-read after the await: another patch or a rebuild may have swapped the snapshot
+        pool = _mode_pool_cache.get(mode)
+        if pool is None:
+            continue
+        if eligible and player_id not in pool:
+            _mode_pool_cache[mode] = pool.with_player(player_id)
+        elif not eligible and player_id in pool:
+            _mode_pool_cache[mode] = pool.without_player(player_id)
+        _POOL_CACHE_STATS["mode_patches"] += 1
+
+async def _patch_card_pools(player_id: str, deleted: bool):
+    db = get_db()
+    for sport in list(_card_pool_cache):
+        doc = None
+        if not deleted:
+            query, formats = _card_pool_query(sport)
+            try:
+                doc = await db.players.find_one({"$and": [{"player_id": player_id}, query]}, _CARD_POOL_PROJECTION)
+            except Exception as e:
+                logger.warning(f"Card pool patch failed for {sport}, dropping cache: {e}")
+                _card_pool_cache.pop(sport, None)
+                continue
+        # Patch the pool cached now, not the one seen before the await
+        pool = _card_pool_cache.get(sport)
+        if pool is None:
+            continue
+        pool[:] = [c for c in pool if c["player_id"] != player_id]
+        if doc:
+            pool.extend(_card_pool_entries(doc, formats))
+        _POOL_CACHE_STATS["card_patches"] += 1
+
+def get_cache_stats() -> Dict[str, int]:
+    from game.models import get_player_registry_stats
+    registry = {f"registry_{k}": v for k, v in get_player_registry_stats().items()}
+    return {**get_player_loader_stats(), **_POOL_CACHE_STATS, **registry}
+
+async def apply_remote_player_change(player_id: Optional[str], deleted: bool = False, cards_only: bool = False):
+    """A player document changed outside this process (utils/cache_sync.py).
+    player_id=None means it can't be identified (e.g. a delete event): drop all player-derived caches."""
+    if player_id:
+        await _player_changed(player_id, deleted=deleted, cards_only=cards_only)
+        return
+    clear_player_cache()
+    _mode_pool_cache.clear()
+    _invalidate_card_pool_cache()
+
 async def get_player_by_name_and_sport(name_query: str, sport: str) -> Optional[Dict[str, Any]]:
     """
     Sport-aware name lookup — prevents name conflicts across modes.
@@ -194,16 +519,18 @@ async def delete_player(identifier: str) -> bool:
     db = get_db()
     
     # Try ID First
-    res = await db.players.delete_one({"player_id": identifier})
-    if res.deleted_count > 0:
-        clear_player_cache()
-        return True
-        
-    regex = f"^{identifier}$"
-    res = await db.players.delete_one({"name": {"$regex": regex, "$options": "i"}})
-    
-    clear_player_cache()
-    return res.deleted_count > 0
+    doc = await db.players.find_one_and_delete({"player_id": identifier}, projection={"player_id": 1})
+    if doc is None:
+        regex = f"^{identifier}$"
+        doc = await db.players.find_one_and_delete(
+            {"name": {"$regex": regex, "$options": "i"}}, projection={"player_id": 1}
+        )
+    if doc is None:
+        return False
+    _remember_own_write(("_id", doc["_id"]), datetime.datetime.utcnow())
+    if doc.get("player_id"):
+        await _player_changed(doc["player_id"], deleted=True)
+    return True
 
 async def get_all_players() -> list:
     db = get_db()
@@ -221,7 +548,17 @@ async def get_eligible_players_for_mode(mode: str) -> List[str]:
     """
     db = get_db()
     draft_pool_ids = []
-    
+
+    # Projection to return ONLY the player_id string
+    cursor = db.players.find(_mode_pool_query(mode), {"player_id": 1, "_id": 0})
+    async for doc in cursor:
+        if "player_id" in doc:
+            draft_pool_ids.append(doc["player_id"])
+            
+    return draft_pool_ids
+
+def _mode_pool_query(mode: str) -> Dict[str, Any]:
+    """Mongo filter selecting the players eligible for a draft mode."""
     if mode == "FIFA":
         # FIFA Memory Optimization: Only pull players meeting criteria
         query = {
@@ -248,42 +585,192 @@ async def get_eligible_players_for_mode(mode: str) -> List[str]:
         else:
             search_key = _m
         query = {f"stats.{search_key}": {"$ne": None}}
+    return query
 
-    # Projection to return ONLY the player_id string
-    cursor = db.players.find(query, {"player_id": 1, "_id": 0})
-    async for doc in cursor:
-        if "player_id" in doc:
-            draft_pool_ids.append(doc["player_id"])
-            
-    return draft_pool_ids
+class ModePool:
+    """
+    Read-only snapshot of a mode's eligible player IDs, sorted, with O(1)
+    membership and position lookups. Shared by every caller — never mutate
+    it; a player edit swaps in a new snapshot instead.
+    """
+    __slots__ = ("mode", "ids", "index", "_fingerprint")
+
+    def __init__(self, mode: str, ids):
+        self.mode = mode
+        self.ids: Tuple[str, ...] = tuple(sorted(set(ids)))
+        self.index: Dict[str, int] = {pid: i for i, pid in enumerate(self.ids)}
+        self._fingerprint: Optional[str] = None
+
+    @property
+    def fingerprint(self) -> str:
+        """pool_fingerprint of the IDs (computed once per snapshot)."""
+        if self._fingerprint is None:
+            from utils.randomizer import pool_fingerprint
+            self._fingerprint = pool_fingerprint(self.ids)
+        return self._fingerprint
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __iter__(self):
+        return iter(self.ids)
 
-async def get_cached_pool_for_mode(mode: str) -> List[str]:
+    def __contains__(self, player_id):
+        return player_id in self.index
+
+    def __getitem__(self, i):
+        return self.ids[i]
+
+    def with_player(self, player_id: str) -> "ModePool":
+        return ModePool(self.mode, self.ids + (player_id,))
+
+    def without_player(self, player_id: str) -> "ModePool":
+        return ModePool(self.mode, (pid for pid in self.ids if pid != player_id))
+
+async def get_cached_pool_for_mode(mode: str) -> ModePool:
     """
-    Returns eligible player IDs for the given mode, using a 5-minute in-memory cache.
-    Avoids re-querying MongoDB on every match load — critical for pool delta optimization.
+    Returns the eligible-player snapshot for the given mode (shared, read-only — copy
+    it with list() before changing it). Avoids re-querying MongoDB on every match load.
     """
     import time
     now = time.time()
     if mode in _mode_pool_cache and (now - _mode_pool_cache_time.get(mode, 0)) < MODE_POOL_CACHE_TTL:
-        return list(_mode_pool_cache[mode])  # Return a copy
-    pool = await get_eligible_players_for_mode(mode)
+        _POOL_CACHE_STATS["mode_hits"] += 1
+        return _mode_pool_cache[mode]
+    _POOL_CACHE_STATS["mode_misses"] += 1
+    seq = _pool_edit_seq
+    pool = ModePool(mode, await get_eligible_players_for_mode(mode))
+    if seq != _pool_edit_seq:
+        return pool  # A player changed mid-query — serve it, but rebuild next time
     _mode_pool_cache[mode] = pool
     _mode_pool_cache_time[mode] = now
     logger.debug(f"Mode pool cache refreshed for {mode}: {len(pool)} players")
-    return list(pool)
+    return pool
 
-async def save_match(match_id: str, chat_id: int, state_data: Dict[str, Any]):
+# ── Deck pool snapshots ─────────────────────────────────────────────────────
+# A match's deck is (pool, seed, cursor), but the mode pool changes whenever a
+# player is added, removed or edited. Each match records the fingerprint of the
+# pool it was dealt from and every distinct pool is stored once in `deck_pools`,
+# so a deck rebuilt after a restart or pool change (or replayed for an audit)
+# deals the same cards.
+_deck_pool_cache: Dict[str, Tuple[str, ...]] = {}  # {fingerprint: sorted ids}
+_DECK_POOL_CACHE_MAX = 32
+
+def _remember_deck_pool(fingerprint: str, ids: Tuple[str, ...]):
+    if fingerprint not in _deck_pool_cache and len(_deck_pool_cache) >= _DECK_POOL_CACHE_MAX:
+        _deck_pool_cache.pop(next(iter(_deck_pool_cache)))
+    _deck_pool_cache[fingerprint] = ids
+
+async def save_deck_pool(pool: ModePool) -> str:
+    """Stores the pool snapshot (once per distinct pool) and returns its fingerprint."""
+    fingerprint = pool.fingerprint
+    if fingerprint not in _deck_pool_cache:
+        try:
+            await get_db().deck_pools.update_one(
+                {"fingerprint": fingerprint},
+                {"$setOnInsert": {"mode": pool.mode, "ids": list(pool.ids),
+                                  "created_at": datetime.datetime.utcnow()}},
+                upsert=True,
+            )
+        except DuplicateKeyError:
+            pass  # Another worker stored the same pool first
+        _remember_deck_pool(fingerprint, pool.ids)
+    return fingerprint
+
+async def get_deck_pool(fingerprint: str) -> Optional[Tuple[str, ...]]:
+    """The stored pool IDs for a fingerprint, or None if it was never saved."""
+    ids = _deck_pool_cache.get(fingerprint)
+    if ids is None:
+        doc = await get_db().deck_pools.find_one({"fingerprint": fingerprint}, {"ids": 1})
+        if doc is None:
+            return None
+        ids = tuple(doc["ids"])
+        _remember_deck_pool(fingerprint, ids)
+    return ids
+
+def _match_lookup_fields(state_data: Dict[str, Any]) -> Dict[str, Any]:
+    """Top-level copies kept on every match document for indexed lookups:
+    `participants` (both owner IDs, multikey) and `state`."""
+    return {
+        "participants": [state_data.get(side, {}).get("owner_id") for side in ("team_a", "team_b")],
+        "state": state_data.get("state"),
+    }
+
+async def save_matches_bulk(writes: List[Dict[str, Any]]) -> Dict[str, Optional[Dict[str, Any]]]:
+    """
+    Flushes several match updates in a single bulk_write round-trip.
+    Each entry: {match_id, chat_id, state_data, update, upsert, version, token} where
+    update holds Mongo operators ($set/$unset/$push) on dotted state_data paths.
+
+    Every op is a compare-and-swap on the document's `version` (the value the
+    caller last read) and bumps it by one. Returns the writes that lost the race:
+    {match_id: {"version", "state_data"}} with the current document, or None
+    if the match was deleted meanwhile. An empty dict means everything applied.
+    """
+    if not writes:
+        return {}
     db = get_db()
-    await db.matches.update_one(
-        {"match_id": match_id},
-        {"$set": {
-            "state_data": state_data, 
-            "chat_id": chat_id,
-            "last_updated": datetime.datetime.utcnow() 
-        }},
-        upsert=True
+    now = datetime.datetime.utcnow()
+    ops = []
+    for w in writes:
+        update = {op: dict(fields) for op, fields in w["update"].items() if fields}
+        update.setdefault("$set", {}).update({
+            "chat_id": w["chat_id"],
+            **_match_lookup_fields(w["state_data"]),
+            "last_updated": now,
+            "last_writer": w["token"],  # Lets us tell which CAS ops applied
+        })
+        update["$inc"] = {"version": 1}
+        expected = w.get("version", 0)
+        # Docs written before versioning have no field — treat them as version 0
+        version_filter = {"$in": [0, None]} if expected == 0 else expected
+        ops.append(UpdateOne(
+            {"match_id": w["match_id"], "version": version_filter},
+            update,
+            upsert=w.get("upsert", False),
+        ))
+    try:
+        result = await db.matches.bulk_write(ops, ordered=False)
+        applied = result.matched_count + result.upserted_count
+    except BulkWriteError as e:
+        # A lost CAS on an upsert shows up as a duplicate match_id insert
+        if any(err.get("code") != 11000 for err in e.details.get("writeErrors", [])):
+            raise
+        applied = -1
+    logger.debug(f"Bulk-saved {len(ops)} match(es) to Mongo")
+    if applied == len(ops):
+        return {}
+
+    # Some CAS ops missed — one read tells us which, and hands back the winner's state
+    tokens = {w["match_id"]: w["token"] for w in writes}
+    cursor = db.matches.find(
+        {"match_id": {"$in": list(tokens)}},
+        {"match_id": 1, "version": 1, "last_writer": 1, "state_data": 1, "_id": 0}
     )
-    logger.debug(f"Saved match {match_id} to Mongo")
+    current = {doc["match_id"]: doc async for doc in cursor}
+    conflicts = {}
+    for mid, token in tokens.items():
+        doc = current.get(mid)
+        if doc is None:
+            conflicts[mid] = None
+        elif doc.get("last_writer") != token:
+            conflicts[mid] = {"version": doc.get("version", 0), "state_data": doc.get("state_data")}
+    return conflicts
+
+async def get_match_versioned(match_id: str) -> Tuple[Optional[Dict[str, Any]], int]:
+    """Like get_match, but also returns the document version for compare-and-swap saves."""
+    db = get_db()
+    doc = await db.matches.find_one({"match_id": match_id}, {"state_data": 1, "version": 1, "_id": 0})
+    if not doc:
+        logger.debug(f"Match not found: {match_id}")
+        return None, 0
+    return doc.get("state_data"), doc.get("version", 0)
+
+async def get_match_version(match_id: str) -> Optional[int]:
+    """Just the document version (None if the match is gone) — checks a cached match is current."""
+    db = get_db()
+    doc = await db.matches.find_one({"match_id": match_id}, {"version": 1, "_id": 0})
+    return doc.get("version", 0) if doc else None
 
 async def get_match(match_id: str) -> Optional[Dict[str, Any]]:
     db = get_db()
@@ -293,32 +780,92 @@ async def get_match(match_id: str) -> Optional[Dict[str, Any]]:
     logger.debug(f"Match not found: {match_id}")
     return None
     
+async def get_match_chat_id(match_id: str) -> Optional[int]:
+    """Group chat a match is played in (used to route DM swap updates to its shard)."""
+    db = get_db()
+    doc = await db.matches.find_one({"match_id": match_id}, {"chat_id": 1, "_id": 0})
+    return doc.get("chat_id") if doc else None
+
 async def clear_all_matches():
     db = get_db()
     await db.matches.delete_many({})
+    await db.match_slots.delete_many({})
+
+# ── Active-match slots ──────────────────────────────────────────────────────
+# The one-live-match limit used to be a count of active matches followed by the
+# match insert, so two joins by the same user at once (concurrent updates, or
+# chats owned by different workers) both passed. Now every player holds one
+# `match_slots` document {user_id, match_id, claimed_at} with a unique user_id:
+# a join claims both players' slots atomically before the match is created.
+# Slots aren't released when a match ends — the next claim takes over a slot
+# whose match is no longer DRAFTING/READY_CHECK (or never got created).
+_ACTIVE_STATES = ["DRAFTING", "READY_CHECK"]
+_SLOT_CREATE_GRACE = 15  # seconds a claimed slot may wait for its match document
+
+async def _claim_match_slot(user_id: int, match_id: str, now: float) -> bool:
+    db = get_db()
+    for _ in range(2):
+        try:
+            res = await db.match_slots.update_one(
+                {"user_id": user_id},
+                {"$setOnInsert": {"match_id": match_id, "claimed_at": now}},
+                upsert=True,
+            )
+        except DuplicateKeyError:
+            continue  # Someone else inserted it first — look at theirs
+        if res.matched_count == 0:
+            return True  # Inserted — the slot was free
+        slot = await db.match_slots.find_one({"user_id": user_id}, {"_id": 0})
+        if slot is None:
+            continue  # Removed meanwhile (/reset_matches) — try the insert again
+        held = slot.get("match_id")
+        if held == match_id:
+            return True
+        live = await db.matches.find_one({"match_id": held}, {"state": 1, "state_data.state": 1, "_id": 0})
+        if live is not None and (live.get("state") or live.get("state_data", {}).get("state")) in _ACTIVE_STATES:
+            return False
+        if live is None and now - slot.get("claimed_at", 0) < _SLOT_CREATE_GRACE:
+            return False  # Match still being created
+        # Stale slot — take it over, unless another claim got there first
+        res = await db.match_slots.update_one(
+            {"user_id": user_id, "match_id": held},
+            {"$set": {"match_id": match_id, "claimed_at": now}},
+        )
+        return res.modified_count == 1
+    return False
+
+async def claim_match_slots(user_ids: List[int], match_id: str) -> Optional[int]:
+    """Claims the active-match slot of every user for match_id, all or nothing.
+    Returns None on success, or the user_id whose slot is taken."""
+    import time as _t
+    now = _t.time()
+    claimed = []
+    for user_id in user_ids:
+        if not await _claim_match_slot(user_id, match_id, now):
+            await release_match_slots(claimed, match_id)
+            return user_id
+        claimed.append(user_id)
+    return None
+
+async def release_match_slots(user_ids: List[int], match_id: str):
+    """Frees slots claimed for a match that won't be created."""
+    db = get_db()
+    for user_id in user_ids:
+        await db.match_slots.delete_one({"user_id": user_id, "match_id": match_id})
 
 async def count_user_active_matches(user_id: int) -> int:
     """Return how many DRAFTING/READY_CHECK matches this user is currently in."""
     db = get_db()
     return await db.matches.count_documents({
-        "state_data.state": {"$in": ["DRAFTING", "READY_CHECK"]},
-        "$or": [
-            {"state_data.team_a.owner_id": user_id},
-            {"state_data.team_b.owner_id": user_id}
-        ]
+        "participants": user_id,
+        "state": {"$in": ["DRAFTING", "READY_CHECK"]},
     })
 
 async def get_user_active_matches_info(user_id: int) -> list:
     """Return lightweight info about a user's active matches for the block message."""
     db = get_db()
     cursor = db.matches.find(
-        {
-            "state_data.state": {"$in": ["DRAFTING", "READY_CHECK"]},
-            "$or": [
-                {"state_data.team_a.owner_id": user_id},
-                {"state_data.team_b.owner_id": user_id}
-            ]
-        },
+        {"participants": user_id, "state": {"$in": ["DRAFTING", "READY_CHECK"]}},
         {
             "state_data.mode": 1,
             "state_data.state": 1,
@@ -374,157 +921,282 @@ async def get_all_chats() -> list:
     cursor = db.chats.find({})
     return [doc['chat_id'] async for doc in cursor]
 
-async def update_user_stats(user_id: int, name: str, result: str,
-                             mode: str = "", chat_id=None):
+def _user_stats_pipeline(name: str, result: str, mode: str = "", chat_id=None,
+                         now: Optional[float] = None, event_id: Optional[str] = None,
+                         coins: int = 0) -> List[Dict]:
     """
-    Updates user stats after a match.
-    mode: 'FIFA', 'IPL', 'International', etc.
-    chat_id: the group where the match was played.
+    Update pipeline recording one match result. Everything that used to need a
+    read first — streaks, best streak, the daily/weekly epochs, first win,
+    join date, the last-5 results — is computed by Mongo from the stored
+    document, so the write is one atomic round-trip even when the AFK forfeit
+    and the simulation hit the same user at once.
+    now: when the match finished (a replayed result lands in its own day/week).
+    event_id / coins: match_results projection — remember the event, award card coins.
     """
     import time as _t
-    db = get_db()
-
-    now = _t.time()
+    from utils.leaderboard import PERIODS, period_epoch
+    now = _t.time() if now is None else now
     is_win = result == "W"
+    win = 1 if is_win else 0
 
-    # --- Fetch current doc to check reset timestamps ---
-    doc = await db.users.find_one({"user_id": user_id}, {
-        "daily_wins": 1, "weekly_wins": 1,
-        "daily_reset_at": 1, "weekly_reset_at": 1,
-        "first_win_at": 1, "joined_at": 1,
-        "current_streak": 1, "best_streak": 1,
-        "_id": 0
-    })
-
-
-    # Next UTC midnight anchor
-    dt = _t.gmtime(now)
-    midnight = _t.mktime(_t.strptime(
-        f"{dt.tm_year}-{dt.tm_mon:02d}-{dt.tm_mday:02d} 00:00:00", "%Y-%m-%d %H:%M:%S"
-    ))
-    if midnight <= now:
-        midnight += 86400
-
-    # Next Monday UTC anchor
-    days_until_monday = (7 - dt.tm_wday) % 7 or 7
-    monday = midnight + (days_until_monday - 1) * 86400
-
-    # Determine which period counters need resetting
-    daily_reset_at  = (doc or {}).get("daily_reset_at",  0)
-    weekly_reset_at = (doc or {}).get("weekly_reset_at", 0)
-    reset_daily  = now >= daily_reset_at
-    reset_weekly = now >= weekly_reset_at
+    def inc(field: str, by: int) -> Dict:
+        return {"$add": [{"$ifNull": [f"${field}", 0]}, by]}
 
     # Determine sport
     mode_upper = mode.upper() if mode else ""
-    is_fifa    = "FIFA" in mode_upper
-    is_wwe     = "WWE"  in mode_upper
-    if is_wwe:
+    if "WWE" in mode_upper:
         sport_win_field = "wwe_wins"
-    elif is_fifa:
+    elif "FIFA" in mode_upper:
         sport_win_field = "fifa_wins"
     else:
         sport_win_field = "cricket_wins"
 
-    # Build $set — never overlap with $inc fields
-    set_updates: dict = {"name": name, "user_id": user_id}
+    streak = inc("current_streak", 1) if is_win else 0
+    fields: Dict[str, Any] = {
+        "name": {"$literal": name},
+        "last_modified": datetime.datetime.utcnow(),
+        "total_matches": inc("total_matches", 1),
+        "wins": inc("wins", win),
+        "losses": inc("losses", 1 if result == "L" else 0),
+        "draws": inc("draws", 1 if result == "D" else 0),
+        sport_win_field: inc(sport_win_field, win),
+        "current_streak": streak,
+        "best_streak": {"$max": [{"$ifNull": ["$best_streak", 0]}, streak]},
+        "recent_results": {"$slice": [
+            {"$concatArrays": [{"$ifNull": ["$recent_results", []]}, [{"$literal": result}]]}, -5]},
+        "joined_at": {"$ifNull": ["$joined_at", now]},  # Set once, on the first match
+    }
+    if is_win:
+        fields["last_win_at"] = now
+        fields["first_win_at"] = {"$ifNull": ["$first_win_at", now]}
+        if chat_id:
+            fields[f"chat_wins.{chat_id}"] = inc(f"chat_wins.{chat_id}", 1)
+    if coins:
+        fields["card_coins"] = inc("card_coins", coins)
+    if event_id is not None:
+        fields["results_applied"] = {"$slice": [
+            {"$concatArrays": [{"$ifNull": ["$results_applied", []]}, [{"$literal": event_id}]]},
+            -_RESULTS_APPLIED_KEEP]}
+
+    # Daily / weekly: add to the counter while its epoch is current, otherwise
+    # start the period (carrying a still-running legacy daily_wins counter).
+    # A result older than the stored period leaves it alone.
+    for period in PERIODS:
+        epoch = period_epoch(period, now)
+        legacy = {"$cond": [{"$gt": [{"$ifNull": [f"${period}_reset_at", 0]}, now]},
+                            {"$ifNull": [f"${period}_wins", 0]}, 0]}
+        fields[period] = {"$cond": [{"$gt": [f"${period}.epoch", epoch]}, f"${period}", {
+            "epoch": epoch, "wins": {"$add": [
+                {"$cond": [{"$eq": [f"${period}.epoch", epoch]}, f"${period}.wins", legacy]}, win]}}]}
+
+    return [
+        {"$set": fields},
+        {"$unset": [f"{period}_{suffix}" for period in PERIODS for suffix in ("wins", "reset_at")]},
+    ]
 
-    if reset_daily:
-        # Write the final value directly into $set (avoids $set/$inc conflict)
-        set_updates["daily_wins"]     = 1 if is_win else 0
-        set_updates["daily_reset_at"] = midnight
-    if reset_weekly:
-        set_updates["weekly_wins"]     = 1 if is_win else 0
-        set_updates["weekly_reset_at"] = monday
 
-    if not doc:
-        # New user — set anchor timestamps only.
-        # DO NOT initialise cricket_wins/fifa_wins in $set — $inc handles them
-        # (MongoDB auto-creates missing fields starting from 0).
-        if not reset_daily:
-            set_updates["daily_reset_at"]  = midnight
-        if not reset_weekly:
-            set_updates["weekly_reset_at"] = monday
+def _publish_user_stats(docs: List[Optional[Dict]]):
+    """Moves these users in the in-memory rank index (or drops query caches until it's loaded)."""
+    from utils.leaderboard import leaderboard
+    try:
+        applied = [leaderboard.apply_user(doc) for doc in docs]
+        if not all(applied):
+            from handlers.standings import invalidate_lb_cache
+            invalidate_lb_cache()
+    except Exception as e:
+        logger.warning(f"Leaderboard update failed: {e}")
 
-    if is_win:
-        set_updates["last_win_at"] = now
-        if not (doc and doc.get("first_win_at")):
-            set_updates["first_win_at"] = now
-
-    # Build $inc — only fields NOT already handled by $set above
-    inc_updates: dict = {
-        "total_matches": 1,
-        "wins":    1 if is_win else 0,
-        "losses":  1 if result == "L" else 0,
-        "draws":   1 if result == "D" else 0,
-    }
-    # sport_win_field: only add to $inc if NOT already in $set
-    if sport_win_field not in set_updates:
-        inc_updates[sport_win_field] = 1 if is_win else 0
-    # daily_wins / weekly_wins: only $inc if not reset (already written via $set)
-    if not reset_daily:
-        inc_updates["daily_wins"]  = 1 if is_win else 0
-    if not reset_weekly:
-        inc_updates["weekly_wins"] = 1 if is_win else 0
-
-    ops: dict = {
-        "$set": set_updates,
-        "$inc": inc_updates,
-        "$push": {
-            "recent_results": {
-                "$each": [result],
-                "$slice": -5
-            }
-        }
-    }
 
-    # Per-chat wins (only for wins)
-    if is_win and chat_id:
-        ops["$inc"][f"chat_wins.{chat_id}"] = 1
+async def update_user_stats(user_id: int, name: str, result: str,
+                             mode: str = "", chat_id=None):
+    """
+    Updates user stats after a match.
+    mode: 'FIFA', 'IPL', 'International', etc.
+    chat_id: the group where the match was played.
+    """
+    from utils.leaderboard import LEADERBOARD_PROJECTION
+    db = get_db()
+    doc = await db.users.find_one_and_update(
+        {"user_id": user_id}, _user_stats_pipeline(name, result, mode, chat_id),
+        projection=LEADERBOARD_PROJECTION, upsert=True, return_document=True
+    )
+    _publish_user_stats([doc])
 
-    # Streak tracking
-    current_streak = (doc.get("current_streak", 0) if doc else 0)
-    if is_win:
-        current_streak += 1
-    else:
-        current_streak = 0
-    set_updates["current_streak"] = current_streak
-    best_streak = doc.get("best_streak", 0) if doc else 0
-    if current_streak > best_streak:
-        set_updates["best_streak"] = current_streak
 
-    # Join date — set only once on first match
-    if not doc or not doc.get("joined_at"):
-        set_updates["joined_at"] = now
+async def bulk_update_user_stats(results: List[Tuple[int, str, str]], mode: str = "", chat_id=None):
+    """
+    update_user_stats for every participant of one match: [(user_id, name, result), ...]
+    in a single unordered bulk_write, then one find to refresh the rank index.
+    """
+    from utils.leaderboard import LEADERBOARD_PROJECTION
+    if not results:
+        return
+    import time as _t
+    db = get_db()
+    now = _t.time()
+    await db.users.bulk_write([
+        UpdateOne({"user_id": user_id}, _user_stats_pipeline(name, result, mode, chat_id, now), upsert=True)
+        for user_id, name, result in results
+    ], ordered=False)
+    ids = [user_id for user_id, _, _ in results]
+    docs = [doc async for doc in db.users.find({"user_id": {"$in": ids}}, LEADERBOARD_PROJECTION)]
+    _publish_user_stats(docs)
+
+# ── Match result log ─────────────────────────────────────────────────────────
+# Finished matches are appended to `match_results` (see game/results.py) and
+# folded into users by the projector. Events are never edited; projected_at is
+# the only field written after the insert.
+_RESULTS_APPLIED_KEEP = 20  # Event ids each user remembers, so a re-projected event counts once
+_USER_STAT_FIELDS = ("total_matches", "wins", "losses", "draws", "cricket_wins", "fifa_wins", "wwe_wins",
+                     "current_streak", "best_streak", "recent_results", "chat_wins", "daily", "weekly",
+                     "first_win_at", "last_win_at", "results_applied")
+
+async def append_match_result(event: Dict) -> bool:
+    """Durably logs a finished match. Returns False if this event_id was already logged."""
+    db = get_db()
+    doc = {k: v for k, v in event.items() if k != "event_id"}
+    res = await db.match_results.update_one(
+        {"event_id": event["event_id"]}, {"$setOnInsert": {**doc, "projected_at": None}}, upsert=True
+    )
+    return res.matched_count == 0
 
-    await db.users.update_one({"user_id": user_id}, ops, upsert=True)
+async def get_pending_match_results(limit: int = 100) -> List[Dict]:
+    """Logged results not yet folded into users, oldest first."""
+    db = get_db()
+    cursor = db.match_results.find({"projected_at": None}, {"_id": 0}).sort("finished_at", 1).limit(limit)
+    return [doc async for doc in cursor]
 
-    # Invalidate leaderboard cache
-    try:
-        from handlers.standings import invalidate_lb_cache
-        invalidate_lb_cache()
-    except Exception:
-        pass
+async def mark_match_results_projected(event_ids: List[str]):
+    import time as _t
+    db = get_db()
+    await db.match_results.update_many(
+        {"event_id": {"$in": event_ids}}, {"$set": {"projected_at": _t.time()}}
+    )
+
+async def project_match_results(events: List[Dict], award_coins: bool = True,
+                                user_ids: Optional[set] = None) -> int:
+    """
+    Folds logged results into users in one ordered bulk_write, so a user's events
+    apply in finish order. A user who already applied an event is skipped: the
+    filter excludes them, and the upsert then hits the unique user_id index.
+    The same duplicate-key error also comes from racing another upsert that
+    created the user first, so each one is checked against results_applied and
+    retried if the event isn't recorded yet.
+    Refreshes the rank index. Returns the user writes applied.
+    user_ids: only fold these participants (stats rebuilds).
+    """
+    ops, keys, touched = [], [], set()
+    for ev in events:
+        for team in ev.get("teams", []):
+            uid = team.get("owner_id")
+            if not team.get("result") or (user_ids is not None and uid not in user_ids):
+                continue  # e.g. the opponent of an AFK forfeit gets no result
+            touched.add(uid)
+            ops.append(UpdateOne(
+                {"user_id": uid, "results_applied": {"$ne": ev["event_id"]}},
+                _user_stats_pipeline(team.get("owner_name", "Player"), team["result"], ev.get("mode", ""),
+                                     ev.get("chat_id"), now=ev["finished_at"], event_id=ev["event_id"],
+                                     coins=team.get("coins", 0) if award_coins else 0),
+                upsert=True,
+            ))
+            keys.append((uid, ev["event_id"]))
+    if not ops:
+        return 0
+    db = get_db()
+    applied = 0
+    retried = None
+    while ops:
+        try:
+            res = await db.users.bulk_write(ops, ordered=True)
+            applied += res.matched_count + res.upserted_count
+            break
+        except BulkWriteError as e:
+            err = e.details["writeErrors"][0]
+            if err.get("code") != 11000:
+                raise
+            applied += e.details.get("nMatched", 0) + e.details.get("nUpserted", 0)
+            i = err["index"]
+            uid, event_id = keys[i]
+            if await db.users.find_one({"user_id": uid, "results_applied": event_id}, {"_id": 1}):
+                i += 1  # Already applied — skip it
+            elif retried == (uid, event_id):
+                raise  # The document exists now, so a second duplicate isn't a race
+            else:
+                retried = (uid, event_id)  # Lost the insert race: the retry matches the new document
+            # Ordered: everything from here on is still to do
+            ops, keys = ops[i:], keys[i:]
+
+    from utils.leaderboard import LEADERBOARD_PROJECTION
+    docs = [doc async for doc in db.users.find({"user_id": {"$in": list(touched)}}, LEADERBOARD_PROJECTION)]
+    _publish_user_stats(docs)
+    return applied
+
+async def rebuild_user_stats_from_log(user_ids: List[int], batch: int = 500) -> int:
+    """
+    Recomputes the match stats of user_ids (wins, streaks, period and chat wins,
+    recent results) from match_results — e.g. after a stats bug (/rebuildstats).
+    Card coins are not re-awarded. Matches played before the log existed are not
+    in it, so their stats are lost for the rebuilt users.
+    Returns the number of results replayed.
+    """
+    wanted = set(user_ids)
+    if not wanted:
+        return 0
+    db = get_db()
+    await db.users.update_many({"user_id": {"$in": list(wanted)}},
+                               {"$unset": {field: "" for field in _USER_STAT_FIELDS}})
+    replayed = 0
+    cursor = db.match_results.find({"teams.owner_id": {"$in": list(wanted)}}, {"_id": 0}).sort("finished_at", 1)
+    events = []
+    async for ev in cursor:
+        events.append(ev)
+        if len(events) >= batch:
+            replayed += await project_match_results(events, award_coins=False, user_ids=wanted)
+            events = []
+    replayed += await project_match_results(events, award_coins=False, user_ids=wanted)
+    from utils.leaderboard import leaderboard
+    if leaderboard.loaded:
+        await leaderboard.load()
+    logger.info(f"Rebuilt stats of {len(wanted)} user(s) from {replayed} logged result(s)")
+    return replayed
 
 async def get_user_stats(user_id: int) -> Optional[Dict[str, Any]]:
     db = get_db()
     return await db.users.find_one({"user_id": user_id})
 
 # ── Banner helpers ──────────────────────────────────────────────────────────
+# Looked up on every draw/assign — cached; cache_sync.py invalidates on remote edits
+_banner_cache: Dict[str, Optional[str]] = {}
+_banner_cache_time: Dict[str, float] = {}
+BANNER_CACHE_TTL = 600  # seconds
+
 async def get_banner(mode: str) -> Optional[str]:
     """Return the overridden banner URL for 'mode' (ipl/intl/fifa), or None."""
+    import time
+    now = time.time()
+    if mode in _banner_cache and now - _banner_cache_time.get(mode, 0) < BANNER_CACHE_TTL:
+        return _banner_cache[mode]
     db = get_db()
     doc = await db.config.find_one({"key": f"banner_{mode}"})
-    return doc["value"] if doc else None
+    _banner_cache[mode] = doc["value"] if doc else None
+    _banner_cache_time[mode] = now
+    return _banner_cache[mode]
 
 async def set_banner(mode: str, url: str) -> None:
     """Persist a banner URL override for the given mode."""
     db = get_db()
     await db.config.update_one(
         {"key": f"banner_{mode}"},
-        {"$set": {"key": f"banner_{mode}", "value": url}},
+        {"$set": {"key": f"banner_{mode}", "value": url, "last_modified": datetime.datetime.utcnow()}},
         upsert=True
     )
+    invalidate_banner_cache(mode)
+
+def invalidate_banner_cache(mode: Optional[str] = None):
+    if mode is None:
+        _banner_cache.clear()
+    else:
+        _banner_cache.pop(mode, None)
 
 # ── Pending Challenge persistence (survives restarts) ───────────────────────
 import time as _time_mod
@@ -564,6 +1236,27 @@ async def get_stale_challenges(expiry_secs: int = 120) -> list:
     cursor = db.pending_challenges.find({"created_at": {"$lt": cutoff}})
     return await cursor.to_list(length=200)
 
+# ── Durable timers (utils/timers.py) ────────────────────────────────────────
+
+async def save_timer(doc: Dict[str, Any]) -> None:
+    """Upsert a timer by its deterministic _id (rescheduling replaces it)."""
+    db = get_db()
+    await db.timers.replace_one({"_id": doc["_id"]}, {**doc, "updated_at": _time_mod.time()}, upsert=True)
+
+async def delete_timer(timer_id: str) -> None:
+    db = get_db()
+    await db.timers.delete_one({"_id": timer_id})
+
+async def claim_timer(timer_id: str, due: float) -> bool:
+    """Atomically take ownership of a due timer. False if it was already fired,
+    cancelled or moved to a different due time."""
+    db = get_db()
+    return await db.timers.find_one_and_delete({"_id": timer_id, "due": due}, {"_id": 1}) is not None
+
+async def get_all_timers() -> list:
+    db = get_db()
+    return await db.timers.find({}).sort("due", ASCENDING).to_list(length=None)
+
 # ═══════════════════════════════════════════════════════════════════════════
 # CARD SYSTEM — Database Functions
 # ═══════════════════════════════════════════════════════════════════════════
@@ -662,12 +1355,13 @@ async def get_user_cards(user_id: int, sport_filter: str = None) -> list:
     if not cards:
         return []
 
-    # Enrich with player data
+    # Enrich with player data — one batched fetch instead of a find_one per card
+    players = await get_players([c["player_id"] for c in cards])
     result = []
     for card in cards:
         pid = card["player_id"]
         fmt = card["format"]
-        p = await get_player(pid)
+        p = players.get(pid)
         if not p:
             continue
         card_data = p.get("cards", {}).get(fmt, {})
@@ -900,9 +1594,10 @@ async def add_to_card_catalog(player_id: str, fmt: str, ovr: int, rarity: str) -
     db = get_db()
     await db.players.update_one(
         {"player_id": player_id},
-        {"$set": {f"cards.{fmt}": {"ovr": ovr, "rarity": rarity.lower()}}}
+        {"$set": {f"cards.{fmt}": {"ovr": ovr, "rarity": rarity.lower()},
+                  "last_modified": _own_player_write(player_id)}}
     )
-    clear_player_cache()
+    await _player_changed(player_id, cards_only=True)
     return True
 
 async def update_card_catalog(player_id: str, fmt: str, ovr: int, rarity: str) -> bool:
@@ -913,9 +1608,10 @@ async def update_card_catalog(player_id: str, fmt: str, ovr: int, rarity: str) -
     db = get_db()
     await db.players.update_one(
         {"player_id": player_id},
-        {"$set": {f"cards.{fmt}": {"ovr": ovr, "rarity": rarity.lower()}}}
+        {"$set": {f"cards.{fmt}": {"ovr": ovr, "rarity": rarity.lower()},
+                  "last_modified": _own_player_write(player_id)}}
     )
-    clear_player_cache()
+    await _player_changed(player_id, cards_only=True)
     return True
 
 # ── Card Pack Drawing ─────────────────────────────────────────────────────────
@@ -934,11 +1630,33 @@ async def _build_card_pool(sport: str) -> list:
     """Build and cache the drawable card pool for a sport."""
     now = _time.time()
     if sport in _card_pool_cache and (now - _card_pool_cache_time.get(sport, 0)) < CARD_POOL_CACHE_TTL:
+        _POOL_CACHE_STATS["card_hits"] += 1
         return _card_pool_cache[sport]
+    _POOL_CACHE_STATS["card_misses"] += 1
+
+    query, formats = _card_pool_query(sport)
+    if query is None:
+        return []
 
     db = get_db()
+    seq = _pool_edit_seq
     pool = []
+    async for p in db.players.find(query, _CARD_POOL_PROJECTION):
+        pool.extend(_card_pool_entries(p, formats))
+
+    if seq != _pool_edit_seq:
+        return pool  # A player changed mid-query — serve it, but rebuild next time
+    _card_pool_cache[sport] = pool
+    _card_pool_cache_time[sport] = now
+    return pool
+
+_CARD_POOL_PROJECTION = {"player_id": 1, "name": 1, "cards": 1,
+                         "ipl_image_file_id": 1, "image_file_id": 1,
+                         "wwe_image_url": 1, "fifa_image_url": 1,
+                         "test_image_url": 1}
 
+def _card_pool_query(sport: str) -> Tuple[Optional[Dict[str, Any]], List[str]]:
+    """(Mongo filter, card formats) of a sport's drawable card pool; (None, []) if unknown."""
     if sport == "cricket":
         query = {"sport": {"$nin": ["wwe", "football"]}, "cards": {"$exists": True}}
         formats = ["ipl", "odi", "test"]
@@ -949,31 +1667,27 @@ async def _build_card_pool(sport: str) -> list:
         query = {"sport": "football", "cards": {"$exists": True}}
         formats = ["fifa"]
     else:
-        return []
-
-    async for p in db.players.find(query, {"player_id": 1, "name": 1, "cards": 1,
-                                            "ipl_image_file_id": 1, "image_file_id": 1,
-                                            "wwe_image_url": 1, "fifa_image_url": 1,
-                                            "test_image_url": 1}):
-        for fmt in formats:
-            card_data = p.get("cards", {}).get(fmt)
-            if not card_data:
-                continue
-            pool.append({
-                "player_id": p["player_id"],
-                "name":      p["name"],
-                "format":    fmt,
-                "rarity":    card_data.get("rarity", "common"),
-                "ovr":       card_data.get("ovr", 0),
-                "image":     _get_card_image(p, fmt),
-            })
+        return None, []
+    return query, formats
 
-    _card_pool_cache[sport] = pool
-    _card_pool_cache_time[sport] = now
-    return pool
+def _card_pool_entries(p: Dict[str, Any], formats: List[str]) -> list:
+    entries = []
+    for fmt in formats:
+        card_data = p.get("cards", {}).get(fmt)
+        if not card_data:
+            continue
+        entries.append({
+            "player_id": p["player_id"],
+            "name":      p["name"],
+            "format":    fmt,
+            "rarity":    card_data.get("rarity", "common"),
+            "ovr":       card_data.get("ovr", 0),
+            "image":     _get_card_image(p, fmt),
+        })
+    return entries
 
 def _invalidate_card_pool_cache():
-    """Call after /add_card or /update_card to refresh pool."""
+    """Drops every card pool (full rebuild on next draw). Catalog edits patch pools in place instead."""
     _card_pool_cache.clear()
     _card_pool_cache_time.clear()
 
@@ -1081,6 +1795,31 @@ async def gift_card_coins(target_user_id: int, amount: int) -> int:
 
 # ── Atomic Action Cooldown (spam-click protection) ────────────────────────────
 
+# ── Cross-worker leases ─────────────────────────────────────────────────────
+# A named lock in `leases` {key, token, expires_at} for state that chat
+# sharding can't keep on one worker (a user's cards are touched from any chat).
+# Expiry frees a lease whose holder died without releasing it.
+async def acquire_lease(key: str, ttl: float = 30) -> Optional[str]:
+    """Takes the lease if it's free or expired. Returns a token for release_lease, or None if held."""
+    import time as _time, uuid
+    db = get_db()
+    now = _time.time()
+    token = uuid.uuid4().hex
+    try:
+        # A held lease doesn't match, so the upsert hits the unique key index
+        await db.leases.update_one(
+            {"key": key, "expires_at": {"$lt": now}},
+            {"$set": {"token": token, "expires_at": now + ttl}},
+            upsert=True,
+        )
+    except DuplicateKeyError:
+        return None
+    return token
+
+async def release_lease(key: str, token: str):
+    db = get_db()
+    await db.leases.delete_one({"key": key, "token": token})
+
 async def try_acquire_action_cooldown(user_id: int, action: str, cooldown_seconds: int = 5) -> bool:
     """
     Atomically acquire a per-user per-action cooldown stored in MongoDB.
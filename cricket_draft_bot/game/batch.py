@@ -0,0 +1,163 @@
+# game/batch.py
+"""
+Vectorized batch simulation engine (NumPy).
+
+Scores thousands of team pairings in one pass for balance sweeps and
+tournaments, without Telegram, Mongo writes or Markdown. Slot scores come
+straight from the mode's FeatureTable — the same slot_fit product that
+calculate_slot_score returns — and slot battles use the same strict
+comparison as score_match, so a pairing scored here ends exactly like a
+real /simulate of the same teams.
+
+Teams are int arrays of FeatureTable row indices, one column per position
+in table.positions order; -1 marks an empty slot (not counted, like a slot
+missing on either side in run_simulation).
+
+NumPy is imported lazily so the bot itself runs without it.
+"""
+
+import logging
+from typing import Dict, Optional
+
+from game.features import FeatureTable
+
+logger = logging.getLogger(__name__)
+
+_CHUNK = 2048  # matches per random draw — bounds the (matches × pool) scratch array
+
+
+def _np():
+    try:
+        import numpy
+    except ImportError:
+        raise RuntimeError("Batch simulation needs numpy (pip install numpy)")
+    return numpy
+
+
+def table_arrays(table: FeatureTable):
+    """(scores, multipliers, valid) as NumPy arrays; rows invalidated since the build are marked invalid."""
+    np = _np()
+    shape = (len(table.player_ids), len(table.positions))
+    scores = np.frombuffer(table.scores, dtype=np.float64).reshape(shape).copy()
+    multipliers = np.frombuffer(table.multipliers, dtype=np.float64).reshape(shape).copy()
+    valid = ~np.isnan(scores).any(axis=1)
+    return scores, multipliers, valid
+
+
+def simulate_batch(table: FeatureTable, team_a, team_b, scores=None) -> Dict:
+    """
+    Plays team_a[k] vs team_b[k] for every k. Both are (n_matches, n_positions) index arrays.
+    Returns per-slot scores and winners (+1 A, -1 B, 0 draw/empty), totals and results.
+    """
+    np = _np()
+    if scores is None:
+        scores = table_arrays(table)[0]
+    team_a = np.asarray(team_a, dtype=np.int64)
+    team_b = np.asarray(team_b, dtype=np.int64)
+    cols = np.arange(scores.shape[1])
+
+    filled = (team_a >= 0) & (team_b >= 0)
+    slot_a = np.where(filled, scores[np.maximum(team_a, 0), cols], np.nan)
+    slot_b = np.where(filled, scores[np.maximum(team_b, 0), cols], np.nan)
+
+    winners = np.zeros(team_a.shape, dtype=np.int8)
+    winners[filled & (slot_a > slot_b)] = 1
+    winners[filled & (slot_b > slot_a)] = -1
+
+    score_a = (winners == 1).sum(axis=1)
+    score_b = (winners == -1).sum(axis=1)
+    return {
+        "slot_a": slot_a,
+        "slot_b": slot_b,
+        "winners": winners,
+        "score_a": score_a,
+        "score_b": score_b,
+        "result": np.sign(score_a - score_b),  # +1 A wins, -1 B wins, 0 draw
+    }
+
+
+def random_pairings(table: FeatureTable, n_matches: int, seed: Optional[int] = None, valid=None):
+    """Random drafts: each match draws 2 × n_positions distinct players from the pool."""
+    np = _np()
+    rng = np.random.default_rng(seed)
+    if valid is None:
+        valid = table_arrays(table)[2]
+    rows = np.flatnonzero(valid)
+    width = len(table.positions)
+    if len(rows) < 2 * width:
+        raise ValueError(f"Pool for {table.mode} has {len(rows)} players, need {2 * width}")
+
+    team_a = np.empty((n_matches, width), dtype=np.int64)
+    team_b = np.empty((n_matches, width), dtype=np.int64)
+    for start in range(0, n_matches, _CHUNK):
+        n = min(_CHUNK, n_matches - start)
+        # Sampling without replacement per match: the 2×width smallest of random keys
+        picks = rows[np.argpartition(rng.random((n, len(rows))), 2 * width, axis=1)[:, :2 * width]]
+        team_a[start:start + n] = picks[:, :width]
+        team_b[start:start + n] = picks[:, width:]
+    return team_a, team_b
+
+
+def balance_sweep(table: FeatureTable, n_matches: int = 10000, seed: Optional[int] = None) -> Dict:
+    """
+    Random-draft balance report for one mode:
+      • side win/draw rates (should be ~even)
+      • per position: how often a natural pick beats a mismatched one, and
+        how often the slot is decided by role fit at all
+    """
+    from config import PENALTY_MULTIPLIERS
+    np = _np()
+    scores, multipliers, valid = table_arrays(table)
+    team_a, team_b = random_pairings(table, n_matches, seed, valid)
+    res = simulate_batch(table, team_a, team_b, scores)
+
+    cols = np.arange(len(table.positions))
+    mult_a = multipliers[team_a, cols]
+    mult_b = multipliers[team_b, cols]
+    natural = PENALTY_MULTIPLIERS["NATURAL"]
+    mismatch = PENALTY_MULTIPLIERS["MISMATCH"]
+
+    positions = {}
+    for j, pos in enumerate(table.positions):
+        a_nat = (mult_a[:, j] == natural) & (mult_b[:, j] == mismatch)
+        b_nat = (mult_b[:, j] == natural) & (mult_a[:, j] == mismatch)
+        battles = int(a_nat.sum() + b_nat.sum())
+        nat_wins = int((res["winners"][a_nat, j] == 1).sum() + (res["winners"][b_nat, j] == -1).sum())
+        positions[pos] = {
+            "natural_rate": float(((mult_a[:, j] == natural).mean() + (mult_b[:, j] == natural).mean()) / 2),
+            "nat_vs_mismatch": battles,
+            "natural_win_rate": nat_wins / battles if battles else None,
+            "draw_rate": float((res["winners"][:, j] == 0).mean()),
+        }
+
+    return {
+        "mode": table.mode,
+        "matches": n_matches,
+        "pool": int(valid.sum()),
+        "a_win_rate": float((res["result"] == 1).mean()),
+        "b_win_rate": float((res["result"] == -1).mean()),
+        "draw_rate": float((res["result"] == 0).mean()),
+        "positions": positions,
+    }
+
+
+def round_robin(table: FeatureTable, teams) -> Dict:
+    """Every team plays every other once. teams: (n_teams, n_positions). Returns W/D/L per team."""
+    np = _np()
+    teams = np.asarray(teams, dtype=np.int64)
+    i, j = np.triu_indices(len(teams), k=1)
+    res = simulate_batch(table, teams[i], teams[j])["result"]
+
+    wins = np.bincount(i[res == 1], minlength=len(teams)) + np.bincount(j[res == -1], minlength=len(teams))
+    losses = np.bincount(i[res == -1], minlength=len(teams)) + np.bincount(j[res == 1], minlength=len(teams))
+    draws = (len(teams) - 1) - wins - losses
+    return {"wins": wins, "draws": draws, "losses": losses}
+
+
+def team_rows(table: FeatureTable, team) -> list:
+    """Row indices for a game.models.Team in table.positions order (-1 for empty/unknown slots)."""
+    rows = []
+    for pos in table.positions:
+        p = team.slots.get(pos)
+        rows.append(table.index.get(p.player_id, -1) if p else -1)
+    return rows
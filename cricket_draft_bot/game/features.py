@@ -0,0 +1,234 @@
+# game/features.py
+"""
+Precompiled per-mode player feature matrix.
+
+calculate_slot_score re-derives the same thing on every call (config lookups,
+role lower-casing, stat dict walks, penalty string matching). For each draft
+mode we compute it once for every (player, position) pair of the mode pool
+and keep the results in a flat array indexed [player_index * n_positions +
+position_index]. Simulation, "best slot" hints and balance analytics then
+become a lookup.
+
+Values are stored as doubles ('d') so lookups are bit-for-bit identical to
+calculate_slot_score — slot battles compare scores with > and a float32
+rounding could flip a close one.
+
+Tables are built off the request path: post_init starts one per mode and
+ensure_feature_table only kicks off a rebuild (one in flight per mode) when
+a table is missing or past the mode pool TTL — until it lands, lookups fall
+back to calculate_slot_score. Builds read the pool without filling the
+player LRU. Rows are invalidated (set to NaN) when save_player/delete_player
+touch a player and refilled in the background from the freshly loaded
+document, never from a Player a caller happens to hold.
+"""
+
+import asyncio
+import logging
+import math
+import time
+from array import array
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+
+from game.models import Player, shared_player
+from game.simulation import calculate_slot_score, slot_fit
+
+logger = logging.getLogger(__name__)
+
+_NAN = float("nan")
+
+FEATURE_TABLE_TTL = 1800  # seconds — same as MODE_POOL_CACHE_TTL
+
+
+def positions_for_mode(mode: str) -> List[str]:
+    """Slot list used for a mode (same selection as run_simulation)."""
+    from config import POSITIONS_T20, POSITIONS_TEST, POSITIONS_FIFA, POSITIONS_WWE
+    if mode and "FIFA" in mode:
+        return POSITIONS_FIFA
+    if mode and "WWE" in mode:
+        return POSITIONS_WWE
+    if mode and "Test" in mode:
+        return POSITIONS_TEST
+    return POSITIONS_T20
+
+
+class FeatureTable:
+    """Effective slot score for every (player, position) pair of one mode."""
+
+    def __init__(self, mode: str, positions: Sequence[str], players: Sequence[Player]):
+        self.mode = mode
+        self.positions: Tuple[str, ...] = tuple(positions)
+        self.pos_index: Dict[str, int] = {p: i for i, p in enumerate(self.positions)}
+        self.player_ids: List[str] = [p.player_id for p in players]
+        self.index: Dict[str, int] = {pid: i for i, pid in enumerate(self.player_ids)}
+        self.built_at = time.time()
+        width = len(self.positions)
+        self.scores = array("d", [_NAN]) * (len(self.player_ids) * width)
+        self.multipliers = array("d", [_NAN]) * (len(self.player_ids) * width)  # Role fit factor of each score
+        for i, player in enumerate(players):
+            self._fill_row(i, player)
+
+    def _fill_row(self, i: int, player: Player):
+        base = i * len(self.positions)
+        for j, pos in enumerate(self.positions):
+            stat_val, multiplier = slot_fit(player, pos, self.mode)
+            self.scores[base + j] = stat_val * multiplier  # Same product as calculate_slot_score
+            self.multipliers[base + j] = multiplier
+
+    def lookup(self, player_id: str, position: str) -> Optional[float]:
+        i = self.index.get(player_id)
+        j = self.pos_index.get(position)
+        if i is None or j is None:
+            return None
+        v = self.scores[i * len(self.positions) + j]
+        return None if math.isnan(v) else v
+
+    def row(self, player_id: str) -> Optional[List[float]]:
+        i = self.index.get(player_id)
+        if i is None:
+            return None
+        width = len(self.positions)
+        values = self.scores[i * width:(i + 1) * width]
+        return None if any(math.isnan(v) for v in values) else list(values)
+
+    def refresh_row(self, player: Player):
+        i = self.index.get(player.player_id)
+        if i is not None:
+            self._fill_row(i, player)
+
+    def invalidate(self, player_id: str):
+        i = self.index.get(player_id)
+        if i is not None:
+            width = len(self.positions)
+            for j in range(width):
+                self.scores[i * width + j] = _NAN
+
+    def is_stale(self) -> bool:
+        return time.time() - self.built_at >= FEATURE_TABLE_TTL
+
+
+# ── Per-mode registry ────────────────────────────────────────────────────────
+_TABLES: Dict[str, FeatureTable] = {}
+_BUILDS: Dict[str, asyncio.Task] = {}  # One in-flight build per mode
+_BUILD_EDITS: Dict[str, Set[str]] = {}  # Players invalidated while a mode's build was running
+_REFRESHES: Set[asyncio.Task] = set()  # Background row refreshes (referenced until done)
+
+
+async def _build(mode: str) -> FeatureTable:
+    from database import get_cached_pool_for_mode, get_players_uncached
+    _BUILD_EDITS[mode] = edited = set()
+    try:
+        ids = await get_cached_pool_for_mode(mode)
+        docs = await get_players_uncached(ids)
+    finally:
+        _BUILD_EDITS.pop(mode, None)
+    players = [shared_player(docs[pid]) for pid in ids if pid in docs]
+    t0 = time.perf_counter()
+    table = FeatureTable(mode, positions_for_mode(mode), players)
+    _TABLES[mode] = table
+    for pid in edited:  # The docs we read may predate these edits
+        table.invalidate(pid)
+        _schedule_refresh(pid)
+    logger.info(
+        f"Feature table for {mode}: {len(players)} players × {len(table.positions)} positions "
+        f"built in {(time.perf_counter() - t0) * 1000:.1f}ms"
+    )
+    return table
+
+
+def _build_done(mode: str, task: asyncio.Task):
+    if _BUILDS.get(mode) is task:
+        _BUILDS.pop(mode, None)
+    if not task.cancelled() and task.exception() is not None:
+        logger.warning(f"Feature table build failed for {mode}: {task.exception()}")
+
+
+def start_feature_build(mode: str) -> asyncio.Task:
+    """Starts a background build for the mode, or returns the one already running."""
+    task = _BUILDS.get(mode)
+    if task is None:
+        task = asyncio.get_running_loop().create_task(_build(mode))
+        _BUILDS[mode] = task
+        task.add_done_callback(lambda t: _build_done(mode, t))
+    return task
+
+
+async def build_feature_table(mode: str) -> FeatureTable:
+    """Builds (and registers) the table for a mode, joining a build already in flight."""
+    return await asyncio.shield(start_feature_build(mode))  # A cancelled caller must not cancel the shared build
+
+
+def ensure_feature_table(mode: str) -> Optional[FeatureTable]:
+    """Returns the current table for the mode (None if not built yet) without waiting;
+    starts a background rebuild if it is missing or expired."""
+    table = _TABLES.get(mode)
+    if table is None or table.is_stale():
+        start_feature_build(mode)
+    return table
+
+
+def get_feature_table(mode: str) -> Optional[FeatureTable]:
+    return _TABLES.get(mode)
+
+
+def slot_score(player: Player, position: str, mode: str) -> float:
+    """calculate_slot_score via the precomputed table; computes directly on a miss.
+    Invalidated rows are refilled by invalidate_player's refresh, not from this player."""
+    table = _TABLES.get(mode)
+    if table is not None:
+        v = table.lookup(player.player_id, position)
+        if v is not None:
+            return v
+    return calculate_slot_score(player, position, mode)
+
+
+def best_slot_for(player: Player, mode: str, open_slots: Optional[Sequence[str]] = None) -> Optional[str]:
+    """The open slot where this player scores highest (ties → first in slot order)."""
+    slots = list(open_slots) if open_slots is not None else positions_for_mode(mode)
+    best, best_score = None, -1.0
+    for pos in slots:
+        s = slot_score(player, pos, mode)
+        if s > best_score:
+            best, best_score = pos, s
+    return best
+
+
+def invalidate_player(player_id: str):
+    """Called when a player document changes — drops its rows in every mode table
+    and refills them in the background from the reloaded document."""
+    for table in _TABLES.values():
+        table.invalidate(player_id)
+    for edited in _BUILD_EDITS.values():
+        edited.add(player_id)
+    _schedule_refresh(player_id)
+
+
+async def _refresh_player(player_id: str):
+    from database import get_player
+    data = await get_player(player_id)
+    if data is None:
+        return  # Deleted — rows stay invalid and lookups fall back
+    player = shared_player(data)
+    for table in _TABLES.values():
+        table.refresh_row(player)
+
+
+def _schedule_refresh(player_id: str):
+    if not any(player_id in t.index for t in _TABLES.values()):
+        return
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        return  # No loop (scripts) — rows stay invalid until the next rebuild
+    task = loop.create_task(_refresh_player(player_id))
+    _REFRESHES.add(task)
+    task.add_done_callback(_refresh_done)
+
+
+def _refresh_done(task: asyncio.Task):
+    _REFRESHES.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        logger.warning(f"Feature row refresh failed: {task.exception()}")
+
+
+def clear_feature_tables():
+    _TABLES.clear()
@@ -1,28 +1,125 @@
 # game/models.py
-from dataclasses import dataclass, field
-from typing import List, Dict, Optional
+import sys
+from collections import OrderedDict
+from collections.abc import Mapping
+from dataclasses import dataclass, field, fields
+from typing import Any, List, Dict, Optional, Tuple
 
-@dataclass
+# ── Compact player stats ─────────────────────────────────────────────────────
+# Player stats arrive as {"ipl": {"leadership": 80, ...}, "odi": {...}}. Every
+# player of a sport has the same stat keys, so a row stores just a tuple of
+# values and shares one key layout (key -> index) with all rows of that shape.
+# Rows and blocks are read-only Mappings, so simulation code keeps using
+# player.stats.get("ipl", {}).get("leadership", 50).
+_LAYOUTS: Dict[Tuple[str, ...], Dict[str, int]] = {}
+
+def _layout(keys: Tuple[str, ...]) -> Dict[str, int]:
+    layout = _LAYOUTS.get(keys)
+    if layout is None:
+        layout = {sys.intern(k): i for i, k in enumerate(keys)}
+        _LAYOUTS[keys] = layout
+    return layout
+
+def _intern(value):
+    return sys.intern(value) if type(value) is str else value
+
+
+class StatRow(Mapping):
+    """One mode's stats: fixed key layout (shared) + a tuple of values."""
+    __slots__ = ("_layout", "_values")
+
+    def __init__(self, data: Dict[str, Any]):
+        keys = tuple(sorted(data))
+        self._layout = _layout(keys)
+        self._values = tuple(data[k] for k in keys)
+
+    def __getitem__(self, key):
+        return self._values[self._layout[key]]
+
+    def get(self, key, default=None):
+        i = self._layout.get(key)
+        return default if i is None else self._values[i]
+
+    def __contains__(self, key):
+        return key in self._layout
+
+    def __iter__(self):
+        return iter(self._layout)
+
+    def __len__(self):
+        return len(self._values)
+
+    def __hash__(self):
+        return hash(self._values)
+
+    def __repr__(self):
+        return f"StatRow({dict(self)!r})"
+
+
+class StatBlock(Mapping):
+    """A player's stats per mode key ("ipl", "odi", "test", "fifa", "wwe"). Immutable."""
+    __slots__ = ("_keys", "_rows")
+
+    def __init__(self, stats: Optional[Dict[str, Any]] = None):
+        stats = stats or {}
+        self._keys = tuple(sys.intern(k) for k in stats)
+        # Legacy int-style stats (a bare number per mode) are kept as-is
+        self._rows = tuple(
+            v if isinstance(v, StatRow) else StatRow(v) if isinstance(v, dict) else v
+            for v in stats.values()
+        )
+
+    def __getitem__(self, key):
+        for k, row in zip(self._keys, self._rows):
+            if k == key:
+                return row
+        raise KeyError(key)
+
+    def get(self, key, default=None):
+        for k, row in zip(self._keys, self._rows):
+            if k == key:
+                return row
+        return default
+
+    def __iter__(self):
+        return iter(self._keys)
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __hash__(self):
+        return hash(self._rows)
+
+    def __repr__(self):
+        return f"StatBlock({ {k: dict(v) if isinstance(v, StatRow) else v for k, v in self.items()}!r})"
+
+
+@dataclass(frozen=True, slots=True)
 class Player:
+    """
+    Immutable, slotted player. Role / position lists are interned-string tuples
+    and stats a compact StatBlock, so the many Player objects hydrated for
+    live matches stay small. Build from a Mongo document with Player.from_doc.
+    """
     player_id: str
     name: str
     full_name: Optional[str] = None
     role: Optional[str] = None # Legacy singular role
-    roles: List[str] = field(default_factory=list) # Cricket Roles
+    roles: Tuple[str, ...] = () # Cricket Roles
     image_file_id: Optional[str] = None
     ipl_image_file_id: Optional[str] = None
-    api_reference: Dict = field(default_factory=dict)
-    stats: Dict = field(default_factory=dict) # {"ipl": {...}, "odi": {...}, "test": {...}}
-    ipl_roles: List[str] = field(default_factory=list)
-    test_roles: List[str] = field(default_factory=list)
+    api_reference: Dict = field(default_factory=dict, compare=False)
+    stats: StatBlock = field(default_factory=StatBlock) # {"ipl": {...}, "odi": {...}, "test": {...}}
+    ipl_roles: Tuple[str, ...] = ()
+    test_roles: Tuple[str, ...] = ()
     test_image_url: Optional[str] = None
-    aliases: List[str] = field(default_factory=list)
+    aliases: Tuple[str, ...] = ()
     
     # FIFA / Generic Fields
     sport: str = "cricket"
     mode: str = "default"
     position: Optional[str] = None # Primary Position (e.g. ST)
-    positions: List[str] = field(default_factory=list) # Football Positions
+    positions: Tuple[str, ...] = () # Football Positions
     fifa_image_url: Optional[str] = None
     wwe_image_url: Optional[str] = None
     overall: int = 0 # FIFA Overall Rating
@@ -31,10 +128,122 @@ class Player:
     league: Optional[str] = None
     team: Optional[str] = None
 
+    def __post_init__(self):
+        # Normalise whatever the caller passed (lists / dicts) into the compact form
+        for name in _PLAYER_SEQ_FIELDS:
+            value = getattr(self, name)
+            object.__setattr__(self, name, tuple(_intern(v) for v in value) if value else ())
+        for name in _PLAYER_STR_FIELDS:
+            object.__setattr__(self, name, _intern(getattr(self, name)))
+        if not isinstance(self.stats, StatBlock):
+            object.__setattr__(self, "stats", StatBlock(self.stats if isinstance(self.stats, dict) else {}))
+
+    def __hash__(self):
+        return hash(self.player_id)
+
+    @classmethod
+    def from_doc(cls, doc: Dict[str, Any]) -> "Player":
+        """Builds a Player from a players-collection document (unknown keys ignored)."""
+        return cls(**{k: v for k, v in doc.items() if k in PLAYER_FIELDS})
+
     def get_stat(self, mode: str) -> int:
         # Default to 0, or some base value if stats missing
         return self.stats.get(mode.lower(), 50) 
 
+PLAYER_FIELDS = frozenset(f.name for f in fields(Player))
+_PLAYER_SEQ_FIELDS = ("roles", "ipl_roles", "test_roles", "aliases", "positions")
+_PLAYER_STR_FIELDS = ("role", "sport", "mode", "position", "source_db", "league", "team")
+
+
+# ── Shared player registry (flyweight) ───────────────────────────────────────
+# One frozen Player per player_id for the whole process: every match that
+# drafted the same player points its Team.slots at the same object, so
+# hydrating a match allocates nothing per slot and memory for hot players
+# stays flat however many matches are live. Entries are versioned by the
+# document's last_modified stamp; database._player_changed drops an entry
+# when the player is edited. Past _REGISTRY_MAX the least recently used entry
+# goes, so feature-table builds over every pool don't push out the players
+# live matches keep hydrating.
+_REGISTRY: "OrderedDict[str, Tuple[Any, Player]]" = OrderedDict()  # {player_id: (last_modified, Player)}, LRU first
+_REGISTRY_MAX = 5000
+_REGISTRY_STATS = {"hits": 0, "builds": 0}
+
+def shared_player(doc: Dict[str, Any]) -> Player:
+    """The registry's Player for this players-collection document (built on first use)."""
+    pid = doc["player_id"]
+    stamp = doc.get("last_modified")
+    entry = _REGISTRY.get(pid)
+    if entry is not None and entry[0] == stamp:
+        _REGISTRY_STATS["hits"] += 1
+        _REGISTRY.move_to_end(pid)
+        return entry[1]
+    player = Player.from_doc(doc)
+    _REGISTRY_STATS["builds"] += 1
+    if entry is not None and entry[0] is not None and (stamp is None or stamp < entry[0]):
+        return player  # Older copy of the doc than the one registered — don't replace it
+    if entry is None and len(_REGISTRY) >= _REGISTRY_MAX:
+        _REGISTRY.popitem(last=False)
+    _REGISTRY[pid] = (stamp, player)
+    _REGISTRY.move_to_end(pid)
+    return player
+
+def forget_player(player_id: str):
+    _REGISTRY.pop(player_id, None)
+
+def clear_player_registry():
+    _REGISTRY.clear()
+
+def get_player_registry_stats() -> Dict[str, int]:
+    return {**_REGISTRY_STATS, "size": len(_REGISTRY)}
+
+
+class DraftPool:
+    """
+    A match's available players: the shared mode pool snapshot (database.ModePool —
+    sorted ids + id -> index) and a bitmap of the indices removed by this match.
+    Membership, remove and len are O(1), and a match holds ~64 bytes of bits
+    instead of its own 400-600 entry list. Reads like the list it replaces
+    (`in`, `.remove`, `len`, iteration).
+    """
+    __slots__ = ("snapshot", "_removed", "_count")
+
+    def __init__(self, snapshot, removed=()):
+        self.snapshot = snapshot
+        self._removed = bytearray((len(snapshot.ids) + 7) // 8)
+        self._count = len(snapshot.ids)
+        for pid in removed:
+            self.remove(pid)
+
+    def _bit(self, player_id: str) -> Optional[int]:
+        i = self.snapshot.index.get(player_id)
+        if i is None or self._removed[i >> 3] & (1 << (i & 7)):
+            return None
+        return i
+
+    def __contains__(self, player_id) -> bool:
+        return self._bit(player_id) is not None
+
+    def remove(self, player_id: str):
+        """Marks a player as gone; unknown or already-removed IDs are ignored."""
+        i = self._bit(player_id)
+        if i is not None:
+            self._removed[i >> 3] |= 1 << (i & 7)
+            self._count -= 1
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __iter__(self):
+        removed = self._removed
+        return (pid for i, pid in enumerate(self.snapshot.ids) if not removed[i >> 3] & (1 << (i & 7)))
+
+    def __sizeof__(self):
+        return object.__sizeof__(self) + sys.getsizeof(self._removed)
+
+    def __repr__(self):
+        return f"DraftPool({self._count}/{len(self.snapshot.ids)} available)"
+
+
 @dataclass
 class Team:
     owner_id: int
@@ -64,7 +273,7 @@ class Match:
     team_a: Team
     team_b: Team
     current_turn: int # owner_id of current drafter
-    draft_pool: List[str] # List of available player_ids (in-memory only)
+    draft_pool: DraftPool # Available player_ids (in-memory only, rebuilt from draft_pool_removed)
     state: str = "DRAFTING"
     pending_player_id: Optional[str] = None
     draft_message_id: Optional[int] = None
@@ -75,3 +284,7 @@ class Match:
     draft_pool_removed: List[str] = field(default_factory=list)  # Delta: IDs removed from pool
     draft_completed_at: float = 0.0  # Timestamp when draft finished, for auto-ready 5min timer
     turn_deadline: float = 0.0  # Unix timestamp when current turn's 10-min AFK window expires
+    version: int = 0  # Mongo document version this state was based on (compare-and-swap saves)
+    deck_seed: int = 0  # Per-match shuffled deck (utils.randomizer.ShuffledDeck); 0 = legacy match
+    deck_cursor: int = 0  # Cards dealt from the deck so far
+    deck_pool: str = ""  # Fingerprint of the pool the deck deals from (database.save_deck_pool); "" = current pool
@@ -0,0 +1,149 @@
+# game/results.py
+"""
+Match result log + stats projector.
+
+A finished match used to write both players' stats, card coins and the
+leaderboard inline in run_simulation, with any failure only logged. Now the
+result is appended to the `match_results` collection as one immutable event
+(teams, per-slot scores, mode, chat, time) and the caller returns as soon as
+that insert is acknowledged. The projector folds pending events into `users`
+(stats, streaks, period counters, card coins) and the rank index in batches:
+
+  • one ordered bulk_write per batch — a user's events apply in finish order
+  • each user document remembers the last event ids it applied, so an event
+    projected twice (crash before it was marked, two workers) counts once
+  • events are marked projected only after their writes succeed; a failed
+    batch stays pending and is retried on the next pass
+
+The log also lets stats be rebuilt after a bug
+(/rebuildstats → database.rebuild_user_stats_from_log). Daily quests only track card
+actions, so matches don't feed them.
+"""
+
+import asyncio
+import logging
+import time
+from typing import Dict, List, Optional, Tuple
+
+from game.models import Match, Team
+
+logger = logging.getLogger(__name__)
+
+_BATCH = 100          # events per projection pass
+_POLL_SECS = 10       # also picks up events other workers logged or left pending
+
+
+def _team_entry(team: Team, result: Optional[str], coins: int, slots: List[Dict]) -> Dict:
+    return {
+        "owner_id": team.owner_id,
+        "owner_name": team.owner_name,
+        "result": result,  # "W" / "L" / "D", or None for no stats (AFK opponent)
+        "score": team.score,
+        "coins": coins,
+        "slots": slots,
+    }
+
+
+def result_event(match: Match, kind: str, results: Tuple[Tuple[Optional[str], int], Tuple[Optional[str], int]],
+                 battles=()) -> Dict:
+    """
+    The match_results event of a finished match.
+    results: ((result_a, coins_a), (result_b, coins_b)).
+    battles: score_match's [(i, position, player_a, player_b, score_a, score_b)];
+    without them (forfeits) slots list the drafted player IDs only.
+    """
+    if battles:
+        slots_a = [{"position": pos, "player_id": p_a.player_id, "score": s_a} for _, pos, p_a, _, s_a, _ in battles]
+        slots_b = [{"position": pos, "player_id": p_b.player_id, "score": s_b} for _, pos, _, p_b, _, s_b in battles]
+    else:
+        slots_a, slots_b = ([{"position": pos, "player_id": p.player_id if p else None, "score": None}
+                             for pos, p in team.slots.items()] for team in (match.team_a, match.team_b))
+    (res_a, coins_a), (res_b, coins_b) = results
+    return {
+        "event_id": match.match_id,  # A match finishes once — a second run is deduplicated
+        "match_id": match.match_id,
+        "kind": kind,
+        "mode": match.mode,
+        "chat_id": match.chat_id,
+        "finished_at": time.time(),
+        "teams": [_team_entry(match.team_a, res_a, coins_a, slots_a),
+                  _team_entry(match.team_b, res_b, coins_b, slots_b)],
+    }
+
+
+class ResultsProjector:
+    def __init__(self):
+        self.stats = {"logged": 0, "duplicates": 0, "projected": 0, "writes": 0, "batches": 0, "errors": 0}
+        self._task: Optional[asyncio.Task] = None
+        self._wake = asyncio.Event()
+        self._lock = asyncio.Lock()
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stops the loop and folds whatever is still pending."""
+        if self._task and not self._task.done():
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        try:
+            await self.project_pending()
+        except Exception as e:
+            logger.warning(f"Final result projection failed, left pending: {e}")
+
+    async def record(self, event: Dict) -> bool:
+        """Appends the event to the log. True once it's durable (or was already logged);
+        False if the insert failed and the caller should write stats itself."""
+        from database import append_match_result
+        try:
+            if await append_match_result(event):
+                self.stats["logged"] += 1
+            else:
+                self.stats["duplicates"] += 1
+        except Exception as e:
+            self.stats["errors"] += 1
+            logger.error(f"Could not log result of {event.get('match_id')}: {e}")
+            return False
+        self._wake.set()
+        return True
+
+    async def project_pending(self) -> int:
+        """Folds pending events batch by batch until none are left. Returns events projected."""
+        from database import get_pending_match_results, project_match_results, mark_match_results_projected
+        done = 0
+        async with self._lock:
+            while True:
+                events = await get_pending_match_results(_BATCH)
+                if not events:
+                    return done
+                self.stats["writes"] += await project_match_results(events)
+                await mark_match_results_projected([ev["event_id"] for ev in events])
+                self.stats["batches"] += 1
+                self.stats["projected"] += len(events)
+                done += len(events)
+                if len(events) < _BATCH:
+                    return done
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=_POLL_SECS)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                await self.project_pending()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.stats["errors"] += 1
+                logger.warning(f"Result projection failed, retrying: {e}")
+                await asyncio.sleep(_POLL_SECS)
+
+    def get_stats(self) -> Dict:
+        return dict(self.stats)
+
+
+# Global instance
+projector = ResultsProjector()
@@ -1,5 +1,6 @@
 # game/simulation.py
 import asyncio
+from typing import List, Tuple
 from game.models import Match, Team, Player
 from config import ROLE_WEIGHTS, WWE_POSITION_STATS
 from utils.randomizer import calculate_variance
@@ -32,6 +33,17 @@ def get_clutch_bonus(player: Player, mode: str) -> float:
     return clutch * 0.1
 
 def calculate_slot_score(player: Player, role: str, mode: str) -> float:
+    stat_val, multiplier = slot_fit(player, role, mode)
+    score = stat_val * multiplier
+    return score
+
+def slot_fit(player: Player, role: str, mode: str) -> Tuple[float, float]:
+    """
+    The two factors of a slot score: (effective stat, role multiplier).
+    Stat already includes the zero-skill penalty; multiplier is one of
+    PENALTY_MULTIPLIERS (NATURAL / PARTIAL / MISMATCH). Batch analytics use
+    the multiplier to tell natural picks from mismatches.
+    """
     from config import ROLE_STATS_MAP, PENALTY_MULTIPLIERS, ZERO_SKILL_THRESHOLD
 
     # WWE: pure stat comparison, no role penalties
@@ -40,9 +52,9 @@ def calculate_slot_score(player: Player, role: str, mode: str) -> float:
         wwe_stats = player.stats.get("wwe", {})
         val = wwe_stats.get(stat_key, 50)
         try:
-            return float(val)
+            return float(val), PENALTY_MULTIPLIERS["NATURAL"]
         except (TypeError, ValueError):
-            return 50.0
+            return 50.0, PENALTY_MULTIPLIERS["NATURAL"]
     
     if mode == "FIFA":
         stat_key = role
@@ -105,27 +117,43 @@ def calculate_slot_score(player: Player, role: str, mode: str) -> float:
                 if any(r in player_roles_lower for r in ["top", "middle", "finisher", "hitting", "batter"]):
                     multiplier = PENALTY_MULTIPLIERS["PARTIAL"]
 
-    score = stat_val * multiplier
-    return score
+    return stat_val, multiplier
 
-async def run_simulation(match: Match) -> str:
+SlotBattle = Tuple[int, str, Player, Player, float, float]  # (slot no., position, p_a, p_b, s_a, s_b)
+
+def score_match(match: Match) -> Tuple[int, int, List[SlotBattle]]:
     """
-    Runs the simulation with enhanced stats and output format.
+    Pure head-to-head scoring: no rendering, no state change, no I/O.
+    Returns (score_a, score_b, battles) — one battle per slot filled on both sides.
     """
+    from game.features import positions_for_mode, slot_score
+
     score_a = 0
     score_b = 0
+    battles = []
+    for i, pos in enumerate(positions_for_mode(match.mode), 1):
+        p_a = match.team_a.slots.get(pos)
+        p_b = match.team_b.slots.get(pos)
+        if not p_a or not p_b:
+            continue
+        s_a = slot_score(p_a, pos, match.mode)
+        s_b = slot_score(p_b, pos, match.mode)
+        if s_a > s_b:
+            score_a += 1
+        elif s_b > s_a:
+            score_b += 1
+        battles.append((i, pos, p_a, p_b, s_a, s_b))
+    return score_a, score_b, battles
+
+async def run_simulation(match: Match) -> str:
+    """
+    Runs the simulation with enhanced stats and output format.
+    """
     details = []
 
-    from config import POSITIONS_T20, POSITIONS_TEST, POSITIONS_FIFA, POSITIONS_WWE
-    
-    if match.mode and "FIFA" in match.mode:
-        active_positions = POSITIONS_FIFA
-    elif match.mode and "WWE" in match.mode:
-        active_positions = POSITIONS_WWE
-    elif match.mode and "Test" in match.mode:
-        active_positions = POSITIONS_TEST
-    else:
-        active_positions = POSITIONS_T20
+    from game.features import ensure_feature_table
+    ensure_feature_table(match.mode)  # Never waits — a missing table falls back to calculate_slot_score
+    score_a, score_b, battles = score_match(match)
     
     details.append("🏟 *MATCH SIMULATION – POSITION COMPARISON*\n")
     
@@ -148,24 +176,13 @@ async def run_simulation(match: Match) -> str:
     }
 
     # Head-to-Head Slot Battles
-    for i, pos in enumerate(active_positions, 1):
-        p_a = match.team_a.slots.get(pos)
-        p_b = match.team_b.slots.get(pos)
-        
-        if not p_a or not p_b:
-            continue
-        
-        s_a = calculate_slot_score(p_a, pos, match.mode)
-        s_b = calculate_slot_score(p_b, pos, match.mode)
-        
+    for i, pos, p_a, p_b, s_a, s_b in battles:
         icon = ICONS.get(pos, "🔸")
         details.append(f"{icon} *{i}. {pos} vs {pos}*")
         
         if s_a > s_b:
-            score_a += 1
             details.append(f"🔵 {esc(p_a.name)} > {esc(p_b.name)}")
         elif s_b > s_a:
-            score_b += 1
             details.append(f"🔴 {esc(p_b.name)} > {esc(p_a.name)}")
         else:
             details.append(f"⚖️ Draw: {esc(p_a.name)} vs {esc(p_b.name)}")
@@ -205,9 +222,16 @@ async def run_simulation(match: Match) -> str:
 
     match.state = "FINISHED"
 
-    # PERSIST RESULTS
+    # PERSIST RESULTS — append the result event; game/results.py's projector
+    # folds it into stats, coins and standings in the background
+    from game.results import projector, result_event
+    event = result_event(match, "simulation", ((res_a, reward_a), (res_b, reward_b)), battles)
+    if await projector.record(event):
+        return "\n".join(details)
+
+    # Log unavailable — write stats and coins directly
     try:
-        from database import update_user_stats
+        from database import bulk_update_user_stats
 
         async def _award_card_coins(user_id: int, result: str) -> None:
             """Silently award card coins after a match. Never raises."""
@@ -218,12 +242,12 @@ async def run_simulation(match: Match) -> str:
             except Exception as _ce:
                 logger.warning(f"Card coin award failed for {user_id}: {_ce}")
 
-        # Write stats + award card coins for both players concurrently
+        # Write stats (one bulk_write for both players) + award card coins concurrently
         await asyncio.gather(
-            update_user_stats(match.team_a.owner_id, match.team_a.owner_name, res_a,
-                              mode=match.mode, chat_id=match.chat_id),
-            update_user_stats(match.team_b.owner_id, match.team_b.owner_name, res_b,
-                              mode=match.mode, chat_id=match.chat_id),
+            bulk_update_user_stats([
+                (match.team_a.owner_id, match.team_a.owner_name, res_a),
+                (match.team_b.owner_id, match.team_b.owner_name, res_b),
+            ], mode=match.mode, chat_id=match.chat_id),
             _award_card_coins(match.team_a.owner_id, res_a),
             _award_card_coins(match.team_b.owner_id, res_b),
         )
@@ -1,50 +1,350 @@
 import asyncio
-import inspect
+import copy
 import json
 import logging
+import sys
 import time
+import uuid
+from collections import OrderedDict
 from typing import Optional, Dict
-from game.models import Match, Team, Player
-from database import get_match, save_match, get_eligible_players_for_mode, get_cached_pool_for_mode, get_player
-from utils.randomizer import get_random_player
-from config import MAX_REDRAWS
+from game.models import DraftPool, Match, Team, shared_player
+from database import get_match_versioned, get_match_version, save_matches_bulk, get_eligible_players_for_mode, get_cached_pool_for_mode, get_player, get_players, ModePool, save_deck_pool, get_deck_pool
+from utils.randomizer import get_random_player, ShuffledDeck, new_deck_seed
+from config import MAX_REDRAWS, MATCH_CACHE_MAX_BYTES
 
 logger = logging.getLogger(__name__)
 
-# Cache Player dataclass fields once at module load — avoids reflect on every cache miss
-_PLAYER_FIELDS = set(inspect.signature(Player).parameters.keys())
-
 
 # ── In-memory match state cache ──────────────────────────────────────────────
 # Avoids a MongoDB read on every button click for active matches.
-# TTL = 30s; single-process safe (Heroku free tier = 1 dyno).
-_MATCH_CACHE: Dict[str, Dict] = {}  # {match_id: {"obj": Match, "ts": float}}
-_MATCH_CACHE_TTL = 30  # seconds
+# Matches still being played (DRAFTING / READY_CHECK) are pinned: they don't
+# expire while a player thinks and are never evicted. Everything else sits in
+# an LRU (OrderedDict, O(1) touch and evict) that expires after
+# _MATCH_CACHE_TTL and is trimmed to MATCH_CACHE_MAX_BYTES of estimated state.
+# The cache is write-through (save_match_state puts the Match it queues) and
+# flushes CAS against the Mongo version, so a long-lived pinned entry can't
+# overwrite someone else's change — a lost CAS merges and refreshes it.
+# Reads can't rely on that: a pinned entry with no save of ours for
+# _PIN_REVALIDATE seconds compares its version with Mongo before being served,
+# so a reset or delete on another worker is seen as quickly as the old TTL.
+_MATCH_CACHE: Dict[str, Dict] = {}  # {match_id: {"obj": Match, "ts": float, "used": float, "size": int}}
+_MATCH_LRU: "OrderedDict[str, None]" = OrderedDict()  # Unpinned match_ids, least recently used first
+_MATCH_CACHE_TTL = 30  # seconds, unpinned entries
+_PINNED_STATES = ("DRAFTING", "READY_CHECK")
+_PIN_MAX_IDLE = 3600  # A pinned match untouched this long (abandoned, deleted elsewhere) is reloaded
+_PIN_REVALIDATE = _MATCH_CACHE_TTL  # seconds a pinned entry is served without checking its version
+_MATCH_CACHE_STATS = {"hits": 0, "misses": 0, "expired": 0, "evictions": 0, "revalidated": 0, "stale": 0}
+_match_cache_bytes = 0
+
+def _match_footprint(match: Match) -> int:
+    """Rough bytes held by a cached match. Players and the mode pool snapshot are
+    shared objects, so the pool bitmap, delta list and fixed per-match objects
+    are what a cache entry really costs."""
+    return (2048 + sys.getsizeof(match.draft_pool) + sys.getsizeof(match.draft_pool_removed)
+            + sys.getsizeof(getattr(match, 'trade_offer', None) or {}))
+
+def _cache_drop(match_id: str):
+    global _match_cache_bytes
+    entry = _MATCH_CACHE.pop(match_id, None)
+    _MATCH_LRU.pop(match_id, None)
+    if entry:
+        _match_cache_bytes -= entry["size"]
 
 def _cache_put(match: Match):
-    _MATCH_CACHE[match.match_id] = {"obj": match, "ts": time.time()}
-    if len(_MATCH_CACHE) > 60:  # evict oldest when over cap
-        oldest = min(_MATCH_CACHE, key=lambda k: _MATCH_CACHE[k]["ts"])
-        _MATCH_CACHE.pop(oldest, None)
+    global _match_cache_bytes
+    _cache_drop(match.match_id)
+    now = time.time()
+    # checked: last time this state was known to match Mongo (our save, load or version check)
+    entry = {"obj": match, "ts": now, "used": now, "checked": now, "size": _match_footprint(match)}
+    _MATCH_CACHE[match.match_id] = entry
+    _match_cache_bytes += entry["size"]
+    if match.state not in _PINNED_STATES:
+        _MATCH_LRU[match.match_id] = None
+    _trim_match_cache()
+
+def _trim_match_cache():
+    while _match_cache_bytes > MATCH_CACHE_MAX_BYTES and _MATCH_LRU:
+        _cache_drop(next(iter(_MATCH_LRU)))
+        _MATCH_CACHE_STATS["evictions"] += 1
+    if _match_cache_bytes > MATCH_CACHE_MAX_BYTES:
+        # Only pinned matches left — drop the abandoned ones
+        now = time.time()
+        for mid in [m for m, e in _MATCH_CACHE.items() if now - e["used"] >= _PIN_MAX_IDLE]:
+            _cache_drop(mid)
+            _MATCH_CACHE_STATS["evictions"] += 1
 
 def _cache_get(match_id: str) -> Optional[Match]:
     entry = _MATCH_CACHE.get(match_id)
-    if entry and (time.time() - entry["ts"]) < _MATCH_CACHE_TTL:
-        return entry["obj"]
-    return None
+    if entry is None:
+        _MATCH_CACHE_STATS["misses"] += 1
+        return None
+    now = time.time()
+    if match_id in _MATCH_LRU:
+        fresh = now - entry["ts"] < _MATCH_CACHE_TTL
+    else:
+        fresh = now - entry["used"] < _PIN_MAX_IDLE
+    if not fresh:
+        _cache_drop(match_id)
+        _MATCH_CACHE_STATS["expired"] += 1
+        _MATCH_CACHE_STATS["misses"] += 1
+        return None
+    entry["used"] = now
+    if match_id in _MATCH_LRU:
+        _MATCH_LRU.move_to_end(match_id)
+    _MATCH_CACHE_STATS["hits"] += 1
+    return entry["obj"]
+
+def get_match_cache_stats() -> Dict:
+    """Counters for /perfstats."""
+    lookups = _MATCH_CACHE_STATS["hits"] + _MATCH_CACHE_STATS["misses"]
+    return {
+        **_MATCH_CACHE_STATS,
+        "size": len(_MATCH_CACHE),
+        "pinned": len(_MATCH_CACHE) - len(_MATCH_LRU),
+        "bytes": _match_cache_bytes,
+        "hit_rate": _MATCH_CACHE_STATS["hits"] / lookups if lookups else 0.0,
+    }
 
 def evict_match_cache(match_id: str):
     """Call this when a match ends/is deleted to free the cache slot."""
-    _MATCH_CACHE.pop(match_id, None)
+    _cache_drop(match_id)
+    _DECKS.pop(match_id, None)
+    _PENDING_WRITES.pop(match_id, None)  # Never resurrect a deleted match
+    _PERSISTED_STATE.pop(match_id, None)
+    _PERSISTED_VERSION.pop(match_id, None)
 
 def clear_match_cache():
     """Clear all cached matches from memory."""
+    global _match_cache_bytes
     _MATCH_CACHE.clear()
+    _MATCH_LRU.clear()
+    _match_cache_bytes = 0
+    _DECKS.clear()
+    _PENDING_WRITES.clear()
+    _PERSISTED_STATE.clear()
+    _PERSISTED_VERSION.clear()
+
+
+# ── Write-behind match persistence ───────────────────────────────────────────
+# A button click used to upsert the whole match document, and handle_draw /
+# _reset_afk_timer fired extra background saves on top — 2-3 full writes per
+# turn. Now save_match_state only marks the match dirty; the background flusher
+# merges repeated saves of the same match and writes every dirty match in one
+# bulk_write. States other code reads straight from Mongo (new matches,
+# READY_CHECK, FINISHED) are flushed immediately.
+_PENDING_WRITES: Dict[str, Dict] = {}  # {match_id: {"match_id", "chat_id", "state_data", "upsert"}}
+_WRITE_BEHIND_INTERVAL = 1.0  # seconds between background flushes
+_FLUSH_NOW_STATES = ("READY_CHECK", "FINISHED")
+_WRITE_STATS = {"requested": 0, "flushed": 0, "coalesced": 0, "unchanged": 0, "batches": 0, "failed": 0,
+                "conflicts": 0, "merged": 0, "dropped": 0}
+_flusher_task: Optional[asyncio.Task] = None
+
+# Last state_data known to be in Mongo, per match. Flushes send only the dotted
+# paths that changed since then (e.g. state_data.team_a.slots.WK) instead of
+# rewriting both teams, trade offers and message IDs on every click.
+_PERSISTED_STATE: Dict[str, Dict] = {}
+
+# ── Optimistic concurrency ───────────────────────────────────────────────────
+# Each match document carries a `version` that every flush bumps with a
+# compare-and-swap against the version our snapshot was read at. AFK forfeits,
+# auto-ready, swaps and the draft callbacks (possibly on another worker) can
+# all touch the same match; when a CAS loses, we re-read the winner's state,
+# three-way merge our changes onto it and retry instead of overwriting it.
+_PERSISTED_VERSION: Dict[str, int] = {}
+_MAX_CAS_RETRIES = 3
+_MISSING = object()
+
+def _merge_state(base: Dict, ours: Dict, theirs: Dict) -> Dict:
+    """Three-way merge of state_data dicts. Where both sides changed a field,
+    the persisted (theirs) value wins; removed-player lists are unioned and
+    the deck cursor only moves forward."""
+    merged = {}
+    for key in set(ours) | set(theirs):
+        b = base.get(key, _MISSING)
+        o = ours.get(key, _MISSING)
+        t = theirs.get(key, _MISSING)
+        if o == b:
+            value = t
+        elif t == b:
+            value = o
+        elif isinstance(o, dict) and isinstance(t, dict):
+            value = _merge_state(b if isinstance(b, dict) else {}, o, t)
+        elif key == "draft_pool_removed" and isinstance(o, list) and isinstance(t, list):
+            value = t + [pid for pid in o if pid not in t]
+        elif key == "deck_cursor" and isinstance(o, int) and isinstance(t, int):
+            value = max(o, t)  # Never deal a card twice
+        else:
+            value = t
+        if value is not _MISSING:
+            merged[key] = value
+    return merged
+
+def _diff_state(old: Dict, new: Dict, path: str, update: Dict[str, Dict]):
+    """Collects $set/$unset/$push operators turning `old` into `new` under `path`."""
+    for key, value in new.items():
+        sub = f"{path}.{key}"
+        if key not in old:
+            update["$set"][sub] = value
+            continue
+        prev = old[key]
+        if prev == value:
+            continue
+        if (isinstance(prev, dict) and isinstance(value, dict) and value
+                and all(isinstance(k, str) and k and "." not in k and not k.startswith("$") for k in value)):
+            _diff_state(prev, value, sub, update)
+        elif key == "draft_pool_removed" and isinstance(prev, list) and isinstance(value, list) \
+                and len(value) > len(prev) and value[:len(prev)] == prev:
+            # Append-only delta list — push the new IDs instead of rewriting the array
+            update["$push"][sub] = {"$each": value[len(prev):]}
+        else:
+            update["$set"][sub] = value
+    for key in old:
+        if key not in new:
+            update["$unset"][f"{path}.{key}"] = ""
+
+def _build_match_update(write: Dict) -> Optional[Dict[str, Dict]]:
+    """Returns the Mongo update for a pending write, or None if nothing changed."""
+    base = _PERSISTED_STATE.get(write["match_id"])
+    if base is None or write["upsert"]:
+        return {"$set": {"state_data": write["state_data"]}}
+    update = {"$set": {}, "$unset": {}, "$push": {}}
+    _diff_state(base, write["state_data"], "state_data", update)
+    if not any(update.values()):
+        return None
+    return update
+
+def _ensure_flusher():
+    global _flusher_task
+    if _flusher_task is None or _flusher_task.done():
+        _flusher_task = asyncio.create_task(_write_behind_loop())
+
+async def _write_behind_loop():
+    while True:
+        await asyncio.sleep(_WRITE_BEHIND_INTERVAL)
+        if not _PENDING_WRITES:
+            continue
+        try:
+            await flush_match_writes()
+        except Exception as e:
+            logger.warning(f"Write-behind flush failed: {e}")
+
+async def flush_match_writes(match_ids: Optional[list] = None):
+    """Write dirty matches to Mongo in one bulk_write. Flushes everything if match_ids is None.
+    Also used as the shutdown hook so no pending draft state is lost on restart.
+    Writes that lose a version race are merged onto the winner and retried."""
+    ids = list(_PENDING_WRITES) if match_ids is None else [m for m in match_ids if m in _PENDING_WRITES]
+    for _ in range(_MAX_CAS_RETRIES):
+        if not ids:
+            return
+        conflicted = await _flush_batch(ids)
+        ids = [mid for mid in conflicted if mid in _PENDING_WRITES]
+    if ids:
+        logger.warning(f"Match writes still conflicting after {_MAX_CAS_RETRIES} tries, left queued: {ids}")
+
+async def _flush_batch(ids: list) -> list:
+    """One bulk_write attempt. Returns match_ids re-queued after a lost CAS."""
+    batch = [_PENDING_WRITES.pop(mid) for mid in ids]
+    writes = []
+    for w in batch:
+        update = _build_match_update(w)
+        if update is None:
+            _WRITE_STATS["unchanged"] += 1  # Same as what Mongo already holds
+            continue
+        writes.append({
+            **w,
+            "update": update,
+            "version": _PERSISTED_VERSION.get(w["match_id"], 0),
+            "token": uuid.uuid4().hex,
+        })
+    if not writes:
+        return []
+    try:
+        conflicts = await save_matches_bulk(writes)
+    except Exception:
+        _WRITE_STATS["failed"] += 1
+        # Re-queue — unless a newer save for the same match arrived meanwhile
+        for w in batch:
+            _PENDING_WRITES.setdefault(w["match_id"], w)
+        raise
+
+    applied = 0
+    for w in writes:
+        mid = w["match_id"]
+        if mid not in conflicts:
+            _PERSISTED_STATE[mid] = w["state_data"]
+            _PERSISTED_VERSION[mid] = w["version"] + 1
+            cached = _MATCH_CACHE.get(mid)
+            if cached:
+                cached["obj"].version = w["version"] + 1
+            applied += 1
+    _WRITE_STATS["flushed"] += applied
+    _WRITE_STATS["batches"] += 1
+
+    retry = []
+    for w in writes:
+        mid = w["match_id"]
+        if mid not in conflicts:
+            continue
+        _WRITE_STATS["conflicts"] += 1
+        current = conflicts[mid]
+        if current is None or not current.get("state_data"):
+            # Match was deleted (reset, cleanup, forfeit) while we held it — drop the write
+            _WRITE_STATS["dropped"] += 1
+            logger.info(f"Dropping write for deleted match {mid}")
+            evict_match_cache(mid)
+            continue
+        await _rebase_write(w, current)
+        retry.append(mid)
+    return retry
+
+async def _rebase_write(write: Dict, current: Dict):
+    """Merges a write that lost its CAS onto the winning document and re-queues it."""
+    mid = write["match_id"]
+    base = _PERSISTED_STATE.get(mid, {})
+    theirs = current["state_data"]
+    merged = _merge_state(base, write["state_data"], theirs)
+    _PERSISTED_STATE[mid] = copy.deepcopy(theirs)
+    _PERSISTED_VERSION[mid] = current["version"]
+    newer = _PENDING_WRITES.get(mid)
+    if newer:
+        # A later save is already queued on top of ours — merge that one instead
+        merged = _merge_state(base, newer["state_data"], theirs)
+    _PENDING_WRITES[mid] = {
+        "match_id": mid,
+        "chat_id": write["chat_id"],
+        "state_data": merged,
+        "upsert": False,
+    }
+    _WRITE_STATS["merged"] += 1
+    logger.info(f"Match {mid} changed underneath us (now v{current['version']}) — merged and retrying")
+
+    # Refresh the cached Match in place so handlers holding it see the merged state
+    refreshed = await _match_from_data(merged)
+    refreshed.version = current["version"]
+    cached = _MATCH_CACHE.get(mid)
+    if cached:
+        cached["obj"].__dict__.update(refreshed.__dict__)
+        _cache_put(cached["obj"])  # Re-size / re-pin for the merged state
+    else:
+        _cache_put(refreshed)
 
-async def create_match_state(chat_id: int, mode: str, owner_id: int, challenger_id: int, owner_name: str, challenger_name: str, draft_message_id: Optional[int] = None) -> Match:
+def get_write_behind_stats() -> Dict[str, int]:
+    """Counters for /perfstats. 'coalesced' = Mongo writes saved by merging."""
+    return {**_WRITE_STATS, "pending": len(_PENDING_WRITES)}
+
+def new_match_id(owner_id: int) -> str:
+    return f"{owner_id}_{int(time.time())}"
+
+async def create_match_state(chat_id: int, mode: str, owner_id: int, challenger_id: int, owner_name: str, challenger_name: str, draft_message_id: Optional[int] = None, match_id: Optional[str] = None) -> Match:
     """Initializes a new match state async."""
     # Use cached pool projection (avoids re-querying DB if pool already cached)
-    draft_pool = await get_cached_pool_for_mode(mode)
+    pool = await get_cached_pool_for_mode(mode)
+    draft_pool = DraftPool(pool)
+    try:
+        deck_pool = await save_deck_pool(pool)
+    except Exception as e:
+        deck_pool = ""  # Deals from the current pool — fine live, not replayable after a pool change
+        logger.warning(f"Could not store deck pool for {mode}: {e}")
     
     import random
     first_drafter = random.choice([owner_id, challenger_id])
@@ -64,7 +364,7 @@ async def create_match_state(chat_id: int, mode: str, owner_id: int, challenger_
     initial_slots = {k: None for k in slot_keys}
 
     import time
-    match_id = f"{owner_id}_{int(time.time())}"
+    match_id = match_id or new_match_id(owner_id)
     
     match = Match(
         match_id=match_id,
@@ -75,14 +375,17 @@ async def create_match_state(chat_id: int, mode: str, owner_id: int, challenger_
         current_turn=first_drafter,
         draft_pool=draft_pool,
         state="DRAFTING",
-        draft_message_id=draft_message_id
+        draft_message_id=draft_message_id,
+        deck_seed=new_deck_seed(),
+        deck_pool=deck_pool,
     )
     
-    await save_match_state(match)
+    await save_match_state(match, flush=True)  # New match must be visible to limit checks at once
     return match
 
-async def save_match_state(match: Match):
-    """Serializes and saves the match state."""
+async def save_match_state(match: Match, flush: bool = False):
+    """Serializes the match state and queues it for the write-behind flusher.
+    flush=True (or a READY_CHECK/FINISHED state) writes it to Mongo before returning."""
     def team_to_dict(team: Team):
         return {
             "owner_id": team.owner_id,
@@ -104,7 +407,8 @@ async def save_match_state(match: Match):
         "team_b": team_to_dict(match.team_b),
         "current_turn": match.current_turn,
         # Delta optimization: only save removed IDs (max 18) instead of full pool (400-600 IDs)
-        "draft_pool_removed": getattr(match, 'draft_pool_removed', []),
+        # Copied so later appends can't leak into the persisted snapshot used for diffing
+        "draft_pool_removed": list(getattr(match, 'draft_pool_removed', [])),
         "state": match.state,
         "pending_player_id": match.pending_player_id,
         "draft_message_id": match.draft_message_id,
@@ -112,23 +416,92 @@ async def save_match_state(match: Match):
         "pinned_message_id": getattr(match, 'pinned_message_id', None),
         "finished_at": match.finished_at,
         "draft_completed_at": getattr(match, 'draft_completed_at', 0.0),
-        "trade_offer": getattr(match, 'trade_offer', None),
-        "turn_deadline": getattr(match, 'turn_deadline', 0.0)
+        "trade_offer": copy.deepcopy(getattr(match, 'trade_offer', None)),
+        "turn_deadline": getattr(match, 'turn_deadline', 0.0),
+        "deck_seed": match.deck_seed,
+        "deck_cursor": match.deck_cursor,
+        "deck_pool": match.deck_pool,
     }
     _cache_put(match)  # Update in-memory cache immediately
-    await save_match(match.match_id, match.chat_id, state_data)
+
+    _WRITE_STATS["requested"] += 1
+    previous = _PENDING_WRITES.get(match.match_id)
+    if previous:
+        _WRITE_STATS["coalesced"] += 1  # Replaces an unflushed write of the same match
+    _PENDING_WRITES[match.match_id] = {
+        "match_id": match.match_id,
+        "chat_id": match.chat_id,
+        "state_data": state_data,
+        # Only a brand-new match may be inserted; later flushes never resurrect a deleted doc
+        "upsert": flush or bool(previous and previous["upsert"]),
+    }
+
+    if flush or match.state in _FLUSH_NOW_STATES:
+        await flush_match_writes([match.match_id])
+    else:
+        _ensure_flusher()
 
 async def load_match_state(match_id: str) -> Optional[Match]:
     # Fast path: serve from in-memory cache if fresh
     cached = _cache_get(match_id)
     if cached:
-        return cached
+        entry = _MATCH_CACHE[match_id]
+        if match_id in _MATCH_LRU or time.time() - entry["checked"] < _PIN_REVALIDATE \
+                or match_id in _PENDING_WRITES:  # Our own flush CAS-checks it within a second
+            return cached
+        return await _revalidate_pinned(match_id, cached)
+
+    if match_id in _PENDING_WRITES:
+        # Cache entry expired before the flusher ran — persist first so we don't read stale state
+        await flush_match_writes([match_id])
 
-    data = await get_match(match_id)
+    data, version = await get_match_versioned(match_id)
     if not data:
         return None
-        
-    async def dict_to_team(d):
+    _PERSISTED_STATE[match_id] = copy.deepcopy(data)  # Baseline for field-level deltas
+    _PERSISTED_VERSION[match_id] = version
+
+    m = await _match_from_data(data)
+    m.version = version
+    _cache_put(m)  # Prime the cache
+    return m
+
+async def _revalidate_pinned(match_id: str, cached: Match) -> Optional[Match]:
+    """Checks a pinned entry's version against Mongo; refreshes it in place if another
+    worker changed the match, drops it if the match was deleted."""
+    _MATCH_CACHE_STATS["revalidated"] += 1
+    version = await get_match_version(match_id)
+    if version is None:
+        _MATCH_CACHE_STATS["stale"] += 1
+        evict_match_cache(match_id)
+        return None
+    entry = _MATCH_CACHE.get(match_id)
+    if version == _PERSISTED_VERSION.get(match_id, cached.version):
+        if entry:
+            entry["checked"] = time.time()
+        return cached
+    _MATCH_CACHE_STATS["stale"] += 1
+    data, version = await get_match_versioned(match_id)
+    if not data:
+        evict_match_cache(match_id)
+        return None
+    _PERSISTED_STATE[match_id] = copy.deepcopy(data)
+    _PERSISTED_VERSION[match_id] = version
+    refreshed = await _match_from_data(data)
+    refreshed.version = version
+    # In place, so handlers still holding the old object see the new state
+    cached.__dict__.update(refreshed.__dict__)
+    _cache_put(cached)
+    return cached
+
+async def _match_from_data(data: Dict) -> Match:
+    """Rebuilds a Match (players resolved, pool reconstructed) from stored state_data."""
+    # Both teams' players in one batched fetch (a cold cache costs one $in query, not 18 find_one)
+    player_map = await get_players([
+        pid for side in ('team_a', 'team_b') for pid in data[side]['slots'].values() if pid
+    ])
+
+    def dict_to_team(d):
         t = Team(owner_id=d['owner_id'], owner_name=d['owner_name'])
         t.redraws_remaining = d['redraws_remaining']
         t.replacements_remaining = d.get('replacements_remaining', 1)
@@ -136,19 +509,9 @@ async def load_match_state(match_id: str) -> Optional[Match]:
         t.score = d.get('score', 0)
         t.trades_used = d.get('trades_used', 0)
         t.swaps_used = d.get('swaps_used', 0)
-        # Reconstruct slots — fetch all players in PARALLEL to avoid serial DB round-trips
-        slot_items = list(d['slots'].items())
-        pids = [pid for _, pid in slot_items if pid]
-        if pids:
-            player_results = await asyncio.gather(*[get_player(pid) for pid in pids])
-            player_map = {p['player_id']: p for p in player_results if p}
-        else:
-            player_map = {}
-        for slot, pid in slot_items:
+        for slot, pid in d['slots'].items():
             if pid and pid in player_map:
-                p_data = player_map[pid]
-                filtered_p_data = {k: v for k, v in p_data.items() if k in _PLAYER_FIELDS}
-                t.slots[slot] = Player(**filtered_p_data)
+                t.slots[slot] = shared_player(player_map[pid])
             else:
                 t.slots[slot] = None
         return t
@@ -157,10 +520,10 @@ async def load_match_state(match_id: str) -> Optional[Match]:
         match_id=data['match_id'],
         chat_id=data['chat_id'],
         mode=data['mode'],
-        team_a=await dict_to_team(data['team_a']),
-        team_b=await dict_to_team(data['team_b']),
+        team_a=dict_to_team(data['team_a']),
+        team_b=dict_to_team(data['team_b']),
         current_turn=data['current_turn'],
-        draft_pool=[],  # Reconstructed below
+        draft_pool=None,  # Reconstructed below
         state=data['state'],
         pending_player_id=data.get('pending_player_id'),
         draft_message_id=data.get('draft_message_id'),
@@ -169,6 +532,9 @@ async def load_match_state(match_id: str) -> Optional[Match]:
         pinned_message_id=data.get('pinned_message_id'),
         draft_completed_at=data.get('draft_completed_at', 0.0),
         turn_deadline=data.get('turn_deadline', 0.0),
+        deck_seed=data.get('deck_seed', 0),
+        deck_cursor=data.get('deck_cursor', 0),
+        deck_pool=data.get('deck_pool', ""),
     )
     m.trade_offer = data.get('trade_offer')
 
@@ -176,19 +542,55 @@ async def load_match_state(match_id: str) -> Optional[Match]:
     if 'draft_pool_removed' in data:
         # New delta format: reconstruct from cached full pool minus removed IDs
         full_pool = await get_cached_pool_for_mode(data['mode'])
-        removed_set = set(data['draft_pool_removed'])
-        m.draft_pool = [pid for pid in full_pool if pid not in removed_set]
+        m.draft_pool = DraftPool(full_pool, data['draft_pool_removed'])
         m.draft_pool_removed = list(data['draft_pool_removed'])
     else:
         # Backward compat: old format stored the full pool list
-        m.draft_pool = data.get('draft_pool', [])
+        m.draft_pool = DraftPool(ModePool(data['mode'], data.get('draft_pool', [])))
         m.draft_pool_removed = []
-
-    _cache_put(m)  # Prime the cache
     return m
 
+# ── Per-match draft decks ────────────────────────────────────────────────────
+# Drawing used to copy, filter and shuffle the whole 400-600 ID pool per click.
+# Each match now deals from its own lazily shuffled deck, persisted as
+# deck_seed + deck_cursor + deck_pool and rebuilt on demand (also after a
+# restart) against the pool snapshot it was created with.
+_DECKS: Dict[str, ShuffledDeck] = {}  # {match_id: deck}
+
+async def _deck_for(match: Match) -> ShuffledDeck:
+    deck = _DECKS.get(match.match_id)
+    if deck is None or deck.seed != match.deck_seed or deck.cursor != match.deck_cursor:
+        # Not built yet, or the match moved on elsewhere (merge / other worker) — replay from seed
+        pool = await get_cached_pool_for_mode(match.mode)
+        if match.deck_pool and pool.fingerprint != match.deck_pool:
+            # The mode pool changed since the match started — replay against its own snapshot
+            snapshot = await get_deck_pool(match.deck_pool)
+            if snapshot is not None:
+                pool = snapshot
+            else:
+                logger.warning(f"Deck pool {match.deck_pool} of {match.match_id} is missing — using the current pool")
+        deck = ShuffledDeck(pool, match.deck_seed, match.deck_cursor)
+        _DECKS[match.match_id] = deck
+    return deck
+
 async def draw_player_for_turn(match: Match) -> Optional[Dict]:
     """Draws a random player for the current turn."""
+    if match.deck_seed:
+        deck = await _deck_for(match)
+        skip = set(match.draft_pool_removed)
+        for team in (match.team_a, match.team_b):
+            skip.update(p.player_id for p in team.slots.values() if p)
+        while True:
+            pid = deck.draw(skip)
+            match.deck_cursor = deck.cursor  # Persisted with the pending pick by the caller's save
+            if not pid:
+                return None
+            p_data = await get_player(pid)
+            if p_data:
+                return p_data
+            logger.warning(f"Deck card {pid} no longer exists — drawing again")
+
+    # Legacy matches (created before decks): filtered shuffle of the remaining pool
     taken = []
     for team in [match.team_a, match.team_b]:
         for p in team.slots.values():
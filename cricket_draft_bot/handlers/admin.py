@@ -2,7 +2,7 @@
 from telegram import Update
 from telegram.ext import ContextTypes
 import logging
-from database import save_player, save_match
+from database import save_player
 from utils.images import download_image
 import uuid
 import os
@@ -489,10 +489,136 @@ async def handle_clearcache(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not await check_admin(update): return
     
     from database import clear_player_cache
+    from game.features import clear_feature_tables
     clear_player_cache()
+    clear_feature_tables()
     
     await update.message.reply_text("✅ Player cache cleared successfully.", parse_mode="Markdown")
 
+async def handle_perfstats(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """
+    /perfstats
+    Shows internal performance counters (match persistence, timers).
+    """
+    if not await check_admin(update): return
+
+    from game.state import get_write_behind_stats, get_match_cache_stats
+    from database import get_cache_stats
+    from utils.timers import timers
+    from utils.cache_sync import cache_sync
+    from utils.leaderboard import leaderboard
+    from game.results import projector
+    cs = cache_sync.get_stats()
+    lb = leaderboard.get_stats()
+    rp = projector.get_stats()
+    ob = context.bot.rate_limiter.get_stats()  # utils/outbound.OutboundScheduler
+    wb = get_write_behind_stats()
+    tm = timers.get_stats()
+    pl = get_cache_stats()
+    mc = get_match_cache_stats()
+    next_due = f"{tm['next_due_in']}s" if tm['next_due_in'] is not None else "—"
+
+    text = (
+        "📊 *Performance Stats*\n\n"
+        "*Match writes (write-behind)*\n"
+        f"• Saves requested: `{wb['requested']}`\n"
+        f"• Mongo writes: `{wb['flushed']}` in `{wb['batches']}` batch(es)\n"
+        f"• Writes saved: `{wb['coalesced'] + wb['unchanged']}` (merged `{wb['coalesced']}`, no-op `{wb['unchanged']}`)\n"
+        f"• Pending: `{wb['pending']}` · Failed flushes: `{wb['failed']}`\n"
+        f"• Version conflicts: `{wb['conflicts']}` (merged `{wb['merged']}`, dropped `{wb['dropped']}`)\n\n"
+        "*Caches*\n"
+        f"• Matches: `{mc['size']}` (pinned `{mc['pinned']}`, ~`{mc['bytes'] // 1024}` KB) · hit rate `{mc['hit_rate']:.0%}`\n"
+        f"• Match lookups: hits `{mc['hits']}` · misses `{mc['misses']}` · expired `{mc['expired']}` · evicted `{mc['evictions']}` · rechecked `{mc['revalidated']}` (stale `{mc['stale']}`)\n"
+        f"• Players: hits `{pl['hits']}` · misses `{pl['misses']}` · coalesced `{pl['coalesced']}` · Mongo queries `{pl['queries']}`\n"
+        f"• Players cached: `{pl['cached']}` · evicted `{pl['evictions']}` · invalidated `{pl['invalidations']}`\n"
+        f"• Shared Player objects: `{pl['registry_size']}` · reused `{pl['registry_hits']}` · built `{pl['registry_builds']}`\n"
+        f"• Mode pools: hits `{pl['mode_hits']}` · misses `{pl['mode_misses']}` · patched `{pl['mode_patches']}`\n"
+        f"• Card pools: hits `{pl['card_hits']}` · misses `{pl['card_misses']}` · patched `{pl['card_patches']}`\n"
+        f"• Sync: `{cs['mode']}` · events `{cs['events']}` · invalidations `{cs['invalidations']}` · errors `{cs['errors']}`\n"
+        f"• Rank index: `{'loaded' if lb['loaded'] else 'loading'}` · users `{lb['users']}` · chats `{lb['chats']}` · updates `{lb['updates']}` · reads `{lb['reads']}`\n"
+        f"• Result log: logged `{rp['logged']}` · projected `{rp['projected']}` · batches `{rp['batches']}` · duplicates `{rp['duplicates']}` · errors `{rp['errors']}`\n"
+        f"• Outbound: pending `{ob['pending']}` · sent `{ob['sent']}` · coalesced `{ob['coalesced']}` · flood waits `{ob['retry_after']}` · max wait `{ob['max_wait_ms']}ms`\n\n"
+        "*Timers*\n"
+        f"• Pending: `{tm['pending']}` · Next due in: `{next_due}`\n"
+        f"• Fired: `{tm['fired']}` · Cancelled: `{tm['cancelled']}` · Skipped: `{tm['skipped']}` · Errors: `{tm['errors']}`"
+    )
+    await update.message.reply_text(text, parse_mode="Markdown")
+
+async def handle_simbalance(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """
+    /simbalance [mode] [matches]
+    Runs a random-draft balance sweep (batch engine, no stats written).
+    """
+    if not await check_admin(update): return
+
+    args = context.args or []
+    mode = args[0] if args else "IPL"
+    if mode.lower() == "wwe_women":
+        mode = "WWE Women"
+    try:
+        n_matches = min(max(int(args[1]), 100), 50000) if len(args) > 1 else 10000
+    except ValueError:
+        await update.message.reply_text("Usage: `/simbalance [mode] [matches]`", parse_mode="Markdown")
+        return
+
+    import asyncio
+    from game.features import build_feature_table
+    from game.batch import balance_sweep
+    try:
+        import numpy  # noqa: F401 — optional; only the sweep needs it
+    except ImportError:
+        await update.message.reply_text("❌ numpy not installed — `pip install numpy` to use /simbalance.", parse_mode="Markdown")
+        return
+    try:
+        table = await build_feature_table(mode)
+        report = await asyncio.to_thread(balance_sweep, table, n_matches)
+    except Exception as e:
+        await update.message.reply_text(f"❌ Sweep failed: {e}")
+        return
+
+    lines = [
+        f"⚖️ *Balance Sweep — {report['mode']}*",
+        f"{report['matches']} random drafts from {report['pool']} players\n",
+        f"Side A `{report['a_win_rate']:.1%}` · Side B `{report['b_win_rate']:.1%}` · Draw `{report['draw_rate']:.1%}`\n",
+        "*Position — natural picks · natural beats mismatch*",
+    ]
+    for pos, s in report["positions"].items():
+        nat_win = f"{s['natural_win_rate']:.1%}" if s["natural_win_rate"] is not None else "—"
+        lines.append(f"• {pos}: `{s['natural_rate']:.0%}` · `{nat_win}` ({s['nat_vs_mismatch']})")
+    await update.message.reply_text("\n".join(lines), parse_mode="Markdown")
+
+async def handle_rebuildstats(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """
+    /rebuildstats <user_id> [user_id ...]
+    Recomputes these users' match stats from the result log. Restricted to OWNER only.
+    """
+    if not await check_owner(update): return
+
+    try:
+        user_ids = [int(arg) for arg in context.args or []]
+    except ValueError:
+        user_ids = []
+    if not user_ids:
+        await update.message.reply_text(
+            "Usage: `/rebuildstats <user_id> [user_id ...]`\n"
+            "⚠️ Stats from matches played before the result log existed are lost.",
+            parse_mode="Markdown"
+        )
+        return
+
+    from database import rebuild_user_stats_from_log
+    from game.results import projector
+    try:
+        await projector.project_pending()  # Fold anything still pending first
+        replayed = await rebuild_user_stats_from_log(user_ids)
+    except Exception as e:
+        await update.message.reply_text(f"❌ Rebuild failed: {e}")
+        return
+    await update.message.reply_text(
+        f"✅ Rebuilt stats of `{len(set(user_ids))}` user(s) from `{replayed}` logged result(s).",
+        parse_mode="Markdown"
+    )
+
 async def remove_player(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """
     /removeplayer player_id=IND_KOHLI
@@ -1350,7 +1476,7 @@ async def handle_check_callback(update: Update, context: ContextTypes.DEFAULT_TY
 from telegram import Update
 from telegram.ext import ContextTypes
 import logging
-from database import save_player, save_match
+from database import save_player
 from utils.images import download_image
 import uuid
 import os
@@ -2123,15 +2249,17 @@ async def handle_broadcast(update, context):
     status = await update.message.reply_text(f"📢 Broadcasting to {len(chats)} chats...")
     import asyncio, re
     from telegram.error import Forbidden
+    from utils.outbound import BROADCAST
     async def _broadcast():
         success = failed = 0
         html = re.sub(r"\*\*(.*?)\*\*", r"<b>\1</b>", msg)
         text_out = f"📢 <b>Announcement</b>\n\n{html}"
         for chat_id in chats:
             try:
-                await context.bot.send_message(chat_id=chat_id, text=text_out, parse_mode="HTML")
+                # Lowest priority — the outbound queue paces it behind live matches
+                await context.bot.send_message(chat_id=chat_id, text=text_out, parse_mode="HTML",
+                                               rate_limit_args=BROADCAST)
                 success += 1
-                await asyncio.sleep(0.5)
             except Forbidden:
                 await get_db().chats.delete_one({"chat_id": chat_id})
                 failed += 1
@@ -2253,9 +2381,8 @@ async def handle_update_card(update: Update, context: ContextTypes.DEFAULT_TYPE)
         await update.effective_message.reply_text('\n'.join(lines))
         return
     player = players[0]
-    from database import update_card_catalog, _invalidate_card_pool_cache
-    success = await update_card_catalog(player['player_id'], fmt, ovr, rarity)
-    _invalidate_card_pool_cache()
+    from database import update_card_catalog
+    success = await update_card_catalog(player['player_id'], fmt, ovr, rarity)  # Patches cached card pools
     if not success:
         await update.effective_message.reply_text(
             f"❌ '{player['name']}' has no {fmt.upper()} card in catalog yet.\nUse /add_card first."
@@ -2323,9 +2450,8 @@ async def handle_add_card(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.effective_message.reply_text('\n'.join(lines))
         return
     player = players[0]
-    from database import add_to_card_catalog, _invalidate_card_pool_cache
-    success = await add_to_card_catalog(player['player_id'], fmt, ovr, rarity)
-    _invalidate_card_pool_cache()
+    from database import add_to_card_catalog
+    success = await add_to_card_catalog(player['player_id'], fmt, ovr, rarity)  # Patches cached card pools
     RARITY_EMOJI = {'common': '⚪', 'rare': '🔵', 'epic': '🟣', 'legend': '🟡'}
     if not success:
         await update.effective_message.reply_text(
@@ -1,7 +1,8 @@
 # handlers/cards.py
 """
 Card System handlers: /pack, /inventory, /mycards, /viewcard, /trade_card, /quest
-All coin/card mutations are protected with per-user asyncio locks.
+All coin/card mutations are protected with a per-user lock that holds across
+workers (an asyncio.Lock plus a Mongo lease).
 """
 import asyncio
 import logging
@@ -14,13 +15,53 @@ from telegram.helpers import escape_markdown
 logger = logging.getLogger(__name__)
 
 # ── Per-user anti-spam lock ───────────────────────────────────────────────────
+# The asyncio.Lock covers concurrent updates in this process; the Mongo lease
+# (database.acquire_lease) covers workers that own different chats the same
+# user plays in, which the in-process lock alone can't see.
 _CARD_LOCKS: dict[int, asyncio.Lock] = {}
+_CARD_LEASE_TTL = 30  # seconds; outlives any card operation, frees the lease if a worker dies holding it
 
 def _get_lock(user_id: int) -> asyncio.Lock:
     if user_id not in _CARD_LOCKS:
         _CARD_LOCKS[user_id] = asyncio.Lock()
     return _CARD_LOCKS[user_id]
 
+class _HeldCardLock:
+    def __init__(self, user_id: int, local: asyncio.Lock, token: str):
+        self.user_id = user_id
+        self.local = local
+        self.token = token
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        from database import release_lease
+        try:
+            await release_lease(f"cards:{self.user_id}", self.token)
+        except Exception as e:
+            logger.warning(f"Card lock release failed for {self.user_id} (expires in {_CARD_LEASE_TTL}s): {e}")
+        finally:
+            self.local.release()
+
+async def _acquire_lock(user_id: int):
+    """The user's card lock, or None if a card operation of theirs is already running
+    (here or on another worker). Use as `async with`."""
+    local = _get_lock(user_id)
+    if local.locked():
+        return None
+    await local.acquire()  # Free, so this doesn't wait
+    from database import acquire_lease
+    try:
+        token = await acquire_lease(f"cards:{user_id}", _CARD_LEASE_TTL)
+    except Exception:
+        local.release()
+        raise
+    if token is None:
+        local.release()
+        return None
+    return _HeldCardLock(user_id, local, token)
+
 # ── Display helpers ───────────────────────────────────────────────────────────
 RARITY_EMOJI = {"common": "⚪", "rare": "🔵", "epic": "🟣", "legend": "🟡"}
 PACK_EMOJI   = {"basic": "🟦", "premium": "🟣", "elite": "🟡"}
@@ -124,8 +165,8 @@ async def cb_pack_confirm(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await query.answer("⏳ Please wait before buying again!", show_alert=False)
         return
     # ── asyncio.Lock (secondary guard for truly concurrent requests) ─────────
-    lock = _get_lock(user_id)
-    if lock.locked():
+    lock = await _acquire_lock(user_id)
+    if lock is None:
         await query.answer("⏳ Please wait a moment...", show_alert=False); return
     async with lock:
         await query.answer()
@@ -222,8 +263,8 @@ async def cb_inv_open(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await query.answer("⏳ Please wait before opening another pack!", show_alert=False)
         return
     # ── asyncio.Lock (secondary guard for truly concurrent requests) ─────────
-    lock = _get_lock(user_id)
-    if lock.locked():
+    lock = await _acquire_lock(user_id)
+    if lock is None:
         await query.answer("⏳ Please wait a moment...", show_alert=False); return
     async with lock:
         await query.answer("Opening pack...")
@@ -446,8 +487,8 @@ async def cb_vc_fav(update: Update, context: ContextTypes.DEFAULT_TYPE):
     _, owner_id, player_id, fmt = query.data.split("|")
     if str(query.from_user.id) != owner_id:
         await query.answer("⛔ Not your menu.", show_alert=True); return
-    lock = _get_lock(int(owner_id))
-    if lock.locked():
+    lock = await _acquire_lock(int(owner_id))
+    if lock is None:
         await query.answer("⏳ Please wait a moment...", show_alert=False); return
     async with lock:
         from database import set_fav_card, get_user_cards
@@ -464,8 +505,8 @@ async def cb_vc_unfav(update: Update, context: ContextTypes.DEFAULT_TYPE):
     _, owner_id, player_id, fmt = query.data.split("|")
     if str(query.from_user.id) != owner_id:
         await query.answer("⛔ Not your menu.", show_alert=True); return
-    lock = _get_lock(int(owner_id))
-    if lock.locked():
+    lock = await _acquire_lock(int(owner_id))
+    if lock is None:
         await query.answer("⏳ Please wait a moment...", show_alert=False); return
     async with lock:
         from database import clear_fav_card, get_user_cards
@@ -529,8 +570,8 @@ async def cb_vc_sell_ok(update: Update, context: ContextTypes.DEFAULT_TYPE):
     from database import try_acquire_action_cooldown
     if not await try_acquire_action_cooldown(user_id, "card_sell", cooldown_seconds=5):
         await query.answer("⏳ Please wait a moment...", show_alert=False); return
-    lock = _get_lock(user_id)
-    if lock.locked():
+    lock = await _acquire_lock(user_id)
+    if lock is None:
         await query.answer("⏳ Please wait a moment...", show_alert=False); return
     async with lock:
         await query.answer()
@@ -649,8 +690,8 @@ async def cb_tr_offer(update: Update, context: ContextTypes.DEFAULT_TYPE):
     from database import try_acquire_action_cooldown
     if not await try_acquire_action_cooldown(int(initiator_id), "trade_offer", cooldown_seconds=3):
         await query.answer("⏳ Please wait a moment...", show_alert=False); return
-    lock = _get_lock(int(initiator_id))
-    if lock.locked():
+    lock = await _acquire_lock(int(initiator_id))
+    if lock is None:
         await query.answer("⏳ Please wait a moment...", show_alert=False); return
     async with lock:
         from database import get_user_cards, get_user_active_trade, create_trade, get_fav_card
@@ -730,8 +771,8 @@ async def cb_tr_pick(update: Update, context: ContextTypes.DEFAULT_TYPE):
     from database import try_acquire_action_cooldown
     if not await try_acquire_action_cooldown(int(target_id), "trade_pick", cooldown_seconds=3):
         await query.answer("⏳ Please wait a moment...", show_alert=False); return
-    lock = _get_lock(int(target_id))
-    if lock.locked():
+    lock = await _acquire_lock(int(target_id))
+    if lock is None:
         await query.answer("⏳ Please wait a moment...", show_alert=False); return
     async with lock:
         from database import get_trade, update_trade, get_user_cards, get_fav_card
@@ -795,8 +836,8 @@ async def cb_tr_confirm(update: Update, context: ContextTypes.DEFAULT_TYPE):
     from database import try_acquire_action_cooldown
     if not await try_acquire_action_cooldown(user_id, "trade_confirm", cooldown_seconds=5):
         await query.answer("⏳ Please wait a moment...", show_alert=False); return
-    lock = _get_lock(user_id)
-    if lock.locked():
+    lock = await _acquire_lock(user_id)
+    if lock is None:
         await query.answer("⏳ Please wait a moment...", show_alert=False); return
     async with lock:
         await query.answer()
@@ -862,8 +903,8 @@ async def cb_tr_decline(update: Update, context: ContextTypes.DEFAULT_TYPE):
     from database import try_acquire_action_cooldown
     if not await try_acquire_action_cooldown(int(user_id_str), "trade_decline", cooldown_seconds=5):
         await query.answer("⏳ Please wait a moment...", show_alert=False); return
-    lock = _get_lock(int(user_id_str))
-    if lock.locked():
+    lock = await _acquire_lock(int(user_id_str))
+    if lock is None:
         await query.answer("⏳ Please wait a moment...", show_alert=False); return
     async with lock:
         await query.answer()
@@ -927,8 +968,8 @@ async def cb_quest_claim(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = query.from_user.id
     if str(user_id) != owner_id:
         await query.answer("⛔ Not your quests.", show_alert=True); return
-    lock = _get_lock(user_id)
-    if lock.locked():
+    lock = await _acquire_lock(user_id)
+    if lock is None:
         await query.answer("⏳ Please wait a moment...", show_alert=False); return
     async with lock:
         await query.answer()
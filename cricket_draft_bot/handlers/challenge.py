@@ -9,6 +9,7 @@ from telegram.error import ChatMigrated
 from game.state import create_match_state
 from telegram.helpers import escape_markdown
 from database import save_pending_challenge, delete_pending_challenge
+from utils.timers import timers
 
 def esc(t):
     return escape_markdown(str(t), version=1)
@@ -16,10 +17,11 @@ def esc(t):
 logger = logging.getLogger(__name__)
 
 # In-memory dict tracking active pending challenges
-# key = owner_id, value = {task, chat_id, message_id}
+# key = "{owner_id}_{mode}_{message_id}", value = {chat_id, message_id}
 _pending_challenges: dict = {}
 
-# Locks to prevent double-clicks/spam on the mode picker buttons
+# Locks to prevent double-clicks/spam on the mode picker buttons (keyed by message,
+# so always held by the worker owning that chat)
 MODE_PICK_LOCKS = set()
 
 
@@ -49,18 +51,30 @@ def _is_stale_command(update) -> bool:
     return False
 
 
-async def _expire_challenge(ch_key: str, owner_id: int, chat_id: int, message_id: int, bot):
-    """After 2 minutes, expire the challenge if not yet joined."""
-    await asyncio.sleep(120)  # 2 minutes
+CHALLENGE_TIMEOUT = 120  # 2 minutes
+
+def _schedule_challenge_expiry(ch_key: str, owner_id: int, chat_id: int, message_id: int, mode: str,
+                               due: float = None):
+    """Durable 2-min expiry timer for a pending challenge (see utils/timers.py)."""
+    timers.schedule(
+        f"challenge:{ch_key}", "challenge", due or time.time() + CHALLENGE_TIMEOUT,
+        {"ch_key": ch_key, "owner_id": owner_id, "chat_id": chat_id, "message_id": message_id, "mode": mode},
+        chat_id=chat_id,
+    )
+
+async def _expire_challenge(bot, p: dict):
+    """Fires 2 minutes after the challenge was posted if nobody joined."""
+    ch_key, owner_id, chat_id, message_id = p["ch_key"], p["owner_id"], p["chat_id"], p["message_id"]
     # Remove from tracking (in-memory + DB)
     _pending_challenges.pop(ch_key, None)
+    # Atomically claim the DB record — if it's already gone the challenge was
+    # accepted, and message_id now belongs to the live draft board: DO NOT edit it.
     try:
-        # ch_key = "{owner_id}_{mode}_{message_id}" — extract only mode (middle segment)
-        _parts = ch_key.split('_')
-        _mode = _parts[1] if len(_parts) >= 3 else (_parts[1] if len(_parts) == 2 else None)
-        await delete_pending_challenge(owner_id, _mode)
+        from database import find_and_delete_pending_challenge
+        if not await find_and_delete_pending_challenge(owner_id, p["mode"]):
+            return
     except Exception:
-        pass
+        return  # DB error — safer to skip than to risk wiping a live match
     EXPIRED_TEXT = "⏰ <b>Challenge Expired</b>\nNo one joined in time. Start a new one with /challenge odi or /challengeipl."
     try:
         await bot.edit_message_caption(
@@ -76,14 +90,14 @@ async def _expire_challenge(ch_key: str, owner_id: int, chat_id: int, message_id
         except Exception:
             pass  # Message already gone or edited
 
+timers.register("challenge", _expire_challenge)
+
 async def _replace_old_challenge(ch_key: str, bot):
     """Cancel the previous pending challenge for this user+mode and clean up its message."""
     old = _pending_challenges.pop(ch_key, None)
     if not old:
         return
-    task = old.get('task')
-    if task and not task.done():
-        task.cancel()
+    timers.cancel(f"challenge:{ch_key}")
     # Clean DB
     try:
         parts = ch_key.split('_', 1)
@@ -234,12 +248,12 @@ async def challenge_ipl(update: Update, context: ContextTypes.DEFAULT_TYPE):
             return
     if not msg: return
     _ch_key = f"{owner_id}_IPL_{msg.message_id}"
-    task = asyncio.create_task(_expire_challenge(_ch_key, owner_id, chat_id, msg.message_id, context.bot))
-    _pending_challenges[_ch_key] = {'task': task, 'chat_id': chat_id, 'message_id': msg.message_id}
+    _pending_challenges[_ch_key] = {'chat_id': chat_id, 'message_id': msg.message_id}
     try:
         await save_pending_challenge(owner_id, chat_id, msg.message_id, "IPL")
     except Exception:
         pass
+    _schedule_challenge_expiry(_ch_key, owner_id, chat_id, msg.message_id, "IPL")
 
 
 async def challenge_odi(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -281,12 +295,12 @@ async def challenge_odi(update: Update, context: ContextTypes.DEFAULT_TYPE):
             return
     if not msg: return
     _ch_key = f"{owner_id}_ODI_{msg.message_id}"
-    task = asyncio.create_task(_expire_challenge(_ch_key, owner_id, chat_id, msg.message_id, context.bot))
-    _pending_challenges[_ch_key] = {'task': task, 'chat_id': chat_id, 'message_id': msg.message_id}
+    _pending_challenges[_ch_key] = {'chat_id': chat_id, 'message_id': msg.message_id}
     try:
         await save_pending_challenge(owner_id, chat_id, msg.message_id, "ODI")
     except Exception:
         pass
+    _schedule_challenge_expiry(_ch_key, owner_id, chat_id, msg.message_id, "ODI")
 
 # Backward-compat alias — /challengeintl still works
 challenge_intl = challenge_odi
@@ -331,12 +345,12 @@ async def challenge_fifa(update: Update, context: ContextTypes.DEFAULT_TYPE):
             return
     if not msg: return
     _ch_key = f"{owner_id}_FIFA_{msg.message_id}"
-    task = asyncio.create_task(_expire_challenge(_ch_key, owner_id, chat_id, msg.message_id, context.bot))
-    _pending_challenges[_ch_key] = {'task': task, 'chat_id': chat_id, 'message_id': msg.message_id}
+    _pending_challenges[_ch_key] = {'chat_id': chat_id, 'message_id': msg.message_id}
     try:
         await save_pending_challenge(owner_id, chat_id, msg.message_id, "FIFA")
     except Exception:
         pass
+    _schedule_challenge_expiry(_ch_key, owner_id, chat_id, msg.message_id, "FIFA")
 
 
 async def send_wwe_gender_selector(update: Update, context: ContextTypes.DEFAULT_TYPE, owner_id: int):
@@ -482,15 +496,12 @@ async def challenge_wwe_start(update: Update, context: ContextTypes.DEFAULT_TYPE
         return
         
     _ch_key = f"{owner_id}_{ch_mode_key}_{sent_msg.message_id}"
-    task = asyncio.create_task(
-        _expire_challenge(_ch_key, owner_id, chat_id, sent_msg.message_id, context.bot)
-    )
-    _pending_challenges[_ch_key] = {'task': task, 'chat_id': chat_id, 'message_id': sent_msg.message_id}
-    
+    _pending_challenges[_ch_key] = {'chat_id': chat_id, 'message_id': sent_msg.message_id}
     try:
         await save_pending_challenge(owner_id, chat_id, sent_msg.message_id, ch_mode_key)
     except Exception:
         pass
+    _schedule_challenge_expiry(_ch_key, owner_id, chat_id, sent_msg.message_id, ch_mode_key)
 
 async def challenge_wwe(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if _is_stale_command(update): return  # Drop replayed command from before bot restart
@@ -540,12 +551,12 @@ async def challenge_test(update: Update, context: ContextTypes.DEFAULT_TYPE):
             return
     if not msg: return
     _ch_key = f"{owner_id}_Test_{msg.message_id}"
-    task = asyncio.create_task(_expire_challenge(_ch_key, owner_id, chat_id, msg.message_id, context.bot))
-    _pending_challenges[_ch_key] = {'task': task, 'chat_id': chat_id, 'message_id': msg.message_id}
+    _pending_challenges[_ch_key] = {'chat_id': chat_id, 'message_id': msg.message_id}
     try:
         await save_pending_challenge(owner_id, chat_id, msg.message_id, "Test")
     except Exception:
         pass
+    _schedule_challenge_expiry(_ch_key, owner_id, chat_id, msg.message_id, "Test")
 
 
 async def challenge_unified(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -658,14 +669,12 @@ async def challenge_unified(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
 
     _ch_key = f"{owner_id}_{real_mode}_{sent_msg.message_id}"
-    task = asyncio.create_task(
-        _expire_challenge(_ch_key, owner_id, chat_id, sent_msg.message_id, context.bot)
-    )
-    _pending_challenges[_ch_key] = {'task': task, 'chat_id': chat_id, 'message_id': sent_msg.message_id}
+    _pending_challenges[_ch_key] = {'chat_id': chat_id, 'message_id': sent_msg.message_id}
     try:
         await save_pending_challenge(owner_id, chat_id, sent_msg.message_id, real_mode)
     except Exception:
         pass
+    _schedule_challenge_expiry(_ch_key, owner_id, chat_id, sent_msg.message_id, real_mode)
 
 
 async def handle_mode_pick_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -756,10 +765,25 @@ async def handle_join(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
 
 
+    # ─ Atomic claim of both players' active-match slots ─────────
+    # The counts above are only a fast path: two joins at once both pass them
+    from database import claim_match_slots, release_match_slots
+    from game.state import new_match_id
+    match_id = new_match_id(owner_id)
+    players = [owner_id, query.from_user.id]
+    blocked = await claim_match_slots(players, match_id)
+    if blocked is not None:
+        if blocked == owner_id:
+            await query.answer("⛔ The challenger already has an active match.", show_alert=True)
+        else:
+            await query.answer("⛔ You are already playing a match!", show_alert=True)
+        return
+
     # ─ Atomic check and claim of the challenge ──────────────────
     from database import find_and_delete_pending_challenge
     claimed = await find_and_delete_pending_challenge(owner_id, mode)
     if not claimed:
+        await release_match_slots(players, match_id)
         # Challenge is already accepted or expired.
         await query.answer("⚠️ Challenge has already been accepted or expired!", show_alert=True)
         try:
@@ -776,13 +800,10 @@ async def handle_join(update: Update, context: ContextTypes.DEFAULT_TYPE):
             if _msg_id:
                 _live = await _db.matches.find_one({
                     "chat_id": query.message.chat.id if query.message else None,
-                    "state_data.state": {"$in": ["DRAFTING", "READY_CHECK"]},
+                    "state": {"$in": ["DRAFTING", "READY_CHECK"]},
                     "$or": [
                         {"state_data.draft_message_id": _msg_id},
-                        {"state_data.team_a.owner_id": owner_id},
-                        {"state_data.team_b.owner_id": owner_id},
-                        {"state_data.team_a.owner_id": query.from_user.id},
-                        {"state_data.team_b.owner_id": query.from_user.id}
+                        {"participants": {"$in": [owner_id, query.from_user.id]}}
                     ]
                 })
                 _is_live_draft = bool(_live)
@@ -800,11 +821,8 @@ async def handle_join(update: Update, context: ContextTypes.DEFAULT_TYPE):
     # Cancel expiry task for THIS specific message — only reached if a different user is joining
     _joined_msg_id = query.message.message_id if query.message else None
     _ch_key = f"{owner_id}_{mode}_{_joined_msg_id}"
-    pending = _pending_challenges.pop(_ch_key, None)
-    if pending:
-        task = pending.get('task')
-        if task and not task.done():
-            task.cancel()
+    _pending_challenges.pop(_ch_key, None)
+    timers.cancel(f"challenge:{_ch_key}")
 
         
     # Start Match
@@ -830,15 +848,20 @@ async def handle_join(update: Update, context: ContextTypes.DEFAULT_TYPE):
     joiner_name = query.from_user.first_name
     
     # Initialize Match
-    match = await create_match_state(
-        chat_id=update.effective_chat.id,
-        mode=real_mode, 
-        owner_id=owner_id, 
-        challenger_id=query.from_user.id,
-        owner_name=challenger_name, # In state.py owner_name is param 5
-        challenger_name=joiner_name, # In state.py challenger_name is param 6
-        draft_message_id=query.message.message_id
-    )
+    try:
+        match = await create_match_state(
+            chat_id=update.effective_chat.id,
+            mode=real_mode, 
+            owner_id=owner_id, 
+            challenger_id=query.from_user.id,
+            owner_name=challenger_name, # In state.py owner_name is param 5
+            challenger_name=joiner_name, # In state.py challenger_name is param 6
+            draft_message_id=query.message.message_id,
+            match_id=match_id,
+        )
+    except Exception:
+        await release_match_slots(players, match_id)
+        raise
     
     # Start Draft (Update the message)
     from handlers.draft import format_draft_board, update_draft_message
@@ -884,25 +907,6 @@ async def handle_join(update: Update, context: ContextTypes.DEFAULT_TYPE):
     asyncio.create_task(_bg_pin())
 
     # Start 30-min abandon timeout (always, regardless of pin success)
-    _chat_id = update.effective_chat.id
-    _match_id = match.match_id
-    _bot = context.bot
-
-    async def _abandon_timeout_live(bot, chat_id, msg_id, match_id, delay=1800):
-        await asyncio.sleep(delay)
-        from game.state import load_match_state as _load
-        m = await _load(match_id)
-        if not m or m.state in ("DRAFTING", "READY_CHECK"):
-            try:
-                await bot.unpin_chat_message(chat_id=chat_id, message_id=msg_id)
-            except Exception:
-                pass
-            if m:
-                try:
-                    from database import get_db
-                    await get_db().matches.delete_one({"match_id": match_id})
-                except Exception:
-                    pass
-
-    asyncio.create_task(_abandon_timeout_live(_bot, _chat_id, pinned_msg_id, _match_id))
+    from handlers.draft import schedule_abandon_timeout
+    schedule_abandon_timeout(match.match_id, update.effective_chat.id, pinned_msg_id)
 
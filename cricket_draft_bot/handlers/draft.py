@@ -1,16 +1,18 @@
 # handlers/draft.py
-import dataclasses
 import time
 import asyncio
+from typing import Optional
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, InputMediaPhoto
 from telegram.ext import ContextTypes
 import logging
 from game.state import load_match_state, save_match_state, draw_player_for_turn, switch_turn, evict_match_cache
-from game.models import Match, Player
+from game.models import Match, shared_player
 from database import get_player
 from utils.validators import validate_draft_action
 from config import MAX_REDRAWS, POSITIONS_T20, POSITIONS_TEST, POSITIONS_FIFA, POSITIONS_WWE, DRAFT_BANNER_URL, DRAFT_BANNER_ODI, DRAFT_BANNER_INTL, DRAFT_BANNER_IPL, DRAFT_BANNER_TEST, DRAFT_BANNER_FIFA, DRAFT_BANNER_WWE
 from utils.banners import get_banner_for_match, get_banner_for_mode
+from utils.timers import timers
+from utils.outbound import RESULTS
 from telegram.helpers import escape_markdown
 
 def esc(t):
@@ -26,12 +28,16 @@ CACHED_BANNERS = {}
 PROCESSING_LOCKS = set()
 
 # ── AFK Forfeit System ──────────────────────────────────────────────────
-AFK_TASKS: dict = {}  # match_id -> asyncio.Task
+# Timers live in the durable scheduler (utils/timers.py), keyed by match:
+#   afk:<match_id>        current turn's AFK forfeit (moved on every turn)
+#   autoready:<match_id>  5-min auto-simulate after the draft completes
+#   abandon:<match_id>    30-min cleanup of matches that never finish
 AFK_TIMEOUT = 300    # 5 minutes
+AUTO_READY_TIMEOUT = 300  # 5 minutes
+ABANDON_TIMEOUT = 1800    # 30 minutes
 
 async def _afk_forfeit(match_id: str, expected_turn: int, bot, chat_id: int):
-    """Fires after AFK_TIMEOUT seconds if the same player still hasn't moved."""
-    await asyncio.sleep(AFK_TIMEOUT)
+    """Fires at the turn deadline if the same player still hasn't moved."""
     try:
         match = await load_match_state(match_id)
         if not match or match.state != "DRAFTING":
@@ -42,12 +48,17 @@ async def _afk_forfeit(match_id: str, expected_turn: int, bot, chat_id: int):
         afk_team = match.team_a if int(match.team_a.owner_id) == int(expected_turn) else match.team_b
         opp_team  = match.team_b if afk_team is match.team_a else match.team_a
 
-        # Record loss for AFK player only; opponent gets no win/loss
+        # Record loss for AFK player only; opponent gets no win/loss.
+        # The coin penalty stays inline below — the message reports whether it applied.
         from database import update_user_stats, get_db
-        try:
-            await update_user_stats(afk_team.owner_id, afk_team.owner_name, "L", mode=match.mode)
-        except Exception as e:
-            logger.error(f"AFK forfeit stats update failed: {e}")
+        from game.results import projector, result_event
+        outcome = ("L", 0), (None, 0)
+        event = result_event(match, "forfeit", outcome if afk_team is match.team_a else outcome[::-1])
+        if not await projector.record(event):
+            try:
+                await update_user_stats(afk_team.owner_id, afk_team.owner_name, "L", mode=match.mode)
+            except Exception as e:
+                logger.error(f"AFK forfeit stats update failed: {e}")
 
         match.state = "FINISHED"
         import time as _t
@@ -73,7 +84,8 @@ async def _afk_forfeit(match_id: str, expected_turn: int, bot, chat_id: int):
                         message_id=match.draft_message_id,
                         caption=msg,
                         reply_markup=None,
-                        parse_mode="Markdown"
+                        parse_mode="Markdown",
+                        rate_limit_args=RESULTS
                     )
                 except Exception:
                     try:
@@ -82,18 +94,21 @@ async def _afk_forfeit(match_id: str, expected_turn: int, bot, chat_id: int):
                             message_id=match.draft_message_id,
                             text=msg,
                             reply_markup=None,
-                            parse_mode="Markdown"
+                            parse_mode="Markdown",
+                            rate_limit_args=RESULTS
                         )
                     except Exception:
-                        await bot.send_message(chat_id=chat_id, text=msg, parse_mode="Markdown")
+                        await bot.send_message(chat_id=chat_id, text=msg, parse_mode="Markdown",
+                                               rate_limit_args=RESULTS)
             else:
-                await bot.send_message(chat_id=chat_id, text=msg, parse_mode="Markdown")
+                await bot.send_message(chat_id=chat_id, text=msg, parse_mode="Markdown", rate_limit_args=RESULTS)
         except Exception:
             pass
         # Cleanup pinned board and DB record
         try:
             if getattr(match, 'pinned_message_id', None):
-                await bot.unpin_chat_message(chat_id=chat_id, message_id=match.pinned_message_id)
+                await bot.unpin_chat_message(chat_id=chat_id, message_id=match.pinned_message_id,
+                                             rate_limit_args=RESULTS)
         except Exception:
             pass
         try:
@@ -103,50 +118,121 @@ async def _afk_forfeit(match_id: str, expected_turn: int, bot, chat_id: int):
             pass
     except Exception as e:
         logger.error(f"_afk_forfeit error for {match_id}: {e}")
-    finally:
-        AFK_TASKS.pop(match_id, None)
+
+def _schedule_afk(match: Match, chat_id: int):
+    timers.schedule(
+        f"afk:{match.match_id}", "afk", match.turn_deadline,
+        {"match_id": match.match_id, "expected_turn": int(match.current_turn), "chat_id": chat_id},
+        chat_id=chat_id,
+    )
 
 def _reset_afk_timer(match: Match, bot, chat_id: int):
-    """Cancel any existing AFK task and start a fresh 10-min timer for current turn."""
-    old = AFK_TASKS.pop(match.match_id, None)
-    if old and not old.done():
-        old.cancel()
+    """Move the match's AFK timer to a fresh AFK_TIMEOUT window for the current turn."""
     match.turn_deadline = time.time() + AFK_TIMEOUT
     asyncio.create_task(save_match_state(match))
-    task = asyncio.create_task(
-        _afk_forfeit(match.match_id, int(match.current_turn), bot, chat_id)
-    )
-    AFK_TASKS[match.match_id] = task
+    _schedule_afk(match, chat_id)
 
 def start_forfeit_timer_on_startup(match: Match, bot):
-    """Reschedule the AFK forfeit timer on bot startup based on remaining turn_deadline."""
+    """Ensure the AFK timer exists for a recovered match, due at its persisted turn_deadline.
+    Idempotent — the timer ID is per match, so an already-persisted timer is just re-upserted."""
     if match.state != "DRAFTING":
         return
-    now = time.time()
-    if match.turn_deadline > 0:
-        remaining = match.turn_deadline - now
-        if remaining <= 0:
-            # Already expired, trigger forfeit immediately
-            asyncio.create_task(_afk_forfeit(match.match_id, int(match.current_turn), bot, match.chat_id))
-            return
-    else:
-        remaining = AFK_TIMEOUT
-        match.turn_deadline = now + AFK_TIMEOUT
+    if match.turn_deadline <= 0:
+        match.turn_deadline = time.time() + AFK_TIMEOUT
         asyncio.create_task(save_match_state(match))
+    _schedule_afk(match, match.chat_id)  # Past deadlines fire immediately
 
-    old = AFK_TASKS.pop(match.match_id, None)
-    if old and not old.done():
-        old.cancel()
+def _match_started_at(match_id: str) -> float:
+    try:
+        return float(match_id.split("_")[1])  # match_id = ownerid_timestamp
+    except Exception:
+        return time.time()
+
+def schedule_abandon_timeout(match_id: str, chat_id: int, msg_id: Optional[int], due: Optional[float] = None):
+    """30-min safety net (counted from match start): unpin + delete a match that is still unfinished.
+    Re-scheduling with a new board message only swaps the message to unpin, never the deadline."""
+    timers.schedule(
+        f"abandon:{match_id}", "abandon", due or _match_started_at(match_id) + ABANDON_TIMEOUT,
+        {"match_id": match_id, "chat_id": chat_id, "msg_id": msg_id},
+        chat_id=chat_id,
+    )
 
-    async def _afk_forfeit_startup():
-        await asyncio.sleep(remaining)
+def schedule_auto_ready(match_id: str, chat_id: int, due: Optional[float] = None):
+    timers.schedule(
+        f"autoready:{match_id}", "autoready", due or time.time() + AUTO_READY_TIMEOUT,
+        {"match_id": match_id, "chat_id": chat_id},
+        chat_id=chat_id,
+    )
+
+async def _on_afk_timer(bot, p: dict):
+    m = await load_match_state(p["match_id"])
+    if m and m.state == "DRAFTING" and int(m.current_turn) == int(p["expected_turn"]):
+        await _afk_forfeit(p["match_id"], int(p["expected_turn"]), bot, p["chat_id"])
+
+async def _on_abandon_timer(bot, p: dict):
+    from utils.rate_limit import debouncer
+    match_id, chat_id, msg_id = p["match_id"], p["chat_id"], p.get("msg_id")
+    m = await load_match_state(match_id)
+    if m and m.state not in ("DRAFTING", "READY_CHECK"):
+        return
+    try:
+        if msg_id:
+            debouncer.cancel_updates(chat_id, msg_id)
+            await bot.unpin_chat_message(chat_id=chat_id, message_id=msg_id)
+    except Exception:
+        pass
+    if m:
         try:
-            m = await load_match_state(match.match_id)
-            if m and m.state == "DRAFTING" and int(m.current_turn) == int(match.current_turn):
-                await _afk_forfeit(match.match_id, int(match.current_turn), bot, match.chat_id)
+            from database import get_db
+            await get_db().matches.delete_one({"match_id": match_id})
+            evict_match_cache(match_id)
         except Exception:
             pass
-    AFK_TASKS[match.match_id] = asyncio.create_task(_afk_forfeit_startup())
+
+async def _on_auto_ready_timer(bot, p: dict):
+    """5 minutes after the draft completed nobody clicked READY — simulate anyway."""
+    from game.simulation import run_simulation
+    from utils.rate_limit import debouncer
+    match_id, chat_id = p["match_id"], p["chat_id"]
+    m = await load_match_state(match_id)
+    if not m or m.state != "READY_CHECK":
+        return  # Already simulated or cancelled
+    try:
+        m.state = "SIMULATING"
+        m.team_a.is_ready = True
+        m.team_b.is_ready = True
+        await save_match_state(m)
+        result_text = await run_simulation(m)  # async, returns str; also records user stats
+        m.state = "FINISHED"
+        m.finished_at = time.time()
+        await save_match_state(m)
+        debouncer.cancel_updates(chat_id, m.draft_message_id)
+        msg = f"⏰ *Auto-Ready triggered (5min timeout)*\n\n{result_text}"
+        try:
+            await bot.send_message(chat_id=chat_id, text=msg, parse_mode="Markdown", rate_limit_args=RESULTS)
+        except Exception:
+            try:
+                await bot.send_message(chat_id=chat_id, text=msg, rate_limit_args=RESULTS)
+            except Exception:
+                pass
+        pinned = getattr(m, 'pinned_message_id', None)
+        if pinned:
+            try:
+                await bot.unpin_chat_message(chat_id=chat_id, message_id=pinned, rate_limit_args=RESULTS)
+            except Exception:
+                pass
+        try:
+            from database import get_db
+            await get_db().matches.delete_one({"match_id": match_id})
+            evict_match_cache(match_id)
+        except Exception:
+            pass
+    except Exception as e:
+        logger.error(f"Auto-ready failed for {match_id}: {e}")
+
+timers.register("afk", _on_afk_timer)
+timers.register("abandon", _on_abandon_timer)
+timers.register("autoready", _on_auto_ready_timer)
 
 
 async def handle_draft_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -316,21 +402,7 @@ async def update_draft_message(update: Update, context: ContextTypes.DEFAULT_TYP
         asyncio.create_task(_bg_pin())
         
         # Start abandon timeout
-        async def _abandon_timeout(bot, chat_id, msg_id, match_id, delay=1800):
-            await asyncio.sleep(delay)
-            from game.state import load_match_state
-            from utils.rate_limit import debouncer
-            m = await load_match_state(match_id)
-            if not m or m.state in ["DRAFTING", "READY_CHECK"]:
-                try:
-                    debouncer.cancel_updates(chat_id, msg_id)
-                    await bot.unpin_chat_message(chat_id=chat_id, message_id=msg_id)
-                    if m:
-                        from database import get_db
-                        await get_db().matches.delete_one({"match_id": match_id})
-                except Exception:
-                    pass
-        asyncio.create_task(_abandon_timeout(context.bot, match.chat_id, msg.message_id, match.match_id))
+        schedule_abandon_timeout(match.match_id, match.chat_id, msg.message_id)
         await save_match_state(match)
         return
 
@@ -486,12 +558,8 @@ async def handle_assign(update: Update, context: ContextTypes.DEFAULT_TYPE, matc
         return
     current_team = match.team_a if match.team_a.owner_id == match.current_turn else match.team_b
 
-    # Filter p_data to only known fields
-    known_fields = {f.name for f in dataclasses.fields(Player)}
-    filtered_data = {k: v for k, v in p_data.items() if k in known_fields}
-    
     # Assign
-    current_team.slots[slot] = Player(**filtered_data)
+    current_team.slots[slot] = shared_player(p_data)
 
     # REMOVE FROM POOL
     if player_id in match.draft_pool:
@@ -509,56 +577,9 @@ async def handle_assign(update: Update, context: ContextTypes.DEFAULT_TYPE, matc
         match.draft_completed_at = time.time()  # Timestamp for 5-min auto-ready
         await save_match_state(match)
 
-        # Start 5-min auto-simulate timer (live — not just on startup recovery)
-        async def _auto_ready_live(bot, match_id, chat_id):
-            await asyncio.sleep(300)  # 5 minutes
-            from game.state import load_match_state, save_match_state as _save
-            from game.simulation import run_simulation
-            from utils.rate_limit import debouncer
-            m = await load_match_state(match_id)
-            if not m or m.state != "READY_CHECK":
-                return  # Already simulated or cancelled
-            try:
-                import time as _t
-                m.state = "SIMULATING"
-                m.team_a.is_ready = True
-                m.team_b.is_ready = True
-                await _save(m)
-                result_text = await run_simulation(m)  # async, returns str
-                m.state = "FINISHED"
-                m.finished_at = _t.time()
-                await _save(m)
-                debouncer.cancel_updates(chat_id, m.draft_message_id)
-                msg = f"⏰ *Auto-Ready triggered (5min timeout)*\n\n{result_text}"
-                try:
-                    await bot.send_message(chat_id=chat_id, text=msg, parse_mode="Markdown")
-                except Exception:
-                    try:
-                        await bot.send_message(chat_id=chat_id, text=msg)
-                    except Exception:
-                        pass
-                pinned = getattr(m, 'pinned_message_id', None)
-                if pinned:
-                    try:
-                        await bot.unpin_chat_message(chat_id=chat_id, message_id=pinned)
-                    except Exception:
-                        pass
-                try:
-                    from database import get_db
-                    await get_db().matches.delete_one({"match_id": match_id})
-                    evict_match_cache(match_id)
-                except Exception:
-                    pass
-            except Exception as e:
-                logger.error(f"Auto-ready live failed for {match_id}: {e}")
-
-
-        asyncio.create_task(_auto_ready_live(context.bot, match.match_id, match.chat_id))
-
-        # Draft done — cancel AFK timer (no more turns)
-        old_afk = AFK_TASKS.pop(match.match_id, None)
-        if old_afk and not old_afk.done():
-            old_afk.cancel()
+        # Start 5-min auto-simulate timer; draft done — no more turns, so drop the AFK timer
+        schedule_auto_ready(match.match_id, match.chat_id, due=match.draft_completed_at + AUTO_READY_TIMEOUT)
+        timers.cancel(f"afk:{match.match_id}")
 
         board_text = format_draft_board(match)
         # Final Board Update
@@ -731,11 +752,7 @@ async def handle_replace_exec(update: Update, context: ContextTypes.DEFAULT_TYPE
         except: pass
         return
     
-    import dataclasses
-    known_fields = {f.name for f in dataclasses.fields(Player)}
-    filtered_data = {k: v for k, v in new_player_data.items() if k in known_fields}
-    
-    new_player = Player(**filtered_data)
+    new_player = shared_player(new_player_data)
     
     # Execute Replace
 
@@ -6,6 +6,7 @@ import logging
 from game.state import load_match_state, save_match_state
 from game.simulation import run_simulation
 from telegram.helpers import escape_markdown
+from utils.outbound import RESULTS
 
 def esc(t):
     return escape_markdown(str(t), version=1)
@@ -95,19 +96,10 @@ async def handle_ready(update: Update, context: ContextTypes.DEFAULT_TYPE, match
                  )
         except Exception as e:
             logger.error(f"Failed to edit simulation result into banner: {e}")
-            # Fallback to sending new message if edit fails
-            from telegram.error import RetryAfter
-            import asyncio
+            # Fallback to sending new message if edit fails (flood waits are retried by the outbound queue)
             try:
-                await context.bot.send_message(chat_id=match.chat_id, text=result_text, parse_mode="Markdown")
-            except RetryAfter as retry_err:
-                wait = retry_err.retry_after + 1
-                logger.warning(f"Flood control on result send, retrying in {wait}s")
-                await asyncio.sleep(wait)
-                try:
-                    await context.bot.send_message(chat_id=match.chat_id, text=result_text, parse_mode="Markdown")
-                except Exception as final_e:
-                    logger.error(f"Final retry also failed sending result: {final_e}")
+                await context.bot.send_message(chat_id=match.chat_id, text=result_text, parse_mode="Markdown",
+                                               rate_limit_args=RESULTS)
             except Exception as send_e:
                 logger.error(f"Fallback send_message also failed: {send_e}")
 
@@ -116,7 +108,7 @@ async def handle_ready(update: Update, context: ContextTypes.DEFAULT_TYPE, match
         if pinned_id:
             async def _bg_unpin(bot, chat_id, msg_id):
                 try:
-                    await bot.unpin_chat_message(chat_id=chat_id, message_id=msg_id)
+                    await bot.unpin_chat_message(chat_id=chat_id, message_id=msg_id, rate_limit_args=RESULTS)
                 except Exception:
                     pass
             import asyncio
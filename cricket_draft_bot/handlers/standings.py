@@ -5,7 +5,8 @@
   Filter: [This Chat] [Cricket] [FIFA]
 
 Anti-spam: 3s per-user cooldown, same-tab guard
-Performance: 60s in-memory cache, all sorting at MongoDB level
+Performance: ranks served from the in-memory index (utils/leaderboard.py);
+             Mongo queries + 60s cache only until it has loaded
 Isolation: zero shared state with game/draft logic
 """
 
@@ -25,7 +26,8 @@ logger = logging.getLogger(__name__)
 _lb_cache: dict = {}
 CACHE_TTL = 60  # seconds
 
-# Per-user last-click timestamp for anti-spam
+# Per-user last-click timestamp for anti-spam. Per process, so with several
+# workers it's per shard — fine for anti-spam, nothing depends on it
 _user_cooldown: dict = {}
 COOLDOWN_SECS = 3
 
@@ -79,80 +81,13 @@ def _reset_timer(anchor_ts: float) -> str:
 
 
 def _next_midnight_utc() -> float:
-    import datetime
-    now = time.time()
-    dt = time.gmtime(now)
-    midnight = time.mktime(time.strptime(
-        f"{dt.tm_year}-{dt.tm_mon:02d}-{dt.tm_mday:02d} 00:00:00",
-        "%Y-%m-%d %H:%M:%S"
-    ))
-    if midnight <= now:
-        midnight += 86400
-    return midnight
+    from utils.leaderboard import period_end
+    return period_end("daily", time.time())
 
 
 def _next_monday_utc() -> float:
-    import datetime
-    now = time.time()
-    dt = time.gmtime(now)
-    days_until_monday = (7 - dt.tm_wday) % 7 or 7
-    midnight_today = time.mktime(time.strptime(
-        f"{dt.tm_year}-{dt.tm_mon:02d}-{dt.tm_mday:02d} 00:00:00",
-        "%Y-%m-%d %H:%M:%S"
-    ))
-    return midnight_today + days_until_monday * 86400
-
-
-# ── Reset check (called on /standings open) ───────────────────────────────
-
-async def _check_and_apply_resets(user_id: int):
-    """
-    Checks if daily/weekly periods have expired for this user and resets
-    their counters in the DB if so. Called when /standings is opened so
-    the display is always accurate even without a recent match.
-    """
-    import time as _t
-    from database import get_db
-    db = get_db()
-
-    now = _t.time()
-    doc = await db.users.find_one(
-        {"user_id": user_id},
-        {"daily_reset_at": 1, "weekly_reset_at": 1, "_id": 0}
-    )
-    if not doc:
-        return  # no stats yet, nothing to reset
-
-    set_fields = {}
-
-    if now >= doc.get("daily_reset_at", 0):
-        # Compute next midnight UTC
-        dt = _t.gmtime(now)
-        midnight = _t.mktime(_t.strptime(
-            f"{dt.tm_year}-{dt.tm_mon:02d}-{dt.tm_mday:02d} 00:00:00",
-            "%Y-%m-%d %H:%M:%S"
-        ))
-        if midnight <= now:
-            midnight += 86400
-        set_fields["daily_wins"] = 0
-        set_fields["daily_reset_at"] = midnight
-
-    if now >= doc.get("weekly_reset_at", 0):
-        dt = _t.gmtime(now)
-        days_until_monday = (7 - dt.tm_wday) % 7 or 7
-        midnight_today = _t.mktime(_t.strptime(
-            f"{dt.tm_year}-{dt.tm_mon:02d}-{dt.tm_mday:02d} 00:00:00",
-            "%Y-%m-%d %H:%M:%S"
-        ))
-        if midnight_today <= now:
-            midnight_today += 86400
-        monday = midnight_today + (days_until_monday - 1) * 86400
-        set_fields["weekly_wins"] = 0
-        set_fields["weekly_reset_at"] = monday
-
-    if set_fields:
-        await db.users.update_one({"user_id": user_id}, {"$set": set_fields})
-        invalidate_lb_cache()  # data changed, force fresh fetch
+    from utils.leaderboard import period_end
+    return period_end("weekly", time.time())
 
 
 # ── DB Queries ─────────────────────────────────────────────────────────────
@@ -165,10 +100,11 @@ async def _fetch_leaderboard(view: str, chat_id: int | None = None) -> list:
     from database import get_db
     db = get_db()
 
+    from utils.leaderboard import PERIODS, period_epoch
     sort_field = {
         "overall": "wins",
-        "daily": "daily_wins",
-        "weekly": "weekly_wins",
+        "daily": "daily.wins",
+        "weekly": "weekly.wins",
         "cricket": "cricket_wins",
         "fifa": "fifa_wins",
         "wwe": "wwe_wins",
@@ -177,7 +113,7 @@ async def _fetch_leaderboard(view: str, chat_id: int | None = None) -> list:
 
     projection = {
         "user_id": 1, "name": 1,
-        "wins": 1, "daily_wins": 1, "weekly_wins": 1,
+        "wins": 1, "daily": 1, "weekly": 1,
         "cricket_wins": 1, "fifa_wins": 1, "wwe_wins": 1, "chat_wins": 1,
         "first_win_at": 1,
         f"prev_rank_{view}": 1,
@@ -185,12 +121,9 @@ async def _fetch_leaderboard(view: str, chat_id: int | None = None) -> list:
     }
 
     query = {}
-    now_ts = time.time()
-    if view == "daily":
-        # Only users whose daily period is still active (reset_at in the future)
-        query = {"daily_reset_at": {"$gt": now_ts}}
-    elif view == "weekly":
-        query = {"weekly_reset_at": {"$gt": now_ts}}
+    if view in PERIODS:
+        # Only users who played in the running period (current epoch)
+        query = {f"{view}.epoch": period_epoch(view, time.time())}
     elif view == "chat" and chat_id:
         query = {f"chat_wins.{chat_id}": {"$gt": 0}}
 
@@ -206,10 +139,11 @@ async def _get_user_rank(user_id: int, view: str, chat_id: int | None = None) ->
     from database import get_db
     db = get_db()
 
+    from utils.leaderboard import PERIODS, period_epoch
     sort_field = {
         "overall": "wins",
-        "daily": "daily_wins",
-        "weekly": "weekly_wins",
+        "daily": "daily.wins",
+        "weekly": "weekly.wins",
         "cricket": "cricket_wins",
         "fifa": "fifa_wins",
         "wwe": "wwe_wins",
@@ -218,20 +152,17 @@ async def _get_user_rank(user_id: int, view: str, chat_id: int | None = None) ->
 
     user_doc = await db.users.find_one(
         {"user_id": user_id},
-        {"wins": 1, "daily_wins": 1, "weekly_wins": 1,
+        {"wins": 1, "daily": 1, "weekly": 1,
          "cricket_wins": 1, "fifa_wins": 1, "wwe_wins": 1, "chat_wins": 1, "_id": 0}
     )
     if not user_doc:
         return (None, 0)
 
-    if view == "chat" and chat_id:
-        user_wins = user_doc.get("chat_wins", {}).get(str(chat_id), 0)
-    else:
-        user_wins = user_doc.get(sort_field.split(".")[-1], 0)
+    user_wins = _wins_for_view(user_doc, view, chat_id)
 
     gt_query = {sort_field: {"$gt": user_wins}}
-    if view == "chat" and chat_id:
-        gt_query[f"chat_wins.{chat_id}"] = {"$gt": user_wins}
+    if view in PERIODS:
+        gt_query[f"{view}.epoch"] = period_epoch(view, time.time())
     rank = await db.users.count_documents(gt_query) + 1
     return (rank, user_wins)
 
@@ -256,10 +187,11 @@ async def _get_and_update_rank_change(user_id: int, view: str, current_rank: int
 def _wins_for_view(doc: dict, view: str, chat_id: int | None) -> int:
     if view == "chat" and chat_id:
         return doc.get("chat_wins", {}).get(str(chat_id), 0)
+    if view in ("daily", "weekly"):
+        from utils.leaderboard import period_wins
+        return period_wins(doc, view, time.time()) or 0  # Stale epoch reads as 0
     return doc.get({
         "overall": "wins",
-        "daily": "daily_wins",
-        "weekly": "weekly_wins",
         "cricket": "cricket_wins",
         "fifa": "fifa_wins",
         "wwe": "wwe_wins",
@@ -368,26 +300,25 @@ async def _render_standings(
     user_id = update.effective_user.id
     chat_id = update.effective_chat.id
 
-    # Run reset check silently in background — ensures daily/weekly
-    # counters are correct even if user hasn't played a match today.
-    try:
-        await _check_and_apply_resets(user_id)
-    except Exception as e:
-        logger.warning(f"Reset check failed: {e}")
-
-    ck = _cache_key(view, chat_id if view == "chat" else None)
-    cached = _get_cached(ck)
-
-    if cached:
-        rows, last_ts = cached
+    from utils.leaderboard import leaderboard
+    lb_chat = chat_id if view == "chat" else None
+    indexed = leaderboard.top(view, lb_chat)
+    if indexed is not None:
+        rows, last_ts = indexed
+        user_rank, user_wins = leaderboard.rank(user_id, view, lb_chat)
     else:
-        rows = await _fetch_leaderboard(view, chat_id)
-        last_ts = time.time()
-        _set_cache(ck, (rows, last_ts))
+        # Rank index still loading — query Mongo
+        ck = _cache_key(view, lb_chat)
+        cached = _get_cached(ck)
 
-    user_rank, user_wins = await _get_user_rank(
-        user_id, view, chat_id if view == "chat" else None
-    )
+        if cached:
+            rows, last_ts = cached
+        else:
+            rows = await _fetch_leaderboard(view, chat_id)
+            last_ts = time.time()
+            _set_cache(ck, (rows, last_ts))
+
+        user_rank, user_wins = await _get_user_rank(user_id, view, lb_chat)
 
     text = _build_text(view, rows, user_id, user_rank, user_wins, chat_id, last_ts)
     is_group = update.effective_chat.type != "private"
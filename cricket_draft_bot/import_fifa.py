@@ -1,4 +1,5 @@
 import csv
+import datetime
 import logging
 from database import get_db, init_db
 
@@ -58,7 +59,8 @@ def import_fifa_players():
                         "fifa": stats 
                     },
                     "fifa_image_url": row['PhotoUrl'],
-                    "image_file_id": None 
+                    "image_file_id": None,
+                    "last_modified": datetime.datetime.utcnow(),  # Picked up by running bots' cache sync
                 }
                 
                 # OPTIMIZATION: Only import if Overall > 80
@@ -18,9 +18,10 @@ def fixed_astimezone(timezone):
 apscheduler.util.astimezone = fixed_astimezone
 
 from telegram import Update
-from telegram.ext import ApplicationBuilder, ContextTypes, CommandHandler, CallbackQueryHandler, AIORateLimiter
-from config import BOT_TOKEN
+from telegram.ext import ApplicationBuilder, ContextTypes, CommandHandler, CallbackQueryHandler
+from config import BOT_TOKEN, WORKER_COUNT, WEBHOOK_URL, WEBHOOK_CONCURRENCY
 from database import init_db
+from utils.outbound import OutboundScheduler, RECOVERY
 from handlers.admin import add_player, map_api, remove_player, get_player_stats, reset_matches
 from handlers.challenge import challenge_ipl, challenge_odi, challenge_test, challenge_fifa, challenge_wwe, handle_join, handle_mode_pick_callback
 from handlers.draft import handle_draft_callback
@@ -186,8 +187,27 @@ async def handle_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def post_init(application):
     from database import init_db, get_db
     await init_db()
-    # Startup recovery: clean up stuck matches and restart timers
+    # Durable timers first: reload this worker's persisted timers from Mongo
+    from utils.timers import timers
+    await timers.start(application.bot)
+    # Keep this process's caches coherent with edits made by other processes
+    from utils.cache_sync import cache_sync
+    cache_sync.start()
+    # In-memory standings rank index — /standings queries Mongo until it has loaded
+    from utils.leaderboard import leaderboard
+    leaderboard.start()
+    # Fold logged match results into user stats (game/results.py)
+    from game.results import projector
+    projector.start()
+    # Slot-score tables build in the background; simulations fall back until they land
+    from game.features import start_feature_build
+    for mode in ("IPL", "ODI", "Test", "FIFA", "WWE", "WWE Women"):
+        start_feature_build(mode)
+    # Startup recovery: clean up stuck matches and make sure their timers exist
     await _startup_recovery(application.bot)
+    from utils.workers import is_primary_worker
+    if not is_primary_worker():
+        return  # Global housekeeping runs on worker 0 only
     # Periodic cleanup: expire abandoned trades every 2 minutes (plain asyncio, no APScheduler needed)
     async def _trade_cleanup_loop():
         import asyncio as _aio
@@ -204,25 +224,43 @@ async def post_init(application):
             await _aio.sleep(120)     # then every 2 minutes
     asyncio.create_task(_trade_cleanup_loop())
 
+async def post_shutdown(application):
+    # Flush write-behind match state so a redeploy never drops the last few clicks
+    from game.state import flush_match_writes
+    try:
+        await flush_match_writes()
+    except Exception as e:
+        logging.getLogger(__name__).error(f"Shutdown flush of match state failed: {e}")
+    # Let queued timer upserts/deletes reach Mongo so the next start resumes them
+    from utils.timers import timers
+    await timers.stop()
+    from utils.cache_sync import cache_sync
+    await cache_sync.stop()
+    from game.results import projector
+    await projector.stop()
+
 async def _startup_recovery(bot):
     """On every bot start, scan for stuck matches and:
     - If older than 30min in DRAFTING/READY_CHECK: unpin + delete
-    - If in READY_CHECK and draft_completed_at > 5min ago: auto-simulate
-    - If < 30min in DRAFTING: restart the 30min abandon timeout
+    - Otherwise make sure its durable timers exist (abandon, AFK or auto-ready).
+      Timers persisted before the restart are already loaded; scheduling the same
+      deterministic timer ID again is idempotent, and covers matches created
+      before timers were persisted.
     """
     from database import get_db
     from game.state import load_match_state, save_match_state
+    from handlers.draft import schedule_abandon_timeout, schedule_auto_ready, AUTO_READY_TIMEOUT
+    from utils.workers import owns_chat
 
     db = get_db()
     now = time.time()
     ABANDON_LIMIT   = 1800  # 30 min
-    AUTOREADY_LIMIT = 300   # 5 min
 
     logger = logging.getLogger(__name__)
     logger.info("Startup recovery: scanning for stuck matches...")
 
     try:
-        # IMPORTANT: save_match() stores all match fields nested inside the
+        # IMPORTANT: match documents store all match fields nested inside the
         # 'state_data' sub-document, so the query must use 'state_data.state'.
         # The old query {"state": ...} matched NOTHING because there is no
         # top-level 'state' field — making _startup_recovery completely blind.
@@ -235,11 +273,12 @@ async def _startup_recovery(bot):
 
     cleaned = 0
     restarted = 0
-    _drafting_idx = 0  # Used to stagger UI refresh messages (avoid rate-limit burst)
 
     for doc in stuck:
         match_id  = doc.get("match_id")
         chat_id   = doc.get("chat_id")
+        if not owns_chat(chat_id):
+            continue  # Another worker's shard — it recovers (and re-arms timers for) its own matches
         sd        = doc.get("state_data", {})  # All match fields live inside state_data
         pinned_id = sd.get("pinned_message_id")
         state     = sd.get("state", "DRAFTING")
@@ -265,27 +304,17 @@ async def _startup_recovery(bot):
                 pass
             cleaned += 1
 
-        elif state == "READY_CHECK" and draft_completed_at > 0 and (now - draft_completed_at) >= AUTOREADY_LIMIT:
-            # Draft complete but players didn't click ready for 5+ min — auto-simulate
-            asyncio.create_task(_auto_simulate(bot, match_id))
-            restarted += 1
-
         else:
-            # Still young — restart the abandon timeout with remaining time
-            remaining = max(30, ABANDON_LIMIT - age)
-            async def _delayed_unpin(b, c_id, p_id, m_id, delay):
-                await asyncio.sleep(delay)
-                from game.state import load_match_state
-                m = await load_match_state(m_id)
-                if not m or m.state in ["DRAFTING", "READY_CHECK"]:
-                    try: await b.unpin_chat_message(chat_id=c_id, message_id=p_id)
-                    except: pass
-                    try:
-                        from database import get_db as _gdb
-                        await _gdb().matches.delete_one({"match_id": m_id})
-                    except: pass
-            asyncio.create_task(_delayed_unpin(bot, chat_id, pinned_id, match_id, remaining))
-            
+            # Still young — (re)arm the abandon timeout at its original deadline
+            schedule_abandon_timeout(match_id, chat_id, pinned_id, due=created_at + ABANDON_LIMIT)
+
+            if state == "READY_CHECK":
+                # Auto-simulate 5 min after the draft completed (fires at once if already overdue)
+                due = (draft_completed_at or now) + AUTO_READY_TIMEOUT
+                schedule_auto_ready(match_id, chat_id, due=due)
+                if due <= now:
+                    restarted += 1
+
             # Restart AFK forfeit timer if in drafting phase
             if state == "DRAFTING":
                 async def _startup_afk_recovery(m_id, b):
@@ -299,10 +328,8 @@ async def _startup_recovery(bot):
                         pass
                 asyncio.create_task(_startup_afk_recovery(match_id, bot))
                 # Refresh the draft UI so players see the correct buttons after restart.
-                # Stagger sends by 1.5s per match to avoid hitting Telegram rate limits
-                # when there are 30+ concurrent matches.
-                asyncio.create_task(_refresh_draft_ui(bot, match_id, delay=_drafting_idx * 1.5))
-                _drafting_idx += 1
+                # Sent at RECOVERY priority — the outbound queue paces them behind live clicks.
+                asyncio.create_task(_refresh_draft_ui(bot, match_id))
 
     logger.info(f"Startup recovery done: {cleaned} cleaned, {restarted} auto-simulating.")
 
@@ -312,7 +339,7 @@ async def _startup_recovery(bot):
         EXPIRED_TEXT = "⏰ <b>Challenge Expired</b>\nNo one joined in time. Start a new one with /challenge odi or /challengeipl."
 
         # 1. Immediately expire challenges already older than 2 min
-        stale = await get_stale_challenges(expiry_secs=120)
+        stale = [ch for ch in await get_stale_challenges(expiry_secs=120) if owns_chat(ch.get("chat_id"))]
         for ch in stale:
             cid  = ch.get("chat_id")
             mid  = ch.get("message_id")
@@ -326,50 +353,30 @@ async def _startup_recovery(bot):
             if not still_pending:
                 continue  # Already accepted → skip, protect the draft board
             try:
-                await bot.edit_message_caption(chat_id=cid, message_id=mid, caption=EXPIRED_TEXT, parse_mode="HTML")
+                await bot.edit_message_caption(chat_id=cid, message_id=mid, caption=EXPIRED_TEXT, parse_mode="HTML",
+                                               rate_limit_args=RECOVERY)
             except Exception:
                 try:
-                    await bot.edit_message_text(chat_id=cid, message_id=mid, text=EXPIRED_TEXT, parse_mode="HTML")
+                    await bot.edit_message_text(chat_id=cid, message_id=mid, text=EXPIRED_TEXT, parse_mode="HTML",
+                                                rate_limit_args=RECOVERY)
                 except Exception:
                     pass
-            # Throttle: 50ms gap between edits to stay under Telegram's 30 msg/sec limit
-            await asyncio.sleep(0.05)
         if stale:
             logger.info(f"Startup recovery: expired {len(stale)} stale challenge(s).")
 
-        # 2. Reschedule expiry for young challenges (<120s) — bot restarted mid-timer
+        # 2. Make sure young challenges (<120s) have their expiry timer — idempotent
+        #    for challenges whose durable timer was already reloaded
+        from handlers.challenge import _schedule_challenge_expiry, CHALLENGE_TIMEOUT
         db2 = _gdb()
-        young_cursor = db2.pending_challenges.find({"created_at": {"$gte": now - 120}})
-        young = await young_cursor.to_list(length=200)
+        young_cursor = db2.pending_challenges.find({"created_at": {"$gte": now - CHALLENGE_TIMEOUT}})
+        young = [ch for ch in await young_cursor.to_list(length=200) if owns_chat(ch.get("chat_id"))]
         for ch in young:
             cid      = ch.get("chat_id")
             mid      = ch.get("message_id")
             oid      = ch.get("owner_id")
             mode     = ch.get("mode", "")
             created  = ch.get("created_at", now)
-            remaining = max(5, 120 - (now - created))  # seconds left until expiry
-
-            async def _recover_expire(bot, cid, mid, oid, mode, delay, text=EXPIRED_TEXT):
-                await asyncio.sleep(delay)
-                # Atomically claim the DB record. If it's already gone, the challenge
-                # was accepted while we were sleeping — the message_id is now the live
-                # draft board. DO NOT edit it in that case.
-                try:
-                    from database import find_and_delete_pending_challenge as _claim
-                    still_pending = await _claim(oid, mode)
-                    if not still_pending:
-                        return  # Already accepted → protect the draft board
-                except Exception:
-                    return  # DB error — safer to skip than to risk wiping a live match
-                try:
-                    await bot.edit_message_caption(chat_id=cid, message_id=mid, caption=text, parse_mode="HTML")
-                except Exception:
-                    try:
-                        await bot.edit_message_text(chat_id=cid, message_id=mid, text=text, parse_mode="HTML")
-                    except Exception:
-                        pass
-
-            asyncio.create_task(_recover_expire(bot, cid, mid, oid, mode, remaining))
+            _schedule_challenge_expiry(f"{oid}_{mode}_{mid}", oid, cid, mid, mode, due=created + CHALLENGE_TIMEOUT)
 
         if young:
             logger.info(f"Startup recovery: rescheduled expiry for {len(young)} young challenge(s).")
@@ -378,58 +385,7 @@ async def _startup_recovery(bot):
         logger.error(f"Stale challenge cleanup failed: {e}")
 
 
-async def _auto_simulate(bot, match_id: str):
-    """Trigger simulation for a READY_CHECK match that timed out."""
-    from game.state import load_match_state, save_match_state
-    from game.simulation import run_simulation
-    from utils.rate_limit import debouncer
-
-    logger = logging.getLogger(__name__)
-    try:
-        match = await load_match_state(match_id)
-        if not match or match.state != "READY_CHECK":
-            return
-
-        match.state = "SIMULATING"
-        match.team_a.is_ready = True
-        match.team_b.is_ready = True
-        await save_match_state(match)
-
-        result_text = await run_simulation(match)
-        match.state = "FINISHED"
-        match.finished_at = time.time()
-        await save_match_state(match)
-
-        # Clean up debouncer state for this match to prevent memory leak
-        debouncer.cancel_updates(match.chat_id, match.draft_message_id)
-
-        await bot.send_message(
-            chat_id=match.chat_id,
-            text=f"\u23f0 *Auto-Ready triggered (5min timeout)*\n\n{result_text}",
-            parse_mode="Markdown"
-        )
-
-        # Unpin draft board
-        pinned_id = getattr(match, 'pinned_message_id', None)
-        if pinned_id:
-            try:
-                await bot.unpin_chat_message(chat_id=match.chat_id, message_id=pinned_id)
-            except Exception:
-                pass
-
-        # Update user stats
-        from database import update_user_stats
-        result_a = "W" if match.team_a.score > match.team_b.score else ("D" if match.team_a.score == match.team_b.score else "L")
-        result_b = "W" if match.team_b.score > match.team_a.score else ("D" if match.team_a.score == match.team_b.score else "L")
-        mode = match.mode
-        await update_user_stats(match.team_a.owner_id, result_a, mode=mode, chat_id=match.chat_id)
-        await update_user_stats(match.team_b.owner_id, result_b, mode=mode, chat_id=match.chat_id)
-
-    except Exception as e:
-        logger.error(f"Auto-simulate failed for {match_id}: {e}")
-
-
-async def _refresh_draft_ui(bot, match_id: str, delay: float = 0.0):
+async def _refresh_draft_ui(bot, match_id: str):
     """
     After a bot restart (e.g. Koyeb dyno recycle), re-sends the correct draft
     UI to the group so players are never left with a stale/buttonless message.
@@ -440,8 +396,6 @@ async def _refresh_draft_ui(bot, match_id: str, delay: float = 0.0):
     A new message is always sent (not edited) because the old draft_message_id
     may be stale or show wrong state after restart.
     """
-    if delay:
-        await asyncio.sleep(delay)
 
     _logger = logging.getLogger(__name__)
 
@@ -521,7 +475,8 @@ async def _refresh_draft_ui(bot, match_id: str, delay: float = 0.0):
             chat_id=match.chat_id,
             text=text,
             reply_markup=reply_markup,
-            parse_mode="Markdown"
+            parse_mode="Markdown",
+            rate_limit_args=RECOVERY
         )
         match.draft_message_id = msg.message_id
 
@@ -530,7 +485,8 @@ async def _refresh_draft_ui(bot, match_id: str, delay: float = 0.0):
             await bot.pin_chat_message(
                 chat_id=match.chat_id,
                 message_id=msg.message_id,
-                disable_notification=True
+                disable_notification=True,
+                rate_limit_args=RECOVERY
             )
             match.pinned_message_id = msg.message_id
         except Exception:
@@ -543,15 +499,19 @@ async def _refresh_draft_ui(bot, match_id: str, delay: float = 0.0):
         _logger.error(f"_refresh_draft_ui failed for match {match_id}: {e}")
 
 
-if __name__ == '__main__':
+def build_application(updater: bool = True, concurrent: bool = False):
+    """Builds the Application with every handler registered.
+    updater=False is used by webhook mode and multi-worker processes, which feed update_queue
+    themselves; concurrent=True processes up to WEBHOOK_CONCURRENCY updates in parallel."""
     # Build application
-    application = (
+    builder = (
         ApplicationBuilder()
         .token(BOT_TOKEN)
-        .rate_limiter(AIORateLimiter(
-            max_retries=3,
-            overall_max_rate=28,     # Telegram allows ~30/sec globally; stay safely under
-            overall_time_period=1,
+        # Every Bot API call goes through one prioritised outbound queue (utils/outbound.py)
+        .rate_limiter(OutboundScheduler(
+            # Telegram allows ~30/sec globally; stay safely under. Workers split the budget
+            # (each group chat is owned by one worker, so the per-group limit stays as is).
+            overall_max_rate=max(1, 28 // WORKER_COUNT),
             group_max_rate=18,       # Telegram allows ~20/min per group; stay safely under
             group_time_period=60,
         ))
@@ -561,8 +521,17 @@ if __name__ == '__main__':
         .write_timeout(30)
         .connection_pool_size(1024)
         .post_init(post_init)
-        .build()
+        .post_shutdown(post_shutdown)
     )
+    if not updater:
+        builder = builder.updater(None)  # Webhook / multi-worker: updates are pushed to update_queue
+    if concurrent:
+        # Updates run in parallel. Match writes are compare-and-swap, draft clicks are
+        # de-duplicated per match and the one-live-match limit is claimed atomically in
+        # Mongo (database.claim_match_slots). Mode-pick locks and the standings cooldown
+        # check and set in one step (no await between), so they hold within a process.
+        builder = builder.concurrent_updates(WEBHOOK_CONCURRENCY)
+    application = builder.build()
 
     # Handlers
     application.add_handler(CommandHandler('start', start))
@@ -582,8 +551,11 @@ if __name__ == '__main__':
     application.add_handler(CommandHandler('mod', wrap_admin_logging(add_mod_handler, "Add Moderator")))
     application.add_handler(CommandHandler('unmod', wrap_admin_logging(remove_mod_handler, "Remove Moderator")))
     application.add_handler(CommandHandler('modrm', wrap_admin_logging(remove_mod_handler, "Remove Moderator")))
-    from handlers.admin import list_mods_handler
+    from handlers.admin import list_mods_handler, handle_perfstats, handle_simbalance, handle_rebuildstats
     application.add_handler(CommandHandler('mods', list_mods_handler))
+    application.add_handler(CommandHandler('perfstats', handle_perfstats))
+    application.add_handler(CommandHandler('simbalance', handle_simbalance))
+    application.add_handler(CommandHandler('rebuildstats', wrap_admin_logging(handle_rebuildstats, "Rebuild User Stats")))
 
     # Stat modifiers
     from handlers.admin import (
@@ -739,25 +711,6 @@ if __name__ == '__main__':
     # Catch-all callback (must be LAST)
     application.add_handler(CallbackQueryHandler(handle_callback))
 
-    # ---- HEALTH SERVER (FREE TIER FIX) ----
-    import threading
-    import os
-    from http.server import BaseHTTPRequestHandler, HTTPServer
-
-    class HealthHandler(BaseHTTPRequestHandler):
-        def do_GET(self):
-            self.send_response(200)
-            self.end_headers()
-            self.wfile.write(b"OK")
-
-    def start_health_server():
-        port = int(os.environ.get("PORT", 8000))
-        server = HTTPServer(("0.0.0.0", port), HealthHandler)
-        server.serve_forever()
-
-    threading.Thread(target=start_health_server, daemon=True).start()
-
-
     async def error_handler(update: object, context: ContextTypes.DEFAULT_TYPE) -> None:
         err = context.error
         err_str = str(err)
@@ -773,11 +726,47 @@ if __name__ == '__main__':
             return  # Drop silently — not a real bug
         logging.getLogger(__name__).error(msg="Exception while handling an update:", exc_info=err)
 
-
-    # Trade System
-    
     application.add_error_handler(error_handler)
+    return application
+
+
+if __name__ == '__main__':
+    # ---- HEALTH SERVER (FREE TIER FIX) ----
+    # Polling mode only: in webhook mode the webhook server answers /health on PORT
+    import threading
+    import os
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+
+    class HealthHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            self.send_response(200)
+            self.end_headers()
+            self.wfile.write(b"OK")
+
+    def start_health_server():
+        port = int(os.environ.get("PORT", 8000))
+        server = HTTPServer(("0.0.0.0", port), HealthHandler)
+        server.serve_forever()
 
+    if not WEBHOOK_URL:
+        threading.Thread(target=start_health_server, daemon=True).start()
+
+    if WORKER_COUNT > 1:
+        # Local dispatcher: receive updates here (webhook or polling), shard them by chat
+        # across worker processes
+        from utils.workers import run_dispatcher
+        print(f"Bot is running ({'Webhook' if WEBHOOK_URL else 'Polling'} mode, {WORKER_COUNT} workers)...")
+        run_dispatcher(WORKER_COUNT)
+        raise SystemExit(0)
+
+    if WEBHOOK_URL:
+        # One async server on PORT takes Telegram updates (processed concurrently) and answers /health
+        from utils.webhook import run_webhook
+        print("Bot is running (Webhook mode)...")
+        asyncio.run(run_webhook(build_application(updater=False, concurrent=True)))
+        raise SystemExit(0)
+
+    application = build_application()
     print("Bot is running (Polling mode, Free tier compatible)...")
     # drop_pending_updates=True: on restart, skip all queued updates that
     # accumulated while the bot was offline. This prevents:
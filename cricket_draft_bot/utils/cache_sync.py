@@ -0,0 +1,269 @@
+# utils/cache_sync.py
+"""
+Cross-process cache coherence.
+
+The player cache, mode / card pools, banner cache and the standings cache
+are per process. Edits made elsewhere — import_fifa.py, another worker,
+a second deployment — used to go unseen until a TTL ran out (up to 30 min
+for mode pools). This listener applies precise invalidations instead:
+
+  • players  — the changed player is dropped and the pools patched
+               (database.apply_remote_player_change); a delete, which
+               doesn't say which player_id it was, drops all player caches
+  • config   — banner_<mode> keys drop that banner from the cache
+  • users    — leaderboard-relevant changes re-index that user in the
+               rank index (utils/leaderboard.py)
+
+Mongo change streams are used when available (replica sets / Atlas). On a
+standalone mongod the listener falls back to polling a `last_modified`
+watermark every CACHE_SYNC_POLL_SECS; polling can't see deletes, which
+still expire with the caches' TTLs. Each writer stamps last_modified from its
+own clock and stamps can commit out of order, so every poll re-reads
+_POLL_OVERLAP behind the watermark and skips documents it already applied.
+
+Our own player writes come back as events too, and each one would patch
+every cached mode / card pool again (a find_one apiece). database stamps
+them with a last_modified it remembers (deletes remember the _id), and
+events carrying one of those are skipped — that version is already applied.
+"""
+
+import asyncio
+import datetime
+import logging
+from typing import Dict, Optional
+
+from config import CACHE_SYNC, CACHE_SYNC_POLL_SECS
+
+logger = logging.getLogger(__name__)
+
+_COLLECTIONS = ["players", "config", "users"]
+# users fields the standings views read (rank bookkeeping like prev_rank_* is ignored)
+_LEADERBOARD_FIELDS = ("name", "wins", "daily", "weekly", "cricket_wins", "fifa_wins",
+                       "wwe_wins", "chat_wins", "first_win_at")
+_POLL_OVERLAP = datetime.timedelta(seconds=60)  # Clock skew / commit delay tolerated between writers
+_NOT_REPLICA_SET = 40573  # "$changeStream stage is only supported on replica sets"
+_HISTORY_LOST = 286       # Resume token fell off the oplog
+
+
+class CacheSync:
+    def __init__(self):
+        self.mode = "off"  # "change_stream" | "polling" | "off"
+        self.stats = {"events": 0, "invalidations": 0, "polls": 0, "errors": 0, "own_skipped": 0}
+        self._task: Optional[asyncio.Task] = None
+        self._resume_token = None
+        self._watermarks: Dict[str, object] = {}
+        self._seen: Dict[str, Dict] = {coll: {} for coll in _COLLECTIONS}  # {coll: {doc key: last_modified}} inside the overlap
+
+    def start(self):
+        if CACHE_SYNC == "off":
+            logger.info("Cache sync disabled (CACHE_SYNC=off)")
+            return
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task and not self._task.done():
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        self.mode = "off"
+
+    def get_stats(self) -> Dict:
+        return {**self.stats, "mode": self.mode}
+
+    # ── Runner ───────────────────────────────────────────────────────────────
+
+    async def _run(self):
+        from pymongo.errors import OperationFailure
+        if CACHE_SYNC != "poll":
+            while True:
+                try:
+                    await self._watch()
+                except asyncio.CancelledError:
+                    raise
+                except OperationFailure as e:
+                    if e.code == _NOT_REPLICA_SET or "replica set" in str(e).lower():
+                        logger.info("Change streams unavailable — cache sync falls back to polling")
+                        break
+                    if e.code == _HISTORY_LOST:
+                        # Missed events can't be replayed — start clean
+                        self._resume_token = None
+                        await self._invalidate_everything()
+                    self.stats["errors"] += 1
+                    logger.warning(f"Change stream failed, reconnecting: {e}")
+                except Exception as e:
+                    self.stats["errors"] += 1
+                    logger.warning(f"Change stream failed, reconnecting: {e}")
+                await asyncio.sleep(5)
+        await self._poll_loop()
+
+    async def _watch(self):
+        from database import get_db
+        db = get_db()
+        pipeline = [{"$match": {"ns.coll": {"$in": _COLLECTIONS}}}]
+        async with db.watch(pipeline, full_document="updateLookup", resume_after=self._resume_token) as stream:
+            if self.mode != "change_stream":
+                logger.info("Cache sync listening on change streams")
+            self.mode = "change_stream"
+            async for change in stream:
+                self._resume_token = change["_id"]
+                try:
+                    await self._apply(change)
+                except Exception as e:
+                    self.stats["errors"] += 1
+                    logger.warning(f"Cache sync could not apply {change.get('operationType')}: {e}")
+
+    async def _apply(self, change: Dict):
+        from database import apply_remote_player_change, invalidate_banner_cache
+        self.stats["events"] += 1
+        op = change["operationType"]
+        coll = change.get("ns", {}).get("coll")
+        doc = change.get("fullDocument") or {}
+        updated = change.get("updateDescription", {})
+        fields = list(updated.get("updatedFields", {})) + list(updated.get("removedFields", []))
+
+        if op in ("drop", "dropDatabase", "rename", "invalidate"):
+            await self._invalidate_everything()
+        elif coll == "players":
+            pid = doc.get("player_id") if op != "delete" else None
+            if self._own_player_event(op, pid, change, updated):
+                self.stats["own_skipped"] += 1
+                return
+            cards_only = op == "update" and fields and all(
+                f.startswith("cards") or f == "last_modified" for f in fields
+            )
+            await apply_remote_player_change(pid, deleted=op == "delete", cards_only=bool(cards_only))
+            self.stats["invalidations"] += 1
+        elif coll == "config":
+            key = doc.get("key", "")
+            if op == "delete" or not key:
+                invalidate_banner_cache()
+            elif key.startswith("banner_"):
+                invalidate_banner_cache(key[len("banner_"):])
+            self.stats["invalidations"] += 1
+        elif coll == "users":
+            if op != "update" or any(f.startswith(_LEADERBOARD_FIELDS) for f in fields):
+                if op == "delete" or not doc:
+                    self._invalidate_leaderboards()
+                else:
+                    self._apply_user(doc)
+
+    @staticmethod
+    def _own_player_event(op: str, pid: Optional[str], change: Dict, updated: Dict) -> bool:
+        """True for the echo of a player write or delete this process made."""
+        from database import is_own_player_write, is_own_player_delete
+        if op == "delete":
+            return is_own_player_delete(change.get("documentKey", {}).get("_id"))
+        # updatedFields carries this event's own stamp; fullDocument may already be newer
+        stamp = updated.get("updatedFields", {}).get("last_modified")
+        if stamp is None and op != "update":
+            stamp = (change.get("fullDocument") or {}).get("last_modified")
+        return stamp is not None and is_own_player_write(pid, stamp)
+
+    # ── Polling fallback ─────────────────────────────────────────────────────
+
+    async def _poll_loop(self):
+        self.mode = "polling"
+        logger.info(f"Cache sync polling every {CACHE_SYNC_POLL_SECS}s")
+        for coll in _COLLECTIONS:
+            try:
+                self._watermarks[coll] = await self._latest(coll)
+            except Exception as e:
+                logger.warning(f"Cache sync watermark for {coll} failed: {e}")
+        while True:
+            await asyncio.sleep(CACHE_SYNC_POLL_SECS)
+            try:
+                await self._poll_once()
+                self.stats["polls"] += 1
+            except Exception as e:
+                self.stats["errors"] += 1
+                logger.warning(f"Cache sync poll failed: {e}")
+
+    async def _latest(self, coll: str):
+        from database import get_db
+        cursor = get_db()[coll].find({"last_modified": {"$ne": None}}, {"last_modified": 1, "_id": 0})
+        docs = await cursor.sort("last_modified", -1).limit(1).to_list(1)
+        return docs[0]["last_modified"] if docs else None
+
+    def _since(self, coll: str) -> Dict:
+        mark = self._watermarks.get(coll)
+        if mark is None:
+            return {"last_modified": {"$ne": None}}
+        if isinstance(mark, datetime.datetime):
+            mark -= _POLL_OVERLAP
+        return {"last_modified": {"$gt": mark}}
+
+    async def _poll_once(self):
+        from database import get_db, apply_remote_player_change, invalidate_banner_cache, is_own_player_write
+        db = get_db()
+
+        async for doc in db.players.find(self._since("players"), {"player_id": 1, "last_modified": 1, "_id": 0}):
+            if self._unseen("players", doc.get("player_id"), doc["last_modified"]):
+                if is_own_player_write(doc.get("player_id"), doc["last_modified"]):
+                    self.stats["own_skipped"] += 1
+                    continue
+                await apply_remote_player_change(doc.get("player_id"))
+                self.stats["invalidations"] += 1
+
+        async for doc in db.config.find(self._since("config"), {"key": 1, "last_modified": 1, "_id": 0}):
+            key = doc.get("key", "")
+            if self._unseen("config", key, doc["last_modified"]):
+                if key.startswith("banner_"):
+                    invalidate_banner_cache(key[len("banner_"):])
+                self.stats["invalidations"] += 1
+
+        from utils.leaderboard import LEADERBOARD_PROJECTION
+        projection = {**LEADERBOARD_PROJECTION, "last_modified": 1}
+        async for doc in db.users.find(self._since("users"), projection):
+            if self._unseen("users", doc.get("user_id"), doc["last_modified"]):
+                self._apply_user(doc)
+
+        for coll in _COLLECTIONS:
+            self._prune(coll)
+
+    def _unseen(self, coll: str, key, mark) -> bool:
+        """Advances the watermark; False if this version of the document was already applied."""
+        current = self._watermarks.get(coll)
+        if current is None or mark > current:
+            self._watermarks[coll] = mark
+        seen = self._seen[coll]
+        if seen.get(key) == mark:
+            return False
+        seen[key] = mark
+        return True
+
+    def _prune(self, coll: str):
+        """Forgets applied documents that fell behind the overlap window."""
+        mark = self._watermarks.get(coll)
+        if not isinstance(mark, datetime.datetime):
+            return
+        cutoff = mark - _POLL_OVERLAP
+        seen = self._seen[coll]
+        for key in [k for k, stamp in seen.items() if not isinstance(stamp, datetime.datetime) or stamp <= cutoff]:
+            del seen[key]
+
+    # ── Invalidation helpers ─────────────────────────────────────────────────
+
+    def _apply_user(self, doc: Dict):
+        from handlers.standings import invalidate_lb_cache
+        from utils.leaderboard import leaderboard
+        if not leaderboard.apply_user(doc):
+            invalidate_lb_cache()
+        self.stats["invalidations"] += 1
+
+    def _invalidate_leaderboards(self):
+        from handlers.standings import invalidate_lb_cache
+        from utils.leaderboard import leaderboard
+        invalidate_lb_cache()
+        if leaderboard.loaded:
+            leaderboard.start()  # Can't tell which users changed — rebuild from Mongo
+        self.stats["invalidations"] += 1
+
+    async def _invalidate_everything(self):
+        from database import apply_remote_player_change, invalidate_banner_cache
+        await apply_remote_player_change(None)
+        invalidate_banner_cache()
+        self._invalidate_leaderboards()
+
+
+# Global instance
+cache_sync = CacheSync()
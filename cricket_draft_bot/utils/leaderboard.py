@@ -0,0 +1,309 @@
+# utils/leaderboard.py
+"""
+In-process leaderboard rank index.
+
+/standings used to re-sort `users` in Mongo whenever its 60s cache was
+dropped — and every finished match dropped all views — plus a
+count_documents({wins: {$gt: n}}) per viewer for "your rank". Now each view
+(overall, daily, weekly, cricket, fifa, wwe and one per chat) keeps its
+ranking in memory:
+
+  • a Fenwick tree over win counts → "users with more wins than n" in O(log W)
+  • per-win-count buckets ordered by first_win_at, and the sorted list of
+    non-empty win counts → top-N without scanning
+
+It is loaded once at startup and updated from the user document that
+update_user_stats writes (and, from other processes, via cache_sync), so a
+finished match moves only the users in it. Ordering and ranks match the old
+Mongo queries: wins desc, then first_win_at asc; tied users share a rank.
+
+Until load() finishes, top()/rank() return None and the standings handler
+falls back to querying Mongo.
+
+Daily / weekly wins live in epoch-keyed subdocuments,
+daily: {"epoch": 20261017, "wins": n} and weekly: {"epoch": 202642, "wins": n}
+(UTC day / ISO year+week). A stale epoch reads as zero, so nothing has to
+zero the counters when a period rolls over.
+"""
+
+import asyncio
+import bisect
+import datetime
+import logging
+import time
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+VIEW_FIELDS = {
+    "overall": "wins",
+    "daily": "daily.wins",
+    "weekly": "weekly.wins",
+    "cricket": "cricket_wins",
+    "fifa": "fifa_wins",
+    "wwe": "wwe_wins",
+}
+PERIODS = ("daily", "weekly")
+
+LEADERBOARD_PROJECTION = {
+    "user_id": 1, "name": 1, "first_win_at": 1, "chat_wins": 1,
+    "wins": 1, "cricket_wins": 1, "fifa_wins": 1, "wwe_wins": 1,
+    "daily": 1, "weekly": 1,
+    # Pre-epoch counters, read until the user's next match rewrites them
+    "daily_wins": 1, "daily_reset_at": 1, "weekly_wins": 1, "weekly_reset_at": 1,
+    "_id": 0,
+}
+
+
+# ── Period counters ──────────────────────────────────────────────────────────
+
+def period_epoch(period: str, now: float) -> int:
+    """Current epoch id: YYYYMMDD (UTC) for daily, ISO year*100 + week for weekly."""
+    t = time.gmtime(now)
+    if period == "daily":
+        return t.tm_year * 10000 + t.tm_mon * 100 + t.tm_mday
+    year, week, _ = datetime.date(t.tm_year, t.tm_mon, t.tm_mday).isocalendar()
+    return year * 100 + week
+
+
+def period_end(period: str, now: float) -> float:
+    """Unix time the current period rolls over (next UTC midnight / Monday 00:00 UTC)."""
+    day = int(now // 86400)
+    if period == "daily":
+        return (day + 1) * 86400.0
+    return (day - (day + 3) % 7 + 7) * 86400.0  # 1970-01-01 was a Thursday
+
+
+def period_wins(doc: Dict, period: str, now: float) -> Optional[int]:
+    """Wins in the running period, or None if the user hasn't played in it."""
+    sub = doc.get(period)
+    if isinstance(sub, dict):
+        return sub.get("wins", 0) if sub.get("epoch") == period_epoch(period, now) else None
+    if doc.get(f"{period}_reset_at", 0) > now:  # Legacy daily_wins / daily_reset_at pair
+        return doc.get(f"{period}_wins", 0)
+    return None
+
+
+class _Fenwick:
+    """Counts per win value; prefix(w) = users with at most w wins. Grows on demand."""
+
+    def __init__(self, size: int = 64):
+        self.tree = [0] * (size + 1)
+
+    def add(self, wins: int, delta: int):
+        while wins + 1 >= len(self.tree):
+            self._grow()
+        i = wins + 1
+        while i < len(self.tree):
+            self.tree[i] += delta
+            i += i & -i
+
+    def prefix(self, wins: int) -> int:
+        i = min(wins + 1, len(self.tree) - 1)
+        total = 0
+        while i > 0:
+            total += self.tree[i]
+            i -= i & -i
+        return total
+
+    def _grow(self):
+        counts = [self.prefix(w) - self.prefix(w - 1) for w in range(len(self.tree) - 1)]
+        self.tree = [0] * (2 * len(self.tree) - 1)
+        for w, c in enumerate(counts):
+            if c:
+                self.add(w, c)
+
+
+class RankIndex:
+    """Ranking of one view."""
+
+    def __init__(self):
+        self.entries: Dict[int, Tuple[int, float, float]] = {}  # {user_id: (wins, first_win_at, expires_at)}
+        self.tree = _Fenwick()
+        self.buckets: Dict[int, List[Tuple[float, int]]] = {}  # {wins: sorted [(first_win_at, user_id)]}
+        self.levels: List[int] = []  # Sorted win counts with a non-empty bucket
+        self.next_expiry = float("inf")
+        self.updated_at = time.time()
+
+    def set(self, user_id: int, wins: int, first_win_at: float, expires_at: float = float("inf")):
+        old = self.entries.get(user_id)
+        if old == (wins, first_win_at, expires_at):
+            return
+        if old is not None:
+            self._unlink(user_id, old)
+        self.entries[user_id] = (wins, first_win_at, expires_at)
+        self.tree.add(wins, 1)
+        bucket = self.buckets.get(wins)
+        if bucket is None:
+            bucket = self.buckets[wins] = []
+            bisect.insort(self.levels, wins)
+        bisect.insort(bucket, (first_win_at, user_id))
+        self.next_expiry = min(self.next_expiry, expires_at)
+        self.updated_at = time.time()
+
+    def remove(self, user_id: int):
+        old = self.entries.pop(user_id, None)
+        if old is not None:
+            self._unlink(user_id, old)
+            self.updated_at = time.time()
+
+    def _unlink(self, user_id: int, entry: Tuple[int, float, float]):
+        wins, first_win_at, _ = entry
+        self.tree.add(wins, -1)
+        bucket = self.buckets[wins]
+        del bucket[bisect.bisect_left(bucket, (first_win_at, user_id))]
+        if not bucket:
+            del self.buckets[wins]
+            del self.levels[bisect.bisect_left(self.levels, wins)]
+
+    def expire(self, now: float):
+        """Drops entries whose period ended (daily / weekly views)."""
+        if now < self.next_expiry:
+            return
+        for user_id in [u for u, e in self.entries.items() if e[2] <= now]:
+            self.remove(user_id)
+        self.next_expiry = min((e[2] for e in self.entries.values()), default=float("inf"))
+
+    def rank_of(self, wins: int) -> int:
+        """1 + users with strictly more wins."""
+        return len(self.entries) - self.tree.prefix(wins) + 1
+
+    def rank(self, user_id: int) -> Optional[Tuple[int, int]]:
+        entry = self.entries.get(user_id)
+        if entry is None:
+            return None
+        return self.rank_of(entry[0]), entry[0]
+
+    def top(self, n: int) -> List[Tuple[int, int]]:
+        """[(user_id, wins)] best first."""
+        out = []
+        for wins in reversed(self.levels):
+            for _, user_id in self.buckets[wins]:
+                out.append((user_id, wins))
+                if len(out) == n:
+                    return out
+        return out
+
+
+class Leaderboard:
+    def __init__(self):
+        self.views: Dict[str, RankIndex] = {view: RankIndex() for view in VIEW_FIELDS}
+        self.chats: Dict[str, RankIndex] = {}  # {str(chat_id): index of chat_wins.<chat_id>}
+        self.names: Dict[int, str] = {}
+        self._user_chats: Dict[int, Tuple[str, ...]] = {}
+        self.loaded = False
+        self._loading: Optional[asyncio.Task] = None
+        self._touched: set = set()  # Users updated while load() was scanning
+        self.stats = {"updates": 0, "reads": 0, "loads": 0}
+
+    def start(self):
+        if self._loading is None or self._loading.done():
+            self._loading = asyncio.create_task(self.load())
+
+    async def load(self):
+        """Builds every view from one scan of `users`."""
+        from database import get_db
+        t0 = time.perf_counter()
+        self.loaded = False
+        self.views = {view: RankIndex() for view in VIEW_FIELDS}
+        self.chats, self.names, self._user_chats = {}, {}, {}
+        self._touched = set()
+        try:
+            count = 0
+            async for doc in get_db().users.find({}, LEADERBOARD_PROJECTION):
+                if doc.get("user_id") not in self._touched:  # Don't clobber a newer live update
+                    self._apply(doc)
+                count += 1
+        except Exception as e:
+            logger.warning(f"Leaderboard load failed, standings stay on Mongo queries: {e}")
+            return
+        self.loaded = True
+        self._touched = set()
+        self.stats["loads"] += 1
+        logger.info(f"Leaderboard loaded: {count} users in {(time.perf_counter() - t0) * 1000:.0f}ms")
+
+    def apply_user(self, doc: Optional[Dict]) -> bool:
+        """Re-indexes one user from their document (LEADERBOARD_PROJECTION fields).
+        Returns False while not loaded, so callers know to drop query caches instead."""
+        if not doc or doc.get("user_id") is None:
+            return False
+        if not self.loaded:
+            self._touched.add(doc["user_id"])
+        self._apply(doc)
+        self.stats["updates"] += 1
+        return self.loaded
+
+    def _apply(self, doc: Dict):
+        user_id = doc["user_id"]
+        self.names[user_id] = doc.get("name", "Player")
+        first_win_at = doc.get("first_win_at") or 0.0  # Missing sorts first, like Mongo's null
+        now = time.time()
+        for view, field in VIEW_FIELDS.items():
+            index = self.views[view]
+            if view in PERIODS:
+                wins = period_wins(doc, view, now)
+                if wins is None:
+                    index.remove(user_id)
+                    continue
+                index.set(user_id, wins, first_win_at, period_end(view, now))
+            else:
+                index.set(user_id, doc.get(field, 0), first_win_at)
+
+        chat_wins = {k: v for k, v in (doc.get("chat_wins") or {}).items() if v and v > 0}
+        for chat in self._user_chats.get(user_id, ()):
+            if chat not in chat_wins:
+                self.chats[chat].remove(user_id)
+        for chat, wins in chat_wins.items():
+            index = self.chats.get(chat)
+            if index is None:
+                index = self.chats[chat] = RankIndex()
+            index.set(user_id, wins, first_win_at)
+        self._user_chats[user_id] = tuple(chat_wins)
+
+    def _index(self, view: str, chat_id) -> Optional[RankIndex]:
+        if view == "chat":
+            return self.chats.get(str(chat_id)) if chat_id else None
+        index = self.views.get(view, self.views["overall"])
+        index.expire(time.time())
+        return index
+
+    def top(self, view: str, chat_id=None, n: int = 10) -> Optional[Tuple[List[Dict], float]]:
+        """(rows, updated_at) shaped like the Mongo leaderboard docs, or None if not loaded."""
+        if not self.loaded:
+            return None
+        self.stats["reads"] += 1
+        index = self._index(view, chat_id)
+        if index is None:
+            return [], time.time()
+        field = VIEW_FIELDS.get(view, "wins")
+        epoch = period_epoch(view, time.time()) if view in PERIODS else None
+        rows = []
+        for user_id, wins in index.top(n):
+            row = {"user_id": user_id, "name": self.names.get(user_id, "Player")}
+            if view == "chat":
+                row["chat_wins"] = {str(chat_id): wins}
+            elif epoch is not None:
+                row[view] = {"epoch": epoch, "wins": wins}
+            else:
+                row[field] = wins
+            rows.append(row)
+        return rows, index.updated_at
+
+    def rank(self, user_id: int, view: str, chat_id=None) -> Optional[Tuple[Optional[int], int]]:
+        """(rank, wins) as _get_user_rank returned it, or None if not loaded."""
+        if not self.loaded:
+            return None
+        if user_id not in self.names:
+            return None, 0  # No stats document yet
+        index = self._index(view, chat_id)
+        if index is None:
+            return 1, 0
+        # Not in this view (no chat wins / period not started) counts as 0 wins
+        return index.rank(user_id) or (index.rank_of(0), 0)
+
+    def get_stats(self) -> Dict:
+        return {**self.stats, "loaded": self.loaded, "users": len(self.names), "chats": len(self.chats)}
+
+
+# Global instance
+leaderboard = Leaderboard()
@@ -0,0 +1,270 @@
+# utils/outbound.py
+"""
+Outbound Telegram scheduler.
+
+Every Bot API call goes through the bot's rate limiter, so this is plugged
+in as one (ApplicationBuilder().rate_limiter(...)) in place of
+AIORateLimiter. Calls that address a chat wait in one priority queue:
+
+  • token buckets per chat (groups ~20/min, private chats ~1/s) and one
+    global bucket (~30/s, split across workers) that match Telegram's limits
+  • priority classes: INTERACTIVE (draft clicks, board edits — the default)
+    > RESULTS (simulation results, unpins) > RECOVERY (startup re-sends,
+    stale challenge expiry) > BROADCAST. The highest-priority call whose
+    chat has a token goes next, so a broadcast never starves a live match
+    and a throttled chat never blocks the others
+  • a queued edit of a message is replaced by a newer edit of the same
+    message (same endpoint); both callers get the newer call's result
+  • RetryAfter pauses all sending for the requested time and requeues the call
+
+Callers pick a class with the standard rate_limit_args argument:
+    await bot.send_message(chat_id, text, rate_limit_args=outbound.BROADCAST)
+
+Calls without a chat (answerCallbackQuery, getFile, ...) are not queued, but
+still take a token from the global bucket and wait out a RetryAfter pause.
+"""
+
+import asyncio
+import bisect
+import itertools
+import logging
+import time
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter
+
+logger = logging.getLogger(__name__)
+
+INTERACTIVE, RESULTS, RECOVERY, BROADCAST = 0, 1, 2, 3
+_CLASS_NAMES = ("interactive", "results", "recovery", "broadcast")
+
+_EDIT_ENDPOINTS = frozenset({"editMessageText", "editMessageCaption", "editMessageMedia",
+                             "editMessageReplyMarkup"})
+_MAX_RETRIES = 3
+_IDLE_BUCKETS = 512  # Prune full (idle) chat buckets beyond this many
+
+
+class _Bucket:
+    """Token bucket: `burst` tokens, refilled at `rate` per second."""
+    __slots__ = ("rate", "burst", "tokens", "stamp")
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.stamp = time.monotonic()
+
+    def wait(self, now: float) -> float:
+        """Seconds until a token is available (0 = now)."""
+        self.tokens = min(self.burst, self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self):
+        self.tokens -= 1
+
+    def full(self, now: float) -> bool:
+        return self.tokens + (now - self.stamp) * self.rate >= self.burst
+
+
+class _Job:
+    __slots__ = ("order", "chat", "key", "callback", "args", "kwargs", "futures", "retries", "queued_at")
+
+    def __init__(self, order: Tuple[int, int], chat, key, callback, args, kwargs):
+        self.order = order  # (priority, seq)
+        self.chat = chat
+        self.key = key      # (endpoint, chat_id, message_id) for coalescable edits
+        self.callback = callback
+        self.args = args
+        self.kwargs = kwargs
+        self.futures: List[asyncio.Future] = [asyncio.get_running_loop().create_future()]
+        self.retries = 0
+        self.queued_at = time.monotonic()
+
+    def __lt__(self, other: "_Job") -> bool:
+        return self.order < other.order
+
+
+class OutboundScheduler(BaseRateLimiter[int]):
+    def __init__(self, overall_max_rate: float = 28, group_max_rate: float = 18, group_time_period: float = 60,
+                 private_max_rate: float = 1, private_burst: float = 3):
+        self._global = _Bucket(overall_max_rate, overall_max_rate)
+        self._group_args = (group_max_rate / group_time_period, group_max_rate)
+        self._private_args = (private_max_rate, private_burst)
+        self._chats: Dict[Any, _Bucket] = {}
+        self._queue: List[_Job] = []  # Sorted by (priority, seq)
+        self._edits: Dict[Tuple, _Job] = {}  # Queued coalescable edits
+        self._seq = itertools.count()
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._sending: Set[asyncio.Task] = set()  # In-flight _send tasks (kept referenced until done)
+        self._paused_until = 0.0
+        self.stats = {"sent": 0, "coalesced": 0, "retry_after": 0, "failed": 0,
+                      **{f"queued_{name}": 0 for name in _CLASS_NAMES}, "max_wait_ms": 0}
+
+    async def initialize(self) -> None:
+        self._ensure_dispatcher()
+
+    async def shutdown(self) -> None:
+        if self._task and not self._task.done():
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+        if self._sending:
+            await asyncio.gather(*self._sending, return_exceptions=True)  # Let in-flight calls finish
+        for job in self._queue:
+            for fut in job.futures:
+                if not fut.done():
+                    fut.cancel()
+        self._queue.clear()
+        self._edits.clear()
+
+    def _ensure_dispatcher(self):
+        if self._wake is None:
+            self._wake = asyncio.Event()
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._dispatch())
+
+    async def process_request(self, callback, args, kwargs, endpoint: str, data: Dict[str, Any],
+                              rate_limit_args: Optional[int]):
+        chat_id = data.get("chat_id")
+        if chat_id is None:
+            return await self._direct(callback, args, kwargs)
+        priority = rate_limit_args if rate_limit_args in (INTERACTIVE, RESULTS, RECOVERY, BROADCAST) else INTERACTIVE
+        message_id = data.get("message_id")
+        key = (endpoint, str(chat_id), message_id) if endpoint in _EDIT_ENDPOINTS and message_id else None
+
+        self._ensure_dispatcher()
+        job = _Job((priority, next(self._seq)), str(chat_id), key, callback, args, kwargs)
+        old = self._edits.get(key) if key else None
+        if old is not None:
+            # Newer edit of the same message — it replaces the queued one
+            self._queue.remove(old)
+            job.futures += old.futures
+            job.order = min(job.order, old.order)  # Keep the earlier place in line
+            self.stats["coalesced"] += 1
+        if key:
+            self._edits[key] = job
+        bisect.insort(self._queue, job)
+        self.stats[f"queued_{_CLASS_NAMES[priority]}"] += 1
+        self._wake.set()
+        return await job.futures[0]
+
+    async def _direct(self, callback, args, kwargs):
+        """A call with no chat: skips the queue but still counts against the global limit."""
+        retries = 0
+        while True:
+            now = time.monotonic()
+            delay = self._paused_until - now if now < self._paused_until else self._global.wait(now)
+            if delay:
+                await asyncio.sleep(delay)
+                continue
+            self._global.take()
+            try:
+                result = await callback(*args, **kwargs)
+            except RetryAfter as e:
+                self.stats["retry_after"] += 1
+                if retries >= _MAX_RETRIES:
+                    self.stats["failed"] += 1
+                    raise
+                retries += 1
+                self._pause(e)
+                continue
+            self.stats["sent"] += 1
+            return result
+
+    def _pause(self, e: RetryAfter):
+        wait = e.retry_after if isinstance(e.retry_after, (int, float)) else e.retry_after.total_seconds()
+        logger.info(f"Telegram flood limit — pausing outbound queue for {wait:.1f}s")
+        self._paused_until = max(self._paused_until, time.monotonic() + wait + 0.1)
+
+    def _bucket(self, chat: str) -> _Bucket:
+        bucket = self._chats.get(chat)
+        if bucket is None:
+            if len(self._chats) > _IDLE_BUCKETS:
+                now = time.monotonic()
+                for c in [c for c, b in self._chats.items() if b.full(now)]:
+                    del self._chats[c]
+            is_group = chat.startswith("-") or chat.startswith("@")
+            bucket = self._chats[chat] = _Bucket(*(self._group_args if is_group else self._private_args))
+        return bucket
+
+    async def _dispatch(self):
+        while True:
+            now = time.monotonic()
+            delay = None
+            if not self._queue:
+                self._wake.clear()
+                await self._wake.wait()
+                continue
+            if now < self._paused_until:
+                delay = self._paused_until - now
+            else:
+                delay = self._global.wait(now)
+            if not delay:
+                job, delay = None, None
+                for candidate in list(self._queue):
+                    if all(fut.done() for fut in candidate.futures):
+                        self._drop(candidate)  # Every caller gave up (cancelled) — don't send
+                        continue
+                    wait = self._bucket(candidate.chat).wait(now)
+                    if not wait:
+                        job = candidate
+                        break
+                    delay = wait if delay is None else min(delay, wait)
+                if job is not None:
+                    self._drop(job)
+                    self._global.take()
+                    self._bucket(job.chat).take()
+                    wait_ms = int((now - job.queued_at) * 1000)
+                    self.stats["max_wait_ms"] = max(self.stats["max_wait_ms"], wait_ms)
+                    task = asyncio.create_task(self._send(job))
+                    self._sending.add(task)
+                    task.add_done_callback(self._sending.discard)
+                    continue
+            # Nothing can go yet — sleep until a token frees up or a new call arrives
+            self._wake.clear()
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+
+    def _drop(self, job: _Job):
+        self._queue.remove(job)
+        if job.key and self._edits.get(job.key) is job:
+            del self._edits[job.key]
+
+    async def _send(self, job: _Job):
+        try:
+            result = await job.callback(*job.args, **job.kwargs)
+        except RetryAfter as e:
+            self.stats["retry_after"] += 1
+            if job.retries < _MAX_RETRIES:
+                job.retries += 1
+                self._pause(e)
+                bisect.insort(self._queue, job)  # Same place in line
+                self._wake.set()
+                return
+            self._finish(job, error=e)
+            return
+        except Exception as e:
+            self._finish(job, error=e)
+            return
+        self.stats["sent"] += 1
+        self._finish(job, result=result)
+
+    def _finish(self, job: _Job, result=None, error: Optional[BaseException] = None):
+        if error is not None:
+            self.stats["failed"] += 1
+        for fut in job.futures:
+            if fut.done():
+                continue
+            if error is not None:
+                fut.set_exception(error)
+            else:
+                fut.set_result(result)
+
+    def get_stats(self) -> Dict:
+        return {**self.stats, "pending": len(self._queue), "chats": len(self._chats),
+                "paused_for": max(0.0, round(self._paused_until - time.monotonic(), 1))}
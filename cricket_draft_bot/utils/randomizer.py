@@ -1,6 +1,7 @@
 # utils/randomizer.py
+import hashlib
 import random
-from typing import List, Any
+from typing import Any, Collection, Dict, List, Optional, Sequence
 
 def get_random_player(player_ids: List[str], exclude_ids: List[str] = None) -> str:
     """Selects a random player ID from the list, excluding specified ones.
@@ -19,6 +20,59 @@ def get_random_player(player_ids: List[str], exclude_ids: List[str] = None) -> s
     random.shuffle(choices)
     return choices[0]
 
+class ShuffledDeck:
+    """
+    Lazily shuffled draft deck: a Fisher–Yates shuffle that only performs the
+    swap for the card being drawn, so each draw is O(1) instead of copying and
+    shuffling the whole pool.
+
+    The deck is fully determined by (pool, seed, cursor): the pool is sorted,
+    so a match can persist just its seed and cursor and rebuild the exact same
+    deck after a restart (replaying `cursor` swaps), and a finished draft can
+    be replayed for audits. The pool itself is pinned by pool_fingerprint()
+    (see database.save_deck_pool), since the mode pool changes as players are
+    added or removed. Swapped positions live in a sparse dict, so the
+    per-match cost is O(draws), never a copy of the pool.
+    """
+
+    def __init__(self, pool: Sequence[str], seed: int, cursor: int = 0):
+        self.ids = sorted(pool)
+        self.seed = seed
+        self.cursor = 0
+        self._rng = random.Random(seed)
+        self._swaps: Dict[int, int] = {}  # position -> index into ids, only for displaced positions
+        while self.cursor < min(cursor, len(self.ids)):
+            self._step()
+        self.cursor = cursor  # Past the end stays exhausted
+
+    def _step(self) -> str:
+        k = self.cursor
+        j = self._rng.randrange(k, len(self.ids))
+        picked = self._swaps.get(j, j)
+        self._swaps[j] = self._swaps.pop(k, k)
+        self.cursor += 1
+        return self.ids[picked]
+
+    def draw(self, skip: Optional[Collection[str]] = None) -> Optional[str]:
+        """Next card not in `skip` (cards skipped are burned — they were drafted or discarded)."""
+        while self.cursor < len(self.ids):
+            pid = self._step()
+            if not skip or pid not in skip:
+                return pid
+        return None
+
+    def remaining(self) -> int:
+        return max(0, len(self.ids) - self.cursor)
+
+
+def pool_fingerprint(ids: Sequence[str]) -> str:
+    """Identity of a deck pool: a hash of its sorted IDs."""
+    return hashlib.sha1("\n".join(sorted(ids)).encode()).hexdigest()[:16]
+
+def new_deck_seed() -> int:
+    """Per-match deck seed (fits a signed 64-bit Mongo int)."""
+    return random.SystemRandom().getrandbits(63)
+
 def calculate_variance() -> float:
     """Returns a random variance multiplier (e.g., 0.9 to 1.1)."""
     # Reduces variance to +/- 5% (was +/- 10%)
@@ -124,10 +124,8 @@ class MessageDebouncer:
                                 )
                     return  # After recreate this key is stale; new task handles the rest
 
-                # If another update arrived while we were running the API call,
-                # pause briefly before the next iteration to respect rate limits.
-                if key in self._pending:
-                    await asyncio.sleep(0.3)
+                # Another update may have arrived during the API call — loop and deliver
+                # it; pacing is up to the outbound queue (utils/outbound.py)
 
 
         except asyncio.CancelledError:
@@ -0,0 +1,195 @@
+# utils/timers.py
+"""
+Durable timer scheduler.
+
+AFK forfeits, 30-min abandon cleanups, 5-min auto-ready and 2-min challenge
+expiry used to be one sleeping asyncio.Task each, rebuilt on restart by
+scanning matches. Now every timer is a document in the Mongo `timers`
+collection plus an entry in one in-memory heap:
+
+  • schedule / reschedule — O(log n) heap push + one upsert
+  • cancel               — O(1) tombstone (stale heap entries are skipped lazily) + one delete
+  • one sleeper task waits for the earliest due timer only
+  • a due timer is claimed with find_one_and_delete on (id, due), so it fires
+    exactly once even if two workers loaded it, and never after a reschedule
+
+Timer IDs are deterministic ("afk:<match_id>", "challenge:<key>", ...), so
+rescheduling replaces instead of duplicating, and recovery code can schedule
+idempotently. On startup the timers of owned chats are loaded back from
+Mongo and fire at their original due time.
+
+Handlers are registered per kind: timers.register("afk", fn) where
+fn(bot, payload) is a coroutine.
+"""
+
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class TimerScheduler:
+    def __init__(self):
+        self.bot = None
+        self._heap = []                  # (due, seq, timer_id)
+        self._timers: Dict[str, Dict] = {}  # timer_id -> {"due", "seq", "kind", "payload", "chat_id"}
+        self._handlers: Dict[str, Callable[[Any, Dict], Awaitable[None]]] = {}
+        self._seq = itertools.count()
+        self._ops: Dict[str, asyncio.Task] = {}  # timer_id -> last Mongo write (kept in order per timer)
+        self._unpersisted = set()        # Mongo write failed — fire without claiming
+        self._wake: Optional[asyncio.Event] = None
+        self._runner: Optional[asyncio.Task] = None
+        self.stats = {"scheduled": 0, "cancelled": 0, "fired": 0, "skipped": 0, "errors": 0}
+
+    def register(self, kind: str, handler: Callable[[Any, Dict], Awaitable[None]]):
+        self._handlers[kind] = handler
+
+    # ── Public API ───────────────────────────────────────────────────────────
+
+    def schedule(self, timer_id: str, kind: str, due: float, payload: Dict, chat_id: Optional[int] = None):
+        """Schedule (or move) a timer to fire at unix time `due`."""
+        seq = next(self._seq)
+        self._timers[timer_id] = {"due": due, "seq": seq, "kind": kind, "payload": payload, "chat_id": chat_id}
+        heapq.heappush(self._heap, (due, seq, timer_id))
+        self.stats["scheduled"] += 1
+
+        from database import save_timer
+        doc = {"_id": timer_id, "kind": kind, "due": due, "payload": payload, "chat_id": chat_id}
+        self._chain(timer_id, save_timer(doc))
+        if self._heap[0][2] == timer_id:
+            self._poke()  # New earliest timer — sleeper must wake sooner
+
+    def cancel(self, timer_id: str):
+        """Cancel a timer. Unknown IDs are fine (already fired or never scheduled)."""
+        if self._timers.pop(timer_id, None) is not None:
+            self.stats["cancelled"] += 1
+        from database import delete_timer
+        self._chain(timer_id, delete_timer(timer_id))
+
+    def next_due(self) -> Optional[float]:
+        self._drop_stale_head()
+        return self._heap[0][0] if self._heap else None
+
+    def get_stats(self) -> Dict[str, Any]:
+        nd = self.next_due()
+        return {**self.stats, "pending": len(self._timers),
+                "next_due_in": round(nd - time.time(), 1) if nd else None}
+
+    async def start(self, bot):
+        """Load this worker's timers from Mongo and start the sleeper."""
+        from database import get_all_timers
+        from utils.workers import owns_chat
+        self.bot = bot
+        self._wake = asyncio.Event()
+        loaded = 0
+        try:
+            for doc in await get_all_timers():
+                if doc["_id"] in self._timers or not owns_chat(doc.get("chat_id")):
+                    continue
+                seq = next(self._seq)
+                self._timers[doc["_id"]] = {
+                    "due": doc["due"], "seq": seq, "kind": doc["kind"],
+                    "payload": doc.get("payload") or {}, "chat_id": doc.get("chat_id"),
+                }
+                heapq.heappush(self._heap, (doc["due"], seq, doc["_id"]))
+                loaded += 1
+        except Exception as e:
+            logger.error(f"Loading persisted timers failed: {e}")
+        logger.info(f"Timer scheduler started with {loaded} persisted timer(s)")
+        if self._runner is None or self._runner.done():
+            self._runner = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the sleeper and wait for outstanding Mongo writes (shutdown hook)."""
+        if self._runner and not self._runner.done():
+            self._runner.cancel()
+        pending = [t for t in self._ops.values() if not t.done()]
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+
+    # ── Internals ────────────────────────────────────────────────────────────
+
+    def _poke(self):
+        if self._wake is not None:
+            self._wake.set()
+
+    def _chain(self, timer_id: str, coro):
+        """Runs Mongo writes for one timer strictly in call order."""
+        prev = self._ops.get(timer_id)
+
+        async def _op():
+            if prev is not None:
+                await asyncio.gather(prev, return_exceptions=True)
+            try:
+                await coro
+                self._unpersisted.discard(timer_id)
+            except Exception as e:
+                self._unpersisted.add(timer_id)
+                logger.warning(f"Timer {timer_id} persistence failed: {e}")
+            finally:
+                if self._ops.get(timer_id) is task:
+                    self._ops.pop(timer_id, None)
+
+        task = asyncio.create_task(_op())
+        self._ops[timer_id] = task
+
+    def _drop_stale_head(self):
+        while self._heap:
+            due, seq, timer_id = self._heap[0]
+            entry = self._timers.get(timer_id)
+            if entry is not None and entry["seq"] == seq:
+                return
+            heapq.heappop(self._heap)  # Cancelled or rescheduled — lazy delete
+
+    async def _run(self):
+        while True:
+            self._wake.clear()
+            now = time.time()
+            self._drop_stale_head()
+            while self._heap and self._heap[0][0] <= now:
+                _, seq, timer_id = heapq.heappop(self._heap)
+                entry = self._timers.get(timer_id)
+                if entry is None or entry["seq"] != seq:
+                    continue
+                del self._timers[timer_id]
+                asyncio.create_task(self._fire(timer_id, entry))
+                self._drop_stale_head()
+            timeout = (self._heap[0][0] - now) if self._heap else None
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _fire(self, timer_id: str, entry: Dict):
+        from database import claim_timer
+        prev = self._ops.get(timer_id)
+        if prev is not None:
+            await asyncio.gather(prev, return_exceptions=True)  # Our own upsert must land first
+        try:
+            claimed = await claim_timer(timer_id, entry["due"])
+        except Exception as e:
+            logger.warning(f"Timer claim failed for {timer_id}, firing anyway: {e}")
+            claimed = True
+        if not claimed and timer_id not in self._unpersisted:
+            self.stats["skipped"] += 1  # Fired elsewhere, or moved/cancelled in Mongo
+            return
+        self._unpersisted.discard(timer_id)
+
+        handler = self._handlers.get(entry["kind"])
+        if handler is None:
+            logger.error(f"No handler registered for timer kind '{entry['kind']}' ({timer_id})")
+            return
+        self.stats["fired"] += 1
+        try:
+            await handler(self.bot, entry["payload"])
+        except Exception as e:
+            self.stats["errors"] += 1
+            logger.error(f"Timer {timer_id} handler failed: {e}")
+
+
+# Global instance
+timers = TimerScheduler()
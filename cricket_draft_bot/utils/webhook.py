@@ -0,0 +1,195 @@
+# utils/webhook.py
+"""
+Webhook server mode (enabled by WEBHOOK_URL).
+
+A single asyncio HTTP server on PORT:
+  POST <WEBHOOK_PATH>  Telegram updates (checked against the secret token header)
+  GET  /health, /      liveness probe for the host / load balancer
+
+Updates are acknowledged immediately and handed to `on_update`, so Telegram
+never waits on a draft click being processed. In single-process mode that
+feeds the Application (built with concurrent_updates); in multi-worker mode
+the dispatcher routes them to the owning shard instead of polling.
+
+Stdlib only — python-telegram-bot's own webhook server needs tornado and
+can't serve /health on the same port.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import signal
+from typing import Awaitable, Callable, Dict, Optional
+
+from config import BOT_TOKEN, PORT, WEBHOOK_URL, WEBHOOK_PATH, WEBHOOK_SECRET
+
+logger = logging.getLogger(__name__)
+
+_MAX_BODY = 1024 * 1024  # Telegram updates are a few KB; refuse anything silly
+_IDLE_TIMEOUT = 75       # seconds a keep-alive connection may sit idle
+_REASONS = {200: "OK", 400: "Bad Request", 403: "Forbidden", 404: "Not Found", 413: "Payload Too Large"}
+
+
+def webhook_secret() -> str:
+    """Secret Telegram echoes in X-Telegram-Bot-Api-Secret-Token.
+    Derived from the bot token when WEBHOOK_SECRET is unset, so every instance agrees."""
+    return WEBHOOK_SECRET or hashlib.sha256(f"webhook:{BOT_TOKEN}".encode()).hexdigest()[:48]
+
+
+def webhook_url() -> str:
+    return WEBHOOK_URL.rstrip("/") + WEBHOOK_PATH
+
+
+class WebhookServer:
+    """Minimal HTTP/1.1 server for Telegram webhook POSTs plus a health endpoint."""
+
+    def __init__(self, on_update: Callable[[Dict], Awaitable[None]], path: str = WEBHOOK_PATH,
+                 secret: Optional[str] = None):
+        self.on_update = on_update
+        self.path = path
+        self.secret = secret or webhook_secret()
+        self.stats = {"received": 0, "rejected": 0, "errors": 0}
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._conns = set()  # Open keep-alive connections, closed on shutdown
+
+    async def start(self, host: str = "0.0.0.0", port: int = PORT):
+        self._server = await asyncio.start_server(self._handle_conn, host, port)
+        logger.info(f"Webhook server listening on {host}:{port}{self.path}")
+
+    async def close(self):
+        if self._server:
+            self._server.close()
+            for writer in list(self._conns):
+                writer.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _handle_conn(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self._conns.add(writer)
+        try:
+            while True:
+                line = await asyncio.wait_for(reader.readline(), _IDLE_TIMEOUT)
+                if not line:
+                    break
+                method, target, version = line.decode("latin-1").rstrip("\r\n").split(" ", 2)
+                headers = {}
+                while True:
+                    h = await reader.readline()
+                    if h in (b"\r\n", b"\n", b""):
+                        break
+                    k, _, v = h.decode("latin-1").partition(":")
+                    headers[k.strip().lower()] = v.strip()
+
+                length = int(headers.get("content-length") or 0)
+                if length > _MAX_BODY:
+                    self._respond(writer, 413, keep_alive=False)
+                    break
+                body = await reader.readexactly(length) if length else b""
+
+                status = await self._dispatch(method, target.split("?", 1)[0], headers, body)
+                keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+                self._respond(writer, status, keep_alive)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        except Exception as e:
+            logger.warning(f"Webhook connection error: {e}")
+        finally:
+            self._conns.discard(writer)
+            writer.close()
+
+    async def _dispatch(self, method: str, path: str, headers: Dict[str, str], body: bytes) -> int:
+        if method in ("GET", "HEAD") and path in ("/", "/health"):
+            return 200
+        if method != "POST" or path != self.path:
+            return 404
+        if headers.get("x-telegram-bot-api-secret-token") != self.secret:
+            self.stats["rejected"] += 1
+            return 403
+        try:
+            data = json.loads(body)
+        except ValueError:
+            return 400
+        self.stats["received"] += 1
+        try:
+            await self.on_update(data)
+        except Exception as e:
+            # Still 200 — a non-2xx makes Telegram redeliver the same update forever
+            self.stats["errors"] += 1
+            logger.error(f"Webhook update hand-off failed: {e}")
+        return 200
+
+    @staticmethod
+    def _respond(writer: asyncio.StreamWriter, status: int, keep_alive: bool = True):
+        body = b"OK" if status == 200 else _REASONS.get(status, "Error").encode()
+        writer.write(
+            f"HTTP/1.1 {status} {_REASONS.get(status, 'Error')}\r\n"
+            f"Content-Type: text/plain\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode() + body
+        )
+
+
+async def register_webhook(bot):
+    from telegram import Update
+    # drop_pending_updates: same restart semantics as polling mode
+    await bot.set_webhook(
+        url=webhook_url(),
+        secret_token=webhook_secret(),
+        allowed_updates=Update.ALL_TYPES,
+        drop_pending_updates=True,
+        max_connections=100,
+    )
+    logger.info(f"Webhook set to {webhook_url()}")
+
+
+def _stop_on_signals(stop: asyncio.Event):
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+
+async def run_webhook(application):
+    """Single-process webhook mode: serve Telegram updates straight into the Application."""
+    from telegram import Update
+
+    async def on_update(data: Dict):
+        await application.update_queue.put(Update.de_json(data, application.bot))
+
+    stop = asyncio.Event()
+    _stop_on_signals(stop)
+    server = WebhookServer(on_update)
+    async with application:  # initialize() / shutdown()
+        await application.post_init(application)  # Not run automatically without run_polling/run_webhook
+        await application.start()
+        await server.start()
+        await register_webhook(application.bot)
+        try:
+            await stop.wait()
+        finally:
+            await server.close()
+            await application.stop()
+            await application.post_shutdown(application)
+
+
+async def run_webhook_fanout(queues, route_update):
+    """Multi-worker webhook mode: the dispatcher serves the webhook and shards updates."""
+    from telegram import Bot, Update
+
+    async def on_update(data: Dict):
+        update = Update.de_json(data, None)
+        queues[await route_update(update, len(queues))].put(data)
+
+    stop = asyncio.Event()
+    _stop_on_signals(stop)
+    server = WebhookServer(on_update)
+    async with Bot(BOT_TOKEN) as bot:
+        await server.start()
+        await register_webhook(bot)
+        try:
+            await stop.wait()
+        finally:
+            await server.close()
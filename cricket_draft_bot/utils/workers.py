@@ -0,0 +1,217 @@
+# utils/workers.py
+"""
+Multi-worker mode with match-affinity sharding.
+
+Every match lives in exactly one group chat, so updates are routed by
+chat_id: shard = chat_id % WORKER_COUNT. The worker that owns a chat owns
+its matches, AFK/auto-ready timers, debouncer state and match cache — no
+in-memory state has to be shared between processes.
+
+Local dispatcher (WORKER_COUNT > 1):
+  main.py receives updates in one process — by polling, or through the
+  webhook server when WEBHOOK_URL is set — and pushes each one onto the
+  queue of the worker owning its chat. Workers are spawned child processes
+  running the normal Application without an Updater.
+
+Per-user state is the exception — a user can play in chats owned by
+different workers — so it's kept in Mongo, not in a worker:
+
+  • the one-live-match limit: database.claim_match_slots
+  • card / coin operations: the per-user lease in handlers/cards.py
+  • action cooldowns: database.try_acquire_action_cooldown
+
+What's left in memory is per shard and best-effort by design: the standings
+anti-spam cooldown (a user clicking in two chats on two workers gets two
+windows) and the mode-pick double-click locks, which are keyed by message and
+so always land on the worker owning that chat.
+
+Moving shards (changing WORKER_COUNT, or a worker restarting) needs no
+hand-off: each worker's startup recovery only picks up the matches whose
+chat it now owns and re-arms their timers from the Mongo-persisted
+turn_deadline / draft_completed_at.
+"""
+
+import asyncio
+import logging
+import signal
+from typing import Dict, Optional
+
+from config import WORKER_COUNT, WEBHOOK_URL
+
+logger = logging.getLogger(__name__)
+
+# Set in each spawned worker; the dispatcher / single-process mode is index 0
+_worker_count = WORKER_COUNT
+_worker_index = 0
+
+# Private-chat updates that belong to a group match carry its match_id
+_SWAP_CALLBACK_PREFIXES = ("swap1|", "swap2|", "swapcancel|")
+_MATCH_CHAT_CACHE: Dict[str, int] = {}  # {match_id: chat_id}
+_MATCH_CHAT_CACHE_MAX = 2000
+
+
+def set_worker(index: int, count: int):
+    global _worker_index, _worker_count
+    _worker_index = index
+    _worker_count = max(1, count)
+
+
+def get_worker() -> tuple:
+    """(index, count) of this process."""
+    return _worker_index, _worker_count
+
+
+def shard_for_chat(chat_id: int, count: Optional[int] = None) -> int:
+    count = count or _worker_count
+    return abs(int(chat_id)) % count
+
+
+def owns_chat(chat_id) -> bool:
+    """True if this worker is responsible for the chat (always True in single-process mode)."""
+    if _worker_count <= 1 or chat_id is None:
+        return True
+    return shard_for_chat(chat_id) == _worker_index
+
+
+def is_primary_worker() -> bool:
+    """Worker 0 runs the global housekeeping loops (trade expiry etc.)."""
+    return _worker_index == 0
+
+
+async def _chat_for_match(match_id: str) -> Optional[int]:
+    chat_id = _MATCH_CHAT_CACHE.get(match_id)
+    if chat_id is not None:
+        return chat_id
+    from database import get_match_chat_id
+    try:
+        chat_id = await get_match_chat_id(match_id)
+    except Exception as e:
+        logger.warning(f"Routing lookup failed for match {match_id}: {e}")
+        return None
+    if chat_id is not None:
+        if len(_MATCH_CHAT_CACHE) >= _MATCH_CHAT_CACHE_MAX:
+            _MATCH_CHAT_CACHE.pop(next(iter(_MATCH_CHAT_CACHE)))
+        _MATCH_CHAT_CACHE[match_id] = chat_id
+    return chat_id
+
+
+async def routing_chat_id(update) -> Optional[int]:
+    """
+    The chat whose shard must handle this update. Usually the update's own chat;
+    for swap DMs (/start swap_<id>, swap1|<id>|...) it is the match's group chat,
+    because the swap mutates that match and edits its group message.
+    """
+    query = update.callback_query
+    if query and query.data and query.data.startswith(_SWAP_CALLBACK_PREFIXES):
+        chat_id = await _chat_for_match(query.data.split("|")[1])
+        if chat_id is not None:
+            return chat_id
+
+    message = update.message
+    if message and message.text and message.chat.type == "private":
+        parts = message.text.split(maxsplit=1)
+        if parts[0].startswith("/start") and len(parts) > 1 and parts[1].startswith("swap_"):
+            chat_id = await _chat_for_match(parts[1][len("swap_"):])
+            if chat_id is not None:
+                return chat_id
+
+    if update.effective_chat:
+        return update.effective_chat.id
+    if update.effective_user:
+        return update.effective_user.id
+    return None
+
+
+async def route_update(update, count: Optional[int] = None) -> int:
+    chat_id = await routing_chat_id(update)
+    return shard_for_chat(chat_id, count) if chat_id is not None else 0
+
+
+# ── Worker process ───────────────────────────────────────────────────────────
+
+def _worker_main(index: int, count: int, queue, concurrent: bool = False):
+    """Entry point of a spawned worker process."""
+    # The dispatcher owns shutdown: it sends a None sentinel after SIGTERM/SIGINT
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    set_worker(index, count)
+    asyncio.run(_run_worker(queue, concurrent))
+
+
+async def _run_worker(queue, concurrent: bool):
+    from telegram import Update
+    from main import build_application
+
+    application = build_application(updater=False, concurrent=concurrent)
+    loop = asyncio.get_running_loop()
+    async with application:  # initialize() / shutdown()
+        await application.post_init(application)  # Not run automatically without run_polling/run_webhook
+        await application.start()
+        logger.info(f"Worker {_worker_index}/{_worker_count} ready")
+        try:
+            while True:
+                data = await loop.run_in_executor(None, queue.get)
+                if data is None:
+                    break
+                await application.update_queue.put(Update.de_json(data, application.bot))
+        finally:
+            await application.stop()
+            await application.post_shutdown(application)
+
+
+# ── Local dispatcher ─────────────────────────────────────────────────────────
+
+def run_dispatcher(count: int):
+    """Receives updates once (webhook or polling) and fans them out to `count` worker processes."""
+    import multiprocessing
+    ctx = multiprocessing.get_context("spawn")  # Never fork a live Mongo client / event loop
+    queues = [ctx.Queue() for _ in range(count)]
+    procs = [
+        ctx.Process(target=_worker_main, args=(i, count, queues[i], bool(WEBHOOK_URL)), name=f"draft-worker-{i}")
+        for i in range(count)
+    ]
+    for p in procs:
+        p.start()
+    logger.info(f"Dispatcher started {count} workers")
+    try:
+        if WEBHOOK_URL:
+            from utils.webhook import run_webhook_fanout
+            asyncio.run(run_webhook_fanout(queues, route_update))
+        else:
+            asyncio.run(_poll_and_route(queues))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for q in queues:
+            q.put(None)
+        for p in procs:
+            p.join(timeout=30)
+            if p.is_alive():
+                logger.warning(f"{p.name} did not stop in time — terminating")
+                p.terminate()
+
+
+async def _poll_and_route(queues):
+    from telegram import Bot, Update
+    from config import BOT_TOKEN
+
+    task = asyncio.current_task()
+    asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, task.cancel)
+
+    offset = None
+    async with Bot(BOT_TOKEN) as bot:
+        # Same as run_polling(drop_pending_updates=True) — skip updates queued while offline
+        await bot.delete_webhook(drop_pending_updates=True)
+        try:
+            while True:
+                try:
+                    updates = await bot.get_updates(offset=offset, timeout=25, allowed_updates=Update.ALL_TYPES)
+                except Exception as e:
+                    logger.warning(f"Dispatcher get_updates failed: {e}")
+                    await asyncio.sleep(3)
+                    continue
+                for update in updates:
+                    offset = update.update_id + 1
+                    queues[await route_update(update, len(queues))].put(update.to_dict())
+        except asyncio.CancelledError:
+            logger.info("Dispatcher stopping")